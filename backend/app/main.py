@@ -1,18 +1,71 @@
-from fastapi import FastAPI
-from pydantic import BaseModel
+import json
+import time
+import asyncio
+import datetime
+from typing import List, Optional
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Query, Request
+from fastapi.responses import Response, StreamingResponse
+from pydantic import BaseModel, Field, ValidationError
 from backend.core.llm import get_llm
+from backend.core.config import get_settings
+from backend.core.resources import warm_up
+from backend.core.telemetry import configure_logging, metrics_response
+from backend.core.search_cache import cache_stats
+from backend.core.llm_cache import llm_cache_stats
+from backend.core.agent import decision_paths
+from backend.core.claim_sink import claim_sink_stats, close_claim_sink
+from backend.core.payout_dispatcher import PayoutDispatcher
+from backend.core.claims_query import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, list_claims
+from backend.core.batch import (
+    DEFAULT_CONCURRENCY, MAX_CONCURRENCY, get_agent, iter_ndjson_notes, run_claims_batch, summarize_claim
+)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Loads the embedding model and FAISS indexes before the first request arrives,
+    so no claim pays several seconds of model loading, and starts the payout dispatcher.
+    On shutdown, claims still buffered in the claim sink are written out and the
+    payouts in flight finish.
+    """
+    configure_logging()
+    settings = get_settings()
+    if settings.warm_up_on_startup:
+        await asyncio.to_thread(warm_up)
+    dispatcher_task = None
+    if settings.payout_dispatcher_enabled:
+        dispatcher_task = asyncio.create_task(payout_dispatcher.run())
+    yield
+    await asyncio.to_thread(close_claim_sink)
+    if dispatcher_task is not None:
+        payout_dispatcher.stop()
+        await dispatcher_task
+
+# Pays approved claims from the payouts outbox while the server runs
+payout_dispatcher = PayoutDispatcher()
 
 # Initialize the FastAPI application
 app = FastAPI(
     title = "MediCodeAgent API",
     description= "Transparent and Robust API for  medical coding, billing, and revenue cycle automation backend system",
-    version= "1.0.0"
+    version= "1.0.0",
+    lifespan = lifespan
 )
 
 # We use Pydantic to strictly define what incoming data should look like
 class PromptRequest(BaseModel):
     prompt: str
 
+class ClaimRequest(BaseModel):
+    clinical_note: str = Field(min_length=1)
+    bypass_llm_cache: bool = False
+
+class BatchClaimsRequest(BaseModel):
+    notes: List[str] = Field(min_length=1)
+    concurrency: int = Field(DEFAULT_CONCURRENCY, ge=1, le=MAX_CONCURRENCY)
+    bypass_llm_cache: bool = False
+
 @app.get("/")
 async def root():
     """
@@ -32,6 +85,50 @@ async def health_check():
         "version": "1.0.0"
     }
 
+@app.get("/metrics")
+async def metrics():
+    """
+    Prometheus scrape endpoint: node and external call latencies, LLM tokens, cache
+    hits and misses, errors and LLM parse failures, adjudicated claims.
+    """
+    body, content_type = metrics_response()
+    return Response(content=body, media_type=content_type)
+
+@app.get("/api/search/cache-stats")
+async def search_cache_stats():
+    """
+    Size, hit/miss and eviction counters of the vector search caches.
+    """
+    return cache_stats()
+
+@app.get("/api/claims/decision-stats")
+async def claim_decision_stats():
+    """
+    How many claims were decided by the fast path and how many by the decision LLM.
+    """
+    return decision_paths.stats()
+
+@app.get("/api/claims/sink-stats")
+async def claim_writer_stats():
+    """
+    Batch sizes and flush latencies of the write-behind claim sink.
+    """
+    return claim_sink_stats()
+
+@app.get("/api/payouts/stats")
+async def payout_stats():
+    """
+    Payouts in the outbox by status, plus what the dispatcher paid, retried and gave up on.
+    """
+    return await payout_dispatcher.stats()
+
+@app.get("/api/llm/cache-stats")
+async def llm_response_cache_stats():
+    """
+    Size, hit rate and eviction counters of the persistent LLM response cache.
+    """
+    return await asyncio.to_thread(llm_cache_stats)
+
 # LLM Test Endpoint
 @app.post("/api/test-llm")
 async def test_llm(request: PromptRequest):
@@ -41,7 +138,7 @@ async def test_llm(request: PromptRequest):
     llm = get_llm()
     try:
         # Send the prompt to the local Llama 3.2 model
-        response = llm.invoke(request.prompt)
+        response = await llm.ainvoke(request.prompt)
         return {
             "response": response.content
         }
@@ -49,4 +146,80 @@ async def test_llm(request: PromptRequest):
         return {
             "error": str(e),
             "message": "Make sure Ollama app is running in the background!"
-        }
\ No newline at end of file
+        }
+
+# Claims Endpoints
+@app.get("/api/claims")
+async def get_claims(
+    status: Optional[str] = None,
+    rule_id: Optional[str] = None,
+    since: Optional[datetime.datetime] = None,
+    until: Optional[datetime.datetime] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    newest_first: bool = False
+):
+    """
+    Lists stored claims in time order, filtered by status and/or rule_id, one page at a time.
+    Pass the returned next_cursor to get the following page.
+    """
+    try:
+        return await asyncio.to_thread(
+            list_claims, status=status, rule_id=rule_id, since=since, until=until,
+            limit=limit, cursor=cursor, newest_first=newest_first
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
+@app.post("/api/claims")
+async def submit_claim(request: ClaimRequest):
+    """
+    Runs a single clinical note through the full agent pipeline and returns the decision.
+    """
+    agent = get_agent()
+    start = time.perf_counter()
+    state = await agent.ainvoke({
+        "clinical_note": request.clinical_note,
+        "bypass_llm_cache": request.bypass_llm_cache,
+        "messages": []
+    })
+    return summarize_claim(0, state, time.perf_counter() - start)
+
+@app.post("/api/claims/batch")
+async def submit_claims_batch(
+    request: Request,
+    concurrency: int = Query(DEFAULT_CONCURRENCY, ge=1, le=MAX_CONCURRENCY),
+    bypass_llm_cache: bool = Query(False)
+):
+    """
+    Runs many clinical notes through the agent pipeline concurrently.
+
+    Accepts either a JSON body {"notes": [...], "concurrency": N} or a JSONL/NDJSON
+    stream (Content-Type: application/x-ndjson) with one note per line, in which case
+    the concurrency and bypass_llm_cache flag come from the query string.
+    Results are streamed back as NDJSON, one line per claim as soon as it finishes,
+    and the last line is a summary with the aggregate throughput.
+    """
+    content_type = request.headers.get("content-type", "")
+    try:
+        if "ndjson" in content_type or "jsonl" in content_type:
+            # The upload is parsed line by line as it arrives. It has to be fully read before
+            # the response starts, because the server stops delivering the request body once
+            # a streaming response is running.
+            notes = [note async for note in iter_ndjson_notes(request.stream())]
+        else:
+            payload = BatchClaimsRequest.model_validate(await request.json())
+            notes = payload.notes
+            concurrency = payload.concurrency
+            bypass_llm_cache = payload.bypass_llm_cache
+    except (ValueError, ValidationError) as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
+    if not notes:
+        raise HTTPException(status_code=422, detail="The batch does not contain any clinical notes.")
+
+    async def stream_results():
+        async for row in run_claims_batch(notes, concurrency=concurrency, bypass_llm_cache=bypass_llm_cache):
+            yield json.dumps(row) + "\n"
+
+    return StreamingResponse(stream_results(), media_type="application/x-ndjson")
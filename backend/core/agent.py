@@ -1,8 +1,10 @@
 import json
+import asyncio
+import logging
 import operator
-from typing import TypedDict, Annotated, List
-from backend.core.rules import run_payer_rules
-from backend.core.payments import process_claim_payout
+import threading
+from typing import TypedDict, Annotated, List, Optional
+from backend.core.rules import run_claim_rules
 
 from langgraph.graph import StateGraph, END
 from langchain_core.messages import SystemMessage, HumanMessage
@@ -10,208 +12,723 @@ from langchain_core.tools import tool
 
 # Import our local components
 from backend.core.llm import get_llm
-from backend.core.state import ClaimState
-from backend.mcp.server import search_icd10, search_cpt # Reuse our smart search tools!
-from backend.data.db import SessionLocal, Claim
+from backend.core.llm_cache import get_llm_cache
+from backend.core.config import get_settings
+from backend.core.state import ClaimState, CodeCandidate, CodeLine
+from backend.mcp.server import search_codes_batch, format_matches # Reuse our smart search tools!
+from backend.core.claim_sink import get_claim_sink
+from backend.core.payments import payout_amount
+from backend.core.json_stream import JsonObjectScanner, first_json_object
+from backend.core.telemetry import (
+    CLAIMS, LLM_EARLY_STOPS, PARSE_FAILURES, external_call, record_error, record_tokens, timed_node
+)
 
-# ---------- Node 1: EXTRACTION -------------------
-def extract_entities(state: ClaimState):
+logger = logging.getLogger(__name__)
+
+# ---------- Shared helpers ------------------------
+# The sync and async nodes below only differ in how they wait on I/O,
+# so prompt building and response parsing live here and are used by both.
+
+# Bump a version whenever its prompt template changes, so cached answers to the old
+# wording are no longer served
+EXTRACTION_PROMPT_VERSION = "extract-v2"
+DECISION_PROMPT_VERSION = "decide-v2"
+
+# Upper bound on the diagnoses and on the procedures taken from one note
+MAX_ENTITIES = 12
+
+def _cache_lookup(state: ClaimState, prompt: str, template_version: str):
     """
-    Uses Llama 3.2 to parse the raw text and find medical terms.
+    Returns (cache, key, cached response). The cache is None when caching is off;
+    with bypass_llm_cache set the stored answer is ignored and replaced by a fresh one.
+    """
+    cache = get_llm_cache()
+    if cache is None:
+        return None, None, None
+    key = cache.key(get_settings().ollama_model, template_version, prompt)
+    if state.get("bypass_llm_cache"):
+        cache.record_bypass()
+        return cache, key, None
+    return cache, key, cache.get(key)
+
+# JSON schemas of the two answers, for Ollama's structured outputs. Properties are generated
+# in this order, so the code lines come before the free-text reasoning.
+EXTRACTION_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "diagnoses": {"type": "array", "items": {"type": "string"}},
+        "procedures": {"type": "array", "items": {"type": "string"}}
+    },
+    "required": ["diagnoses", "procedures"]
+}
+DECISION_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "code_lines": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "cpt": {"type": "string"},
+                    "icd10": {"type": "array", "items": {"type": "string"}},
+                    "confidence": {"type": "number"}
+                },
+                "required": ["cpt", "icd10", "confidence"]
+            }
+        },
+        "reasoning": {"type": "string"}
+    },
+    "required": ["code_lines", "reasoning"]
+}
+_SCHEMAS = {EXTRACTION_PROMPT_VERSION: EXTRACTION_SCHEMA, DECISION_PROMPT_VERSION: DECISION_SCHEMA}
+
+# What a parser raises on an answer that is not the JSON asked for
+_PARSE_ERRORS = (ValueError, TypeError, AttributeError, KeyError)
+
+_RETRY_HINT = """
+    Your previous answer was not a complete, valid JSON object. Answer again with ONLY the JSON object.
+    """
+
+def _llm_for(template_version: str, attempt: int):
+    """
+    The pooled client for one call: JSON output and a cap on the generated tokens, which
+    doubles on every retry in case the previous answer was cut off by it.
+    """
+    settings = get_settings()
+    overrides = {}
+    if settings.llm_structured_output == "schema":
+        overrides["format"] = _SCHEMAS[template_version]
+    elif settings.llm_structured_output == "json":
+        overrides["format"] = "json"
+    elif settings.llm_structured_output != "off":
+        raise ValueError(f"Unknown LLM_STRUCTURED_OUTPUT '{settings.llm_structured_output}'. Use schema, json or off")
+    cap = settings.llm_extract_max_tokens if template_version == EXTRACTION_PROMPT_VERSION else settings.llm_decide_max_tokens
+    if cap > 0:
+        overrides["num_predict"] = cap * 2 ** attempt
+    return get_llm(**overrides)
+
+def _complete(prompt: str, template_version: str, attempt: int) -> str:
+    """
+    One LLM call. When streaming, the tokens are fed to a JsonObjectScanner and the stream
+    is closed as soon as the JSON object is complete, so Ollama stops generating instead of
+    spending the rest of num_predict on whitespace or chatter after the closing brace.
+    """
+    llm = _llm_for(template_version, attempt)
+    with external_call("ollama", template_version):
+        if not get_settings().llm_stream:
+            message = llm.invoke(prompt)
+            record_tokens(message, template_version)
+            return message.content
+        scanner, message, chunks = JsonObjectScanner(), None, 0
+        stream = llm.stream(prompt)
+        try:
+            for chunk in stream:
+                message = chunk if message is None else message + chunk
+                chunks += 1
+                if scanner.feed(chunk.content):
+                    LLM_EARLY_STOPS.labels(template_version).inc()
+                    break
+        finally:
+            # Closing the generator drops the HTTP response, which cancels the generation in Ollama
+            stream.close()
+    record_tokens(message, template_version, chunks)
+    return scanner.result or scanner.text
+
+async def _acomplete(prompt: str, template_version: str, attempt: int) -> str:
+    # Async version of _complete
+    llm = _llm_for(template_version, attempt)
+    with external_call("ollama", template_version):
+        if not get_settings().llm_stream:
+            message = await llm.ainvoke(prompt)
+            record_tokens(message, template_version)
+            return message.content
+        scanner, message, chunks = JsonObjectScanner(), None, 0
+        stream = llm.astream(prompt)
+        try:
+            async for chunk in stream:
+                message = chunk if message is None else message + chunk
+                chunks += 1
+                if scanner.feed(chunk.content):
+                    LLM_EARLY_STOPS.labels(template_version).inc()
+                    break
+        finally:
+            await stream.aclose()
+    record_tokens(message, template_version, chunks)
+    return scanner.result or scanner.text
+
+def _parse_answer(content: str, parse) -> tuple:
+    """
+    Returns (the JSON object text, parse(object)). Raises one of _PARSE_ERRORS when the
+    answer holds no complete JSON object or not the one asked for.
+    """
+    text = first_json_object(content)
+    data = json.loads(text)
+    if not isinstance(data, dict):
+        raise TypeError(f"Expected a JSON object, got {type(data).__name__}")
+    return text, parse(data)
+
+def _cached_answer(content: Optional[str], template_version: str, parse) -> Optional[dict]:
+    if content is None:
+        return None
+    try:
+        update = _parse_answer(content, parse)[1]
+    except _PARSE_ERRORS:
+        # Stored before answers were validated, ask again (the new answer replaces it)
+        return None
+    logger.debug("LLM cache hit (%s)", template_version)
+    return update
+
+def _parse_failed(template_version: str, attempt: int, error: Exception):
+    PARSE_FAILURES.labels(template_version).inc()
+    logger.warning("Unparseable LLM answer (%s, attempt %d of %d): %s", template_version, attempt + 1,
+                   get_settings().llm_parse_retries + 1, error, extra={"template": template_version})
+
+def _generate(state: ClaimState, prompt: str, template_version: str, parse) -> Optional[dict]:
+    """
+    Asks the LLM and returns parse(answer as dict), retrying up to LLM_PARSE_RETRIES times
+    when the answer is not the JSON asked for. At temperature 0 the same prompt gives the same
+    answer, so retries add a hint to the prompt. Returns None when every attempt failed.
+    Only parsed answers are cached.
     """
-    print("--- Node: Extraction ---")
-    note = state["clinical_note"]
+    cache, key, content = _cache_lookup(state, prompt, template_version)
+    update = _cached_answer(content, template_version, parse)
+    if update is not None:
+        return update
+    for attempt in range(get_settings().llm_parse_retries + 1):
+        content = _complete(prompt if attempt == 0 else prompt + _RETRY_HINT, template_version, attempt)
+        try:
+            text, update = _parse_answer(content, parse)
+        except _PARSE_ERRORS as e:
+            _parse_failed(template_version, attempt, e)
+            continue
+        if cache is not None:
+            cache.put(key, get_settings().ollama_model, template_version, text)
+        return update
+    return None
 
+async def _agenerate(state: ClaimState, prompt: str, template_version: str, parse) -> Optional[dict]:
+    # SQLite calls can wait on another worker's write lock, so they run off the event loop
+    cache, key, content = await asyncio.to_thread(_cache_lookup, state, prompt, template_version)
+    update = _cached_answer(content, template_version, parse)
+    if update is not None:
+        return update
+    for attempt in range(get_settings().llm_parse_retries + 1):
+        content = await _acomplete(prompt if attempt == 0 else prompt + _RETRY_HINT, template_version, attempt)
+        try:
+            text, update = _parse_answer(content, parse)
+        except _PARSE_ERRORS as e:
+            _parse_failed(template_version, attempt, e)
+            continue
+        if cache is not None:
+            await asyncio.to_thread(cache.put, key, get_settings().ollama_model, template_version, text)
+        return update
+    return None
+
+def _llm_failed(template_version: str) -> str:
+    record_error("llm", "ParseFailure")
+    return f"The LLM gave no valid JSON answer to {template_version} after {get_settings().llm_parse_retries + 1} attempts."
+
+# ---------- Node 1: EXTRACTION -------------------
+def _extraction_prompt(note: str) -> str:
     # Strict prompt to force JSON output
-    prompt = f""" 
-    you are medical coding assistant. Extract the main DIAGNOSIS (condition) and PROCEDURE (treatement) from the text below.
-    Return ONLY a JSON object with keys "diagnosis" and "procedure". Do not add any conversational text.
+    return f""" 
+    you are medical coding assistant. Extract EVERY DIAGNOSIS (condition) and EVERY PROCEDURE (treatement) from the text below.
+    Return ONLY a JSON object with keys "diagnoses" and "procedures", each a list of short phrases, main diagnosis first.
+    Do not add any conversational text.
     
     TEXT: "{note}"
     """
 
-    llm = get_llm()
-    response = llm.invoke(prompt)
+def _entity_list(data: dict, plural: str, singular: str) -> List[str]:
+    # Accept a list or, like older answers, a single string
+    value = data.get(plural, data.get(singular, []))
+    if isinstance(value, str):
+        value = [value]
+    entities = []
+    for item in value if isinstance(value, list) else []:
+        item = str(item).strip()
+        if item and item not in entities:
+            entities.append(item)
+    return entities[:MAX_ENTITIES]
 
-    # Basic cleanup to parse JSON from LLM response
-    content = response.content.strip()
-    if "```json" in content:
-        content = content.split("```json")[1].split("```")[0]
-    elif "```" in content:
-        content = content.split("```")[1].split("```")[0]
+def _parse_extraction(data: dict) -> dict:
+    diagnoses = _entity_list(data, "diagnoses", "diagnosis")
+    procedures = _entity_list(data, "procedures", "procedure")
+    return {
+        "extracted_diagnoses": diagnoses,
+        "extracted_procedures": procedures,
+        "extracted_diagnosis": "; ".join(diagnoses),
+        "extracted_procedure": "; ".join(procedures),
+        "messages": [f"Extracted {len(diagnoses)} diagnoses and {len(procedures)} procedures."]
+    }
 
-    try: 
-        data = json.loads(content)
-        return {
-            "extracted_diagnosis": data.get("diagnosis", ""),
-            "extracted_procedure": data.get("procedure", ""),
-            "messages": ["Extracted entities successfully."]
-        }
-    except json.JSONDecodeError:
-        return {
-            "messages": ["Error: LLM failed to output valid JSON."]
-        }
+def _extraction_failed() -> dict:
+    # No entities, so nothing is searched, the decision LLM is skipped and the claim goes to review
+    error = _llm_failed(EXTRACTION_PROMPT_VERSION)
+    return {
+        "extracted_diagnoses": [],
+        "extracted_procedures": [],
+        "llm_error": error,
+        "messages": [f"Error: {error}"]
+    }
+
+def extract_entities(state: ClaimState):
+    """
+    Uses Llama 3.2 to parse the raw text and find medical terms.
+    """
+    update = _generate(state, _extraction_prompt(state["clinical_note"]), EXTRACTION_PROMPT_VERSION, _parse_extraction)
+    return update if update is not None else _extraction_failed()
+
+async def aextract_entities(state: ClaimState):
+    """
+    Async version of extract_entities, waits on Ollama without blocking the event loop.
+    """
+    update = await _agenerate(state, _extraction_prompt(state["clinical_note"]), EXTRACTION_PROMPT_VERSION, _parse_extraction)
+    return update if update is not None else _extraction_failed()
     
 # ---------- Node 2: CODING (TOOL USE) ------------
+def _entities(state: ClaimState, list_key: str, text_key: str) -> List[str]:
+    # States built before entity lists existed only carry the single text field
+    entities = state.get(list_key)
+    if entities is None:
+        text = state.get(text_key, "")
+        entities = [text] if text else []
+    return entities
+
+def lookup_codes_batch(states: List[ClaimState]) -> List[dict]:
+    """
+    Runs the vector search lookup for many claims at once.
+    Every diagnosis and procedure phrase of every claim is embedded in one batch
+    and each FAISS index is searched once, instead of one search per phrase.
+    """
+    diag_queries, diag_owners = [], []
+    proc_queries, proc_owners = [], []
+
+    for i, state in enumerate(states):
+        diagnoses = _entities(state, "extracted_diagnoses", "extracted_diagnosis")
+        procedures = _entities(state, "extracted_procedures", "extracted_procedure")
+
+        # Use out tools if we have queries
+        for diag_query in diagnoses:
+            logger.debug("Searching ICD-10 for: %s", diag_query)
+            diag_queries.append(diag_query)
+            diag_owners.append(i)
+        for proc_query in procedures:
+            logger.debug("Searching CPT for: %s", proc_query)
+            proc_queries.append(proc_query)
+            proc_owners.append(i)
+
+    # Calls our local FAISS logic, each query gets its ranked candidate records
+    icd_results, cpt_results = search_codes_batch(diag_queries, proc_queries)
+
+    updates = [
+        {"icd10_candidates": [], "cpt_candidates": [], "messages": ["Performed vector search lookup."]}
+        for _ in states
+    ]
+    for owner, candidates in zip(diag_owners, icd_results):
+        updates[owner]["icd10_candidates"].extend(candidates)
+    for owner, candidates in zip(proc_owners, cpt_results):
+        updates[owner]["cpt_candidates"].extend(candidates)
+    return updates
+
 def lookup_codes(state: ClaimState): 
     """
     Takes the extracted terms and searches our local FAISS Vector DB.
     """
-    print("--- Node: Coding Lookup ---")
+    return lookup_codes_batch([state])[0]
 
-    diag_query = state.get("extracted_diagnosis", "")
-    proc_query = state.get("extracted_procedure", "")
+class _LookupBatcher:
+    """
+    Coalesces the lookups of claims running concurrently on the same event loop.
+    The first lookup opens a short window; every lookup arriving within it joins the
+    same lookup_codes_batch call, which runs on a worker thread.
+    """
+    def __init__(self):
+        settings = get_settings()
+        self.window = settings.lookup_batch_window_ms / 1000.0
+        self.max_batch = settings.lookup_max_batch
+        self._pending = {} # event loop -> [(state, future), ...]
+        self._timers = {} # event loop -> TimerHandle closing the open window
 
-    icd_results = []
-    cpt_results = []
+    async def lookup(self, state: ClaimState) -> dict:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        pending = self._pending.setdefault(loop, [])
+        pending.append((state, future))
 
-    # Use out tools if we have queries
-    if diag_query: 
-        print(f"Searching ICD-10 for: {diag_query}")
-        icd_results_str = search_icd10(diag_query) # Calls our local FAISS logic
-        icd_results.append(icd_results_str)
+        if len(pending) >= self.max_batch:
+            self._flush(loop)
+        elif len(pending) == 1:
+            self._timers[loop] = loop.call_later(self.window, self._flush, loop)
+        return await future
 
-    if proc_query: 
-        print(f"Searching CPT for: {proc_query}")
-        cpt_results_str = search_cpt(proc_query) # Calls our local FAISS logic
-        cpt_results.append(cpt_results_str)
+    def _flush(self, loop):
+        # A batch filled early must not leave its timer behind to cut the next window short
+        timer = self._timers.pop(loop, None)
+        if timer is not None:
+            timer.cancel()
+        batch = self._pending.pop(loop, [])
+        if not batch:
+            return
+        logger.debug("Coding lookup batch of %d claims", len(batch))
+        # Embedding and FAISS search are CPU work that release the GIL, so they run on a worker thread
+        search = loop.run_in_executor(None, lookup_codes_batch, [state for state, _ in batch])
+        search.add_done_callback(lambda done: self._deliver(batch, done))
 
-    return {
-        "icd10_candidates": icd_results,
-        "cpt_candidates": cpt_results,
-        "messages": ["Performed vector search lookup."]
-    }
+    @staticmethod
+    def _deliver(batch, done):
+        error = asyncio.CancelledError() if done.cancelled() else done.exception()
+        for i, (_, future) in enumerate(batch):
+            if future.done():
+                continue
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(done.result()[i])
 
-# ---------- Node 3: VALIDATION and DECISION -------
-def finalize_coding(state: ClaimState): 
+_lookup_batcher = None
+
+async def alookup_codes(state: ClaimState):
     """
-    Review the tool results and pick the best code.
+    Async version of lookup_codes.
+    Lookups from claims in flight at the same time are merged into one batched search.
     """
-    print("--- Node: Final Decision ---")
+    global _lookup_batcher
+    if _lookup_batcher is None:
+        _lookup_batcher = _LookupBatcher()
+    return await _lookup_batcher.lookup(state)
+
+# ---------- Node 3: VALIDATION and DECISION -------
+def _group_by_query(candidates: List[CodeCandidate]) -> List[List[CodeCandidate]]:
+    # Candidates of all phrases share one list, split them back per phrase (in extraction order)
+    groups = {}
+    for candidate in candidates:
+        groups.setdefault(candidate.get("query", ""), []).append(candidate)
+    return [sorted(group, key=lambda c: c["rank"]) for group in groups.values()]
 
-    prompt = f"""
+def _render_candidates(code_type: str, candidates: List[CodeCandidate]) -> str:
+    groups = _group_by_query(candidates)
+    if not groups:
+        return format_matches(code_type, [])
+    return "\n".join(f'For "{group[0]["query"]}": {format_matches(code_type, group)}' for group in groups)
+
+def _code_line(line: int, cpt_code, icd10_codes, confidence: float) -> CodeLine:
+    if isinstance(icd10_codes, str) or icd10_codes is None:
+        icd10_codes = [icd10_codes] if icd10_codes else []
+    return CodeLine(
+        line = line,
+        cpt_code = str(cpt_code) if cpt_code is not None else "None",
+        icd10_codes = [str(code) for code in icd10_codes],
+        confidence = float(confidence),
+        status = "pending",
+        rule_id = None,
+        rejection_reason = None
+    )
+
+def _lines_decision(lines: List[CodeLine]) -> dict:
+    # The first line carries the primary codes, the claim is only as confident as its weakest line
+    first = lines[0] if lines else None
+    return {
+        "code_lines": lines,
+        "final_icd10_code": first["icd10_codes"][0] if first and first["icd10_codes"] else "None",
+        "final_cpt_code": first["cpt_code"] if first else "None",
+        "confidence_score": min((line["confidence"] for line in lines), default=0.0),
+    }
+
+def _decision_prompt(state: ClaimState) -> str:
+    return f"""
     You are a strictly logical, highly critical Senior Medical Coder. 
     
     1. Analyze the PATIENT NOTE: "{state['clinical_note']}"
-    2. Review the ICD-10 SEARCH RESULTS: {state['icd10_candidates']}
-    3. Review the CPT SEARCH RESULTS: {state['cpt_candidates']}
+    2. Review the ICD-10 SEARCH RESULTS (one block per diagnosis): {_render_candidates("icd10", state.get("icd10_candidates", []))}
+    3. Review the CPT SEARCH RESULTS (one block per procedure): {_render_candidates("cpt", state.get("cpt_candidates", []))}
     
     Tasks and Rules: 
-    1. Select the EXACT code from the results that matches the note. 
+    1. For EVERY procedure performed, output one code line with the EXACT CPT code from the results and the EXACT ICD-10 codes from the results that justify it (main diagnosis first).
     2. If the search results DO NOT logically match the patient note (e.g., foot injury vs throat code), you MUST output "None" for that code. Do not guess.
     3. Output ONLY a valid JSON object. No markdown, no conversational text.
-    4. CRITICAL: For the "confidence" field, you MUST look at the numeric Score in the search results and use the lowest score associated with your chosen codes. 
+    4. CRITICAL: For each "confidence" field, you MUST look at the numeric Score in the search results and use the lowest score associated with the codes of that line. 
     If you output "None", the confidence must be 0.0
 
     Return ONLY a JSON object in this format:
     {{
-        "final_icd10": "Code or None",
-        "final_cpt": "Code or None",
-        "reasoning": "Brief explanation of why these codes were chosen based on the evidence.",
-        "confidence": <replace_with_actual_float_score>
+        "code_lines": [
+            {{"cpt": "Code or None", "icd10": ["Code", "..."], "confidence": <replace_with_actual_float_score>}}
+        ],
+        "reasoning": "Brief explanation of why these codes were chosen based on the evidence."
     }}
     """
-    
-    llm = get_llm()
-    response = llm.invoke(prompt)
-    
-    # Clean up JSON again
-    content = response.content.strip()
-    if "```json" in content:
-        content = content.split("```json")[1].split("```")[0]
-    elif "```" in content:
-        content = content.split("```")[1].split("```")[0]
 
-    try:
-        data = json.loads(content)
-        # Force float conversion to prevent string errors
-        conf = float(data.get("confidence", 0.0))
-        return {
-            "final_icd10_code": data.get("final_icd10"),
-            "final_cpt_code": data.get("final_cpt"),
-            "explanation": data.get("reasoning"),
-            "confidence_score": conf,
-            # "status": "approved" if data.get("confidence", 0.0) > 0.8 else "review_needed"
-            "status": "pending"
-        }
-    except Exception as e:
-        print(f"Error parsing LLM decision: {e}")
-        # return {"status": "error", "messages": ["Failed to parse decision."]}
-        # return {"status": "error", "confidence_score": 0.0}
+def _parse_decision(data: dict) -> dict:
+    if "code_lines" in data:
+        raw_lines = data["code_lines"] or []
+    else:
+        # A single-line answer in the older {"final_icd10", "final_cpt"} shape
+        raw_lines = [{"cpt": data.get("final_cpt"), "icd10": data.get("final_icd10"),
+                      "confidence": data.get("confidence", 0.0)}]
+    # Force float conversion to prevent string errors
+    lines = [
+        _code_line(i + 1, item.get("cpt"), item.get("icd10"), float(item.get("confidence", 0.0)))
+        for i, item in enumerate(raw_lines)
+    ]
+    return {
+        **_lines_decision(lines),
+        "explanation": data.get("reasoning"),
+        "status": "pending",
+        "decision_path": "llm"
+    }
+
+def _decision_failed(error: str) -> dict:
+    return {
+        **_lines_decision([]),
+        "llm_error": error,
+        "status": "pending",
+        "decision_path": "llm",
+        "messages": [f"Error: {error}"]
+    }
+
+def finalize_coding(state: ClaimState): 
+    """
+    Review the tool results and pick the best codes for every line.
+    """
+    decision_paths.record("llm")
+    if state.get("llm_error"):
+        return _decision_failed(state["llm_error"])
+    update = _generate(state, _decision_prompt(state), DECISION_PROMPT_VERSION, _parse_decision)
+    return update if update is not None else _decision_failed(_llm_failed(DECISION_PROMPT_VERSION))
+
+async def afinalize_coding(state: ClaimState):
+    """
+    Async version of finalize_coding.
+    """
+    decision_paths.record("llm")
+    if state.get("llm_error"):
+        return _decision_failed(state["llm_error"])
+    update = await _agenerate(state, _decision_prompt(state), DECISION_PROMPT_VERSION, _parse_decision)
+    return update if update is not None else _decision_failed(_llm_failed(DECISION_PROMPT_VERSION))
+
+# ---------- Node 3b: FAST PATH DECISION -----------
+class DecisionPathCounter:
+    """
+    Thread-safe count of how many claims took each decision path.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts = {"fast_path": 0, "top_match": 0, "llm": 0}
+
+    def record(self, path: str):
+        with self._lock:
+            self._counts[path] = self._counts.get(path, 0) + 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            counts = dict(self._counts)
+        total = sum(counts.values())
         return {
-            "final_icd10_code": "None", 
-            "final_cpt_code": "None", 
-            "confidence_score": 0.0,
-            "status": "pending"
+            **counts,
+            "total": total,
+            "fast_path_rate": round(counts["fast_path"] / total, 4) if total else 0.0
         }
 
+decision_paths = DecisionPathCounter()
+
+def _clear_winner(candidates: List[CodeCandidate], min_score: float, min_margin: float) -> Optional[CodeCandidate]:
+    """
+    Returns the top candidate if it scores at least min_score and leads the runner-up
+    by at least min_margin, otherwise None (the LLM has to weigh the options).
+    """
+    ranked = sorted(candidates, key=lambda c: c["rank"])
+    if not ranked or ranked[0]["score"] < min_score:
+        return None
+    if len(ranked) > 1 and ranked[0]["score"] - ranked[1]["score"] < min_margin:
+        return None
+    return ranked[0]
+
+def _fast_path_picks(state: ClaimState):
+    """
+    The clear winner of every diagnosis and every procedure search,
+    or None if any of them is ambiguous (or nothing was found).
+    """
+    settings = get_settings()
+    picks = []
+    for key in ("icd10_candidates", "cpt_candidates"):
+        groups = _group_by_query(state.get(key, []))
+        winners = [_clear_winner(group, settings.decision_fast_path_min_score, settings.decision_fast_path_min_margin)
+                   for group in groups]
+        if not winners or any(winner is None for winner in winners):
+            return None
+        picks.append(winners)
+    return picks
+
+def route_decision(state: ClaimState) -> str:
+    """
+    Sends the claim to the fast path when every search has an unambiguous winner.
+    """
+    return "fast_path" if _fast_path_picks(state) is not None else "llm"
+
+def _score_decision(icds: List[CodeCandidate], cpts: List[CodeCandidate], path: str, explanation: str) -> dict:
+    """
+    One line per procedure, linked to every chosen diagnosis. Like the LLM is told to,
+    a line's confidence is the lowest score among its codes.
+    """
+    decision_paths.record(path)
+    icd_codes = list(dict.fromkeys(icd["code"] for icd in icds))
+    icd_floor = min((icd["score"] for icd in icds), default=0.0)
+    lines = [
+        _code_line(i + 1, cpt["code"], icd_codes, min(cpt["score"], icd_floor) if icds else 0.0)
+        for i, cpt in enumerate(cpts)
+    ]
+    return {
+        **_lines_decision(lines),
+        "explanation": explanation,
+        "status": "pending",
+        "decision_path": path,
+        "messages": [f"Decision made from the search scores ({path}), LLM call skipped."]
+    }
+
+def _describe(candidates: List[CodeCandidate]) -> str:
+    return ", ".join(f"{c['code']} (score {c['score']:.2f})" for c in candidates)
+
+def fast_path_decision(state: ClaimState):
+    """
+    Picks the top ICD-10 and CPT matches directly, without the decision LLM call.
+    """
+    icds, cpts = _fast_path_picks(state)
+    return _score_decision(icds, cpts, "fast_path",
+                           f"Fast path: top vector matches {_describe(icds + cpts)} clearly lead their runner-ups.")
+
+def top_match_decision(state: ClaimState):
+    """
+    Decision node of the extract_once mode: the extraction call already chose the terms,
+    so the best match of each search is taken as the code.
+    """
+    icds = [group[0] for group in _group_by_query(state.get("icd10_candidates", []))]
+    cpts = [group[0] for group in _group_by_query(state.get("cpt_candidates", []))]
+    found = _describe(icds + cpts) or "no matches"
+    return _score_decision(icds, cpts, "top_match", f"Top vector matches for the extracted terms: {found}.")
+
+def note_as_query(state: ClaimState):
+    """
+    Entry node of the lookup_first mode: searches the codes with the raw note instead of
+    LLM-extracted terms, so the decision call is the only LLM round-trip.
+    """
+    return {
+        "extracted_diagnoses": [state["clinical_note"]],
+        "extracted_procedures": [state["clinical_note"]],
+        "extracted_diagnosis": state["clinical_note"],
+        "extracted_procedure": state["clinical_note"],
+        "messages": ["Using the raw note as the search query."]
+    }
+
 # ---------- Node 4: SAVE TO DB --------------------
+def _payout_amount(state: ClaimState) -> float:
+    cpt_codes = [line["cpt_code"] for line in state.get("code_lines") or []] or [state.get("final_cpt_code")]
+    return payout_amount(cpt_codes)
+
+def _claim_row(state: ClaimState):
+    # Map our LangGraph memory state to our SQL Database rows (claims and claim_lines columns).
+    # payment_amount and stripe_transaction_id are filled in by the payout dispatcher once paid
+    claim = {
+        "clinical_note": state["clinical_note"],
+        "extracted_diagnosis": state.get("extracted_diagnosis"),
+        "extracted_procedure": state.get("extracted_procedure"),
+        "icd10_code": state.get("final_icd10_code"),
+        "cpt_code": state.get("final_cpt_code"),
+        "confidence_score": state.get("confidence_score", 0.0),
+        "explanation": state.get("explanation"),
+        "status": state.get("status", "pending"),
+        "rejection_reason": state.get("rejection_reason"),
+        "rule_id": state.get("rule_id"),
+        "payment_amount": 0.0,
+        "stripe_transaction_id": None
+    }
+    if get_settings().store_claim_timings:
+        # Nodes up to adjudication, the save itself is still running
+        claim["timings"] = json.dumps(state.get("timings") or {})
+    lines = [
+        {
+            "line_number": line["line"],
+            "cpt_code": line["cpt_code"],
+            "icd10_codes": ",".join(line["icd10_codes"]),
+            "confidence_score": line["confidence"],
+            "status": line["status"],
+            "rule_id": line["rule_id"],
+            "rejection_reason": line["rejection_reason"]
+        }
+        for line in state.get("code_lines") or []
+    ]
+    return claim, lines
+
+def _submit_claim(state: ClaimState):
+    # Approved claims get a payout in the outbox, committed together with the claim
+    payout = None
+    if state.get("status", "pending") == "approved":
+        payout = _payout_amount(state)
+        logger.info("Claim APPROVED! Queueing Stripe Payout of $%.2f", payout)
+    return get_claim_sink().submit(*_claim_row(state), payout_amount=payout)
+
+def _saved(claim_id: int) -> dict:
+    logger.info("Claim saved to the database with ID: %s", claim_id, extra={"claim_id": claim_id})
+    return {
+        "claim_id": claim_id,
+        "messages": [f"Claim saved to DB with ID: {claim_id}"]
+    }
+
 def save_claim(state: ClaimState):
     """
     Saves the final agent decisions to the SQLite database.
+    The row goes through the write-behind claim sink, which commits the claims of
+    concurrent runs together; this node waits until its claim has an ID.
+    Payouts are only queued here and paid by the payout dispatcher, so no run waits on Stripe.
     """
-    print("--- Node: Saving to DB and Processing Payment ---")
-    db = SessionLocal()
     try:
-        # Determine Payout Amount (Simplified: $50 for Strep, $30 for others)
-        amount = 50.0 if state.get("final_cpt_code") == "87880" else 20.0
-
-        status = state.get("status", "pending")
-        tx_id = None
-
-        # Trigger Payment if "Approved"
-        if status == "approved":
-            print(f"💰 Claim {status.upper()}! Triggering Stripe Payout of ${amount}...")
-            payment_res = process_claim_payout(999, amount) # Using dummy ID for demo
-            if payment_res["success"]:
-                tx_id = payment_res["transaction_id"]
-                print(f"✅ Payment Successful! TX: {tx_id}")
-
-        # Map our LangGraph memory state to our SQL Database row
-        new_claim = Claim(
-            clinical_note = state["clinical_note"],
-            extracted_diagnosis = state.get("extracted_diagnosis"),
-            extracted_procedure = state.get("extracted_procedure"),
-            icd10_code = state.get("final_icd10_code"),
-            cpt_code = state.get("final_cpt_code"),
-            confidence_score = state.get("confidence_score", 0.0),
-            explanation = state.get("explanation"),
-            status = state.get("status", "pending"),
-            rejection_reason = state.get("rejection_reason"),
-            payment_amount = amount if tx_id else 0.0,
-            stripe_transaction_id = tx_id
-        )
-        db.add(new_claim)
-        db.commit()
-        db.refresh(new_claim) # Grabs the auto=generated ID from the Database
-
-        print(f"SUCCESS: Claim securely saved to SQLite Database with ID: {new_claim.id}")
+        return _saved(_submit_claim(state).result())
+    except Exception as e:
+        record_error("node.save", e)
+        logger.error("Error while saving claim: %s", e)
+        return {"messages": ["Error saving to DB."]}
 
-        return {
-            "message": [f"Claim saved to DB with ID: {new_claim.id}"]
-        }
+async def asave_claim(state: ClaimState):
+    """
+    Async version of save_claim. Waiting for the claim sink does not block the event loop.
+    """
+    try:
+        return _saved(await asyncio.wrap_future(_submit_claim(state)))
     except Exception as e:
-        print(f"Error while saving claim: {e}")
+        record_error("node.save", e)
+        logger.error("Error while saving claim: %s", e)
         return {"messages": ["Error saving to DB."]}
-    finally: 
-        db.close()
 
 # ---------- Node 5: PAYER RULE ENGINE -------------
+_LLM_FAILURE = {"status": "suspicious", "rule_id": "LLM_PARSE_FAILURE"}
+
 def adjudicate_claim(state: ClaimState):
     """
-    Passes the final codes through the hardcoded business rules.
+    Passes every code line through the hardcoded business rules.
+    The claim gets the decision of its worst line.
     """
-    print("--- Node: Payer Adjudication ---")
+    lines = state.get("code_lines")
+    if lines is None:
+        # A decision made without code lines only has the single pair of final codes
+        lines = [_code_line(1, state.get("final_cpt_code", ""), [state.get("final_icd10_code", "")],
+                            state.get("confidence_score", 0.0))]
 
-    decision = run_payer_rules (
-        icd_code = state.get("final_icd10_code", ""),
-        cpt_code = state.get("final_cpt_code", ""),
-        confidence = state.get("confidence_score", 0.0)
-    )
+    if state.get("llm_error"):
+        # Without a valid LLM answer the codes are unknown, not missing: a coder has to look at it
+        reason = f"{state['llm_error']} Needs manual coding."
+        decision = {**_LLM_FAILURE, "reason": reason, "lines": [{**_LLM_FAILURE, "reason": reason} for _ in lines]}
+    else:
+        decision = run_claim_rules(lines)
+    lines = [
+        {**line, "status": result["status"], "rule_id": result["rule_id"], "rejection_reason": result["reason"]}
+        for line, result in zip(lines, decision["lines"])
+    ]
 
-    print(f"Adjudication Result: {decision['status'].upper()} (Rule: {decision['rule_id']})")
+    CLAIMS.labels(decision["status"], state.get("decision_path") or "none").inc()
+    logger.info("Adjudication Result: %s (Rule: %s, %d lines)", decision["status"].upper(), decision["rule_id"], len(lines))
 
     return {
+        "code_lines": lines,
         "status": decision["status"],
         "rejection_reason": decision["reason"],
         "rule_id": decision["rule_id"],
@@ -219,22 +736,77 @@ def adjudicate_claim(state: ClaimState):
     }
 
 # ---------- BUILD THE GRAPH -----------------------
-def build_agent():
+# Graph topologies:
+#   two_call     - extract (LLM) -> lookup -> decide (LLM)
+#   extract_once - extract (LLM) -> lookup -> top match of each search
+#   lookup_first - lookup with the raw note -> decide (LLM)
+AGENT_MODES = ("two_call", "extract_once", "lookup_first")
+
+def build_agent(async_mode: bool = False, fast_path: Optional[bool] = None,
+                mode: Optional[str] = None, save: bool = True):
+    """
+    Compiles the claim pipeline.
+    With async_mode=True the I/O nodes are coroutines, so the graph must be run with
+    `ainvoke`, and a single event loop can keep many claims in flight while they wait
+    on Ollama or the database.
+    With fast_path=True (default: DECISION_FAST_PATH) claims whose vector search has a
+    clear winner skip the decision LLM. See route_decision.
+    `mode` (default: AGENT_MODE) picks one of AGENT_MODES; the one-call modes send the
+    note to the LLM once instead of twice. With save=False the graph ends after
+    adjudication without writing the claim or paying it, e.g. for benchmarks.
+    """
+    settings = get_settings()
+    if fast_path is None:
+        fast_path = settings.decision_fast_path
+    mode = mode or settings.agent_mode
+    if mode not in AGENT_MODES:
+        raise ValueError(f"Unknown agent mode '{mode}'. Use one of: {', '.join(AGENT_MODES)}")
+
     workflow = StateGraph(ClaimState)
 
     # Add Nodes
-    workflow.add_node("extract", extract_entities)
-    workflow.add_node("lookup", lookup_codes)
-    workflow.add_node("decide", finalize_coding)
-    workflow.add_node("adjudicate", adjudicate_claim)
-    workflow.add_node("save", save_claim)
+    if async_mode:
+        nodes = {"extract": aextract_entities, "lookup": alookup_codes, "decide": afinalize_coding, "save": asave_claim}
+    else:
+        nodes = {"extract": extract_entities, "lookup": lookup_codes, "decide": finalize_coding, "save": save_claim}
+    if mode == "lookup_first":
+        del nodes["extract"]
+        nodes["note_query"] = note_as_query
+    if mode == "extract_once":
+        del nodes["decide"]
+        nodes["top_match"] = top_match_decision
+    elif fast_path:
+        nodes["fast_decide"] = fast_path_decision
+    if not save:
+        del nodes["save"]
+    nodes["adjudicate"] = adjudicate_claim
+    # Every node records its latency and that of its external calls (see telemetry.timed_node)
+    for name, node in nodes.items():
+        workflow.add_node(name, timed_node(name, node))
 
     # Add Edges (The flow)
-    workflow.set_entry_point("extract")
-    workflow.add_edge("extract", "lookup")
-    workflow.add_edge("lookup", "decide")
-    workflow.add_edge("decide", "adjudicate")
-    workflow.add_edge("adjudicate", "save")
-    workflow.add_edge("save", END)
+    if mode == "lookup_first":
+        workflow.set_entry_point("note_query")
+        workflow.add_edge("note_query", "lookup")
+    else:
+        workflow.set_entry_point("extract")
+        workflow.add_edge("extract", "lookup")
+
+    if mode == "extract_once":
+        workflow.add_edge("lookup", "top_match")
+        workflow.add_edge("top_match", "adjudicate")
+    elif fast_path:
+        workflow.add_conditional_edges("lookup", route_decision, {"fast_path": "fast_decide", "llm": "decide"})
+        workflow.add_edge("fast_decide", "adjudicate")
+    else:
+        workflow.add_edge("lookup", "decide")
+    if mode != "extract_once":
+        workflow.add_edge("decide", "adjudicate")
+
+    if save:
+        workflow.add_edge("adjudicate", "save")
+        workflow.add_edge("save", END)
+    else:
+        workflow.add_edge("adjudicate", END)
 
     return workflow.compile()
\ No newline at end of file
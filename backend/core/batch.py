@@ -0,0 +1,165 @@
+import json
+import time
+import asyncio
+from typing import AsyncIterable, AsyncIterator, Iterable, Union
+
+from backend.core.agent import build_agent
+
+# How many claims may be inside the agent graph at the same time.
+# The graph is async, so claims waiting on Ollama only cost a coroutine, not a thread.
+DEFAULT_CONCURRENCY = 32
+MAX_CONCURRENCY = 256
+
+# The compiled graph is stateless between runs, so one copy serves every request
+_agent = None
+
+def get_agent():
+    """
+    Returns the compiled async LangGraph pipeline, building it on first use.
+    """
+    global _agent
+    if _agent is None:
+        _agent = build_agent(async_mode=True)
+    return _agent
+
+def summarize_claim(index: int, state: dict, latency: float) -> dict:
+    """
+    Turns the final graph state of one claim into a compact, JSON friendly result row.
+    """
+    return {
+        "type": "claim",
+        "index": index,
+        "ok": True,
+        "claim_id": state.get("claim_id"),
+        "final_icd10_code": state.get("final_icd10_code"),
+        "final_cpt_code": state.get("final_cpt_code"),
+        "code_lines": [
+            {k: line[k] for k in ("line", "cpt_code", "icd10_codes", "confidence", "status", "rule_id")}
+            for line in state.get("code_lines") or []
+        ],
+        "confidence_score": state.get("confidence_score", 0.0),
+        "decision_path": state.get("decision_path"),
+        "status": state.get("status", "pending"),
+        "rule_id": state.get("rule_id"),
+        "rejection_reason": state.get("rejection_reason"),
+        "latency_seconds": round(latency, 4),
+        "timings_ms": state.get("timings") or {}
+    }
+
+async def iter_ndjson_notes(chunks: AsyncIterable[bytes]) -> AsyncIterator[str]:
+    """
+    Parses a JSONL/NDJSON byte stream into clinical notes as the bytes arrive.
+    Every line is either a JSON string or an object with a "clinical_note" (or "note") key.
+    """
+    buffer = b""
+    async for chunk in chunks:
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            note = _parse_note_line(line)
+            if note is not None:
+                yield note
+
+    # The last line may not end with a newline
+    note = _parse_note_line(buffer)
+    if note is not None:
+        yield note
+
+def _parse_note_line(line: bytes):
+    line = line.strip()
+    if not line:
+        return None
+
+    item = json.loads(line)
+    if isinstance(item, str):
+        return item
+    if isinstance(item, dict):
+        note = item.get("clinical_note") or item.get("note")
+        if isinstance(note, str):
+            return note
+    raise ValueError(f"Each JSONL line must be a string or contain 'clinical_note', got: {line[:80]!r}")
+
+async def _aiter_notes(notes: Union[Iterable[str], AsyncIterable[str]]) -> AsyncIterator[str]:
+    if hasattr(notes, "__aiter__"):
+        async for note in notes:
+            yield note
+    else:
+        for note in notes:
+            yield note
+
+async def run_claims_batch(
+    notes: Union[Iterable[str], AsyncIterable[str]],
+    concurrency: int = DEFAULT_CONCURRENCY,
+    bypass_llm_cache: bool = False
+) -> AsyncIterator[dict]:
+    """
+    Runs many clinical notes through the agent graph with bounded concurrency.
+    With bypass_llm_cache=True every note is sent to the LLM even if it was seen before.
+
+    Yields one result row per claim in completion order (not submission order, the
+    "index" field tells which note it was), followed by a final "summary" row with the
+    aggregate throughput of the whole batch.
+    """
+    concurrency = max(1, min(concurrency, MAX_CONCURRENCY))
+    agent = get_agent()
+
+    counts = {"approved": 0, "rejected": 0, "suspicious": 0, "pending": 0}
+    totals = {"total": 0, "failed": 0, "latency_sum": 0.0}
+    start = time.perf_counter()
+
+    def record(row: dict) -> dict:
+        totals["total"] += 1
+        totals["latency_sum"] += row["latency_seconds"]
+        if row["ok"]:
+            counts[row["status"]] = counts.get(row["status"], 0) + 1
+        else:
+            totals["failed"] += 1
+        return row
+
+    async def run_one(index: int, note: str) -> dict:
+        claim_start = time.perf_counter()
+        try:
+            state = await agent.ainvoke({"clinical_note": note, "bypass_llm_cache": bypass_llm_cache, "messages": []})
+            return summarize_claim(index, state, time.perf_counter() - claim_start)
+        except Exception as e:
+            return {
+                "type": "claim",
+                "index": index,
+                "ok": False,
+                "error": str(e),
+                "latency_seconds": round(time.perf_counter() - claim_start, 4)
+            }
+
+    # Only `concurrency` notes are pulled from the input at a time, so a huge
+    # upload is never fully held in memory
+    in_flight = set()
+    index = 0
+    async for note in _aiter_notes(notes):
+        if len(in_flight) >= concurrency:
+            done, in_flight = await asyncio.wait(in_flight, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                yield record(task.result())
+
+        in_flight.add(asyncio.create_task(run_one(index, note)))
+        index += 1
+
+    while in_flight:
+        done, in_flight = await asyncio.wait(in_flight, return_when=asyncio.FIRST_COMPLETED)
+        for task in done:
+            yield record(task.result())
+
+    elapsed = time.perf_counter() - start
+    total = totals["total"]
+    failed = totals["failed"]
+    latency_sum = totals["latency_sum"]
+    yield {
+        "type": "summary",
+        "total": total,
+        "succeeded": total - failed,
+        "failed": failed,
+        "status_counts": counts,
+        "concurrency": concurrency,
+        "elapsed_seconds": round(elapsed, 4),
+        "claims_per_second": round(total / elapsed, 4) if elapsed > 0 else 0.0,
+        "mean_latency_seconds": round(latency_sum / total, 4) if total else 0.0
+    }
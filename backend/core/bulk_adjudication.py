@@ -0,0 +1,326 @@
+import logging
+import argparse
+import datetime
+import weakref
+import numpy as np
+from typing import Optional, Sequence
+from sqlalchemy import select, update, insert, func, bindparam, case
+from backend.core.rule_engine import RuleEngine, INVALID_CODES, get_rule_engine
+from backend.core.payments import payout_amount, payout_idempotency_key
+from backend.data.db import SessionLocal, Claim, ClaimLine, Payout
+from backend.core.telemetry import configure_logging
+
+logger = logging.getLogger(__name__)
+
+# Claims read, adjudicated and written back per transaction
+DEFAULT_CHUNK_SIZE = 50_000
+
+# Human decisions (see backend/core/review.py) are never overwritten by a re-run
+HUMAN_OVERRIDE_PREFIX = "Human Override"
+
+# Claims the LLM could not code (see adjudicate_claim in backend/core/agent.py) wait for a
+# human coder. Their codes are unknown, not missing, so the rules have nothing to decide
+LLM_FAILURE_RULE_ID = "LLM_PARSE_FAILURE"
+
+class _CoverageColumns:
+    """
+    The coverage rules of an engine laid out as arrays: rules numbered per CPT code in
+    evaluation order, and the set of "rule:prefix" keys per prefix length.
+
+    Every fixed decision gets an outcome number (PASS, R0, then one per coverage rule)
+    so rows carry a single int until the very end.
+    """
+    def __init__(self, engine: RuleEngine):
+        cpts = sorted(engine.coverage_cpts)
+        rule_ids, reasons, starts, counts = [], [], [], []
+        keys = {}
+        for cpt in cpts:
+            rules = engine.coverage_for(cpt)
+            starts.append(len(rule_ids))
+            counts.append(len(rules))
+            for rule in rules:
+                number = len(rule_ids)
+                rule_ids.append(rule.rule_id)
+                reasons.append(rule.reason)
+                for prefix in rule.prefixes:
+                    keys.setdefault(len(prefix), set()).add(f"{number}:{prefix}")
+
+        self.cpts = np.array(cpts, dtype=str)
+        self.rule_start = np.array(starts, dtype=np.int64)
+        self.rule_count = np.array(counts, dtype=np.int64)
+        self.statuses = ["approved", "rejected"] + ["rejected"] * len(rule_ids)
+        self.reasons = ["Claim meets all medical necessity rules.", "Missing diagnosis or procedure code."] + reasons
+        self.rule_ids = ["PASS", "R0_MISSING_DATA"] + rule_ids
+        self.keys_by_length = {length: np.array(sorted(k), dtype=str) for length, k in keys.items()}
+
+PASS, MISSING_DATA, FIRST_COVERAGE_RULE = 0, 1, 2
+
+# Built once per compiled engine
+_columns_cache = weakref.WeakKeyDictionary()
+
+def _coverage_columns(engine: RuleEngine) -> _CoverageColumns:
+    columns = _columns_cache.get(engine)
+    if columns is None:
+        columns = _columns_cache[engine] = _CoverageColumns(engine)
+    return columns
+
+def _as_str_array(values) -> np.ndarray:
+    # str(None) is "None", exactly like the scalar rules see a missing code
+    return np.asarray(values, dtype=object).astype(str) if len(values) else np.array([], dtype=str)
+
+def _change_case(values: np.ndarray, upper: bool) -> np.ndarray:
+    """
+    str.upper()/str.lower() for a whole array. Codes are ASCII, so the case flip is a
+    single arithmetic op on the code points instead of a Python call per string.
+    """
+    if values.size == 0 or values.dtype.itemsize == 0:
+        return values
+    points = values.view(np.uint32).reshape(len(values), -1)
+    if points.max() > 127:
+        return np.char.upper(values) if upper else np.char.lower(values)
+    low, high, shift = (97, 122, -32) if upper else (65, 90, 32)
+    flip = (points >= low) & (points <= high)
+    return (points + flip * np.uint32(shift & 0xFFFFFFFF)).astype(np.uint32).view(values.dtype).reshape(len(values))
+
+def adjudicate_columns(icd_codes: Sequence, cpt_codes: Sequence, confidences: Sequence,
+                       engine: Optional[RuleEngine] = None) -> dict:
+    """
+    Applies the payer rules to whole columns of single-line claims at once.
+
+    Takes equally long sequences (lists, NumPy or Arrow arrays) of ICD-10 codes, CPT codes
+    and confidences, and returns {"status", "reason", "rule_id"} as NumPy arrays. Row i
+    gets exactly what run_payer_rules(icd_codes[i], cpt_codes[i], confidences[i]) returns.
+    Instead of one Python call per row, every rule is applied with array operations:
+    rows are joined to the coverage rules of their CPT code and matched against the
+    rules' ICD-10 prefixes with one set lookup per prefix length.
+    """
+    engine = engine or get_rule_engine()
+    icd_raw = _as_str_array(icd_codes)
+    cpt_raw = _as_str_array(cpt_codes)
+    confidences = list(confidences)
+    conf = np.asarray(confidences, dtype=np.float64)
+    n = len(icd_raw)
+    if not (len(cpt_raw) == len(conf) == n):
+        raise ValueError("icd_codes, cpt_codes and confidences must have the same length")
+
+    columns = _coverage_columns(engine)
+    outcome = np.full(n, PASS, dtype=np.int64)
+    statuses, reasons, rule_ids = list(columns.statuses), list(columns.reasons), list(columns.rule_ids)
+
+    if n:
+        # Same normalization as the scalar engine (normalize_icd / normalize_cpt), element-wise
+        icd_stripped = np.char.strip(icd_raw)
+        icd = np.char.replace(_change_case(icd_stripped, upper=True), ".", "")
+        cpt = _change_case(np.char.strip(cpt_raw), upper=True)
+        invalid = list(INVALID_CODES)
+
+        # Rule 0: Missing or 'None' data
+        missing = np.isin(_change_case(icd_stripped, upper=False), invalid) | np.isin(_change_case(cpt, upper=False), invalid)
+        outcome[missing] = MISSING_DATA
+
+        # Rule 1: AI Confidence threshold. The message quotes the confidence as it was
+        # passed in, so there is one outcome per distinct value
+        low_rows = np.flatnonzero(~missing & (conf < engine.min_confidence))
+        if len(low_rows):
+            _, first, inverse = np.unique(conf[low_rows], return_index=True, return_inverse=True)
+            outcome[low_rows] = len(statuses) + inverse.reshape(-1)
+            for i in first:
+                statuses.append("suspicious")
+                reasons.append(
+                    f"AI confidence ({confidences[low_rows[i]]}) is below the {engine.min_confidence:.0%} threshold. "
+                    "Manual review required"
+                )
+                rule_ids.append("R1_LOW_CONFIDENCE")
+
+        # Coverage: every remaining row is paired with the coverage rules of its CPT code
+        rows = np.flatnonzero(outcome == PASS)
+        if len(rows) and len(columns.cpts):
+            pos = np.minimum(np.searchsorted(columns.cpts, cpt[rows]), len(columns.cpts) - 1)
+            has_rules = columns.cpts[pos] == cpt[rows]
+            rows, pos = rows[has_rules], pos[has_rules]
+
+            counts = columns.rule_count[pos]
+            pair_row = np.repeat(rows, counts)
+            # Rules of one CPT are numbered consecutively, in evaluation order
+            offset = np.arange(len(pair_row)) - np.repeat(np.cumsum(counts) - counts, counts)
+            pair_rule = np.repeat(columns.rule_start[pos], counts) + offset
+
+            # A pair is covered when the diagnosis, cut to the length of one of the rule's
+            # prefixes, is that prefix. One set lookup per distinct prefix length.
+            rule_key = np.char.add(pair_rule.astype(str), ":")
+            pair_icd = icd[pair_row]
+            covered = np.zeros(len(pair_row), dtype=bool)
+            for length, keys in columns.keys_by_length.items():
+                cut = pair_icd.astype(f"U{length}") if length else np.full(len(pair_icd), "")
+                covered |= np.isin(np.char.add(rule_key, cut), keys)
+
+            # A row is denied by the first of its rules that does not cover it
+            denied_rows, first_denial = np.unique(pair_row[~covered], return_index=True)
+            outcome[denied_rows] = FIRST_COVERAGE_RULE + pair_rule[~covered][first_denial]
+
+    return {
+        "status": np.array(statuses, dtype=object)[outcome],
+        "reason": np.array(reasons, dtype=object)[outcome],
+        "rule_id": np.array(rule_ids, dtype=object)[outcome],
+    }
+
+def _sync_payouts(db, claim_updates: list, old_status: Sequence[str], cpts: Sequence[str]):
+    """
+    Keeps the payouts outbox in step with the claims whose approval changed. Pending payouts
+    of claims no longer approved are cancelled. Claims approved again get their cancelled
+    payout back, and claims approved for the first time a new one. Payouts already sent
+    ('processing', 'paid') are money out of the door and left as they are.
+    """
+    now = datetime.datetime.now(datetime.timezone.utc)
+    revoked = [{"key": u["id"]} for u, old in zip(claim_updates, old_status)
+               if old == "approved" and u["status"] != "approved"]
+    granted = {u["id"]: cpt for u, old, cpt in zip(claim_updates, old_status, cpts)
+               if old != "approved" and u["status"] == "approved"}
+
+    payouts_table = Payout.__table__
+    if revoked:
+        db.execute(
+            payouts_table.update()
+            .where(payouts_table.c.claim_id == bindparam("key"), payouts_table.c.status == "pending")
+            .values(status="cancelled", updated_at=now),
+            revoked
+        )
+    if not granted:
+        return
+    db.execute(
+        payouts_table.update()
+        .where(payouts_table.c.claim_id == bindparam("key"), payouts_table.c.status == "cancelled")
+        .values(status="pending", next_attempt_at=now, updated_at=now),
+        [{"key": claim_id} for claim_id in granted]
+    )
+    queued = set(db.execute(select(Payout.claim_id).where(Payout.claim_id.in_(list(granted)))).scalars())
+    new = [claim_id for claim_id in granted if claim_id not in queued]
+    if not new:
+        return
+    # Same amount the graph would have queued: per line, or the claim's own code without lines
+    line_cpts = {}
+    for claim_id, cpt in db.execute(
+        select(ClaimLine.claim_id, ClaimLine.cpt_code).where(ClaimLine.claim_id.in_(new)).order_by(ClaimLine.line_number)
+    ):
+        line_cpts.setdefault(claim_id, []).append(cpt)
+    db.execute(insert(Payout), [
+        {"claim_id": claim_id, "amount": payout_amount(line_cpts.get(claim_id) or [granted[claim_id]]),
+         "idempotency_key": payout_idempotency_key(claim_id), "status": "pending",
+         "next_attempt_at": now, "created_at": now, "updated_at": now}
+        for claim_id in new
+    ])
+    logger.info("Queued %d payouts for newly approved claims", len(new))
+
+def readjudicate_claims(chunk_size: int = DEFAULT_CHUNK_SIZE, statuses: Optional[Sequence[str]] = None,
+                        engine: Optional[RuleEngine] = None) -> dict:
+    """
+    Re-runs the current payer rules over the stored claims, e.g. after a policy change,
+    and writes back status, rejection_reason and rule_id with bulk UPDATEs.
+
+    Claims without lines, or with one line linked to one diagnosis, go through
+    adjudicate_columns. The rest (several lines, or a line with secondary diagnoses) are
+    adjudicated with the claim-level engine over their line rows, like run_claim_rules did
+    (NCCI edits span lines, coverage looks at every linked ICD), and their line rows are
+    updated too. Claims decided by a human reviewer, or waiting for one because the LLM
+    could not code them, are left alone.
+    The payouts outbox follows in the same transaction (see _sync_payouts): a claim that
+    is no longer approved has its pending payout cancelled, a newly approved one gets one.
+    Returns how many claims were read, how many changed status and how many went line by line.
+    """
+    engine = engine or get_rule_engine()
+    line_counts = (
+        select(ClaimLine.claim_id, func.count().label("n"),
+               func.max(case((ClaimLine.icd10_codes.like("%,%"), 1), else_=0)).label("multi_icd"))
+        .group_by(ClaimLine.claim_id)
+        .subquery()
+    )
+    totals = {"claims": 0, "changed": 0, "multi_line": 0}
+    last_id = 0
+
+    db = SessionLocal()
+    try:
+        while True:
+            query = (
+                select(Claim.id, Claim.icd10_code, Claim.cpt_code, Claim.confidence_score, Claim.status,
+                       func.coalesce(line_counts.c.n, 0), func.coalesce(line_counts.c.multi_icd, 0))
+                .outerjoin(line_counts, line_counts.c.claim_id == Claim.id)
+                .where(Claim.id > last_id)
+                .where(func.coalesce(Claim.rejection_reason, "").not_like(f"{HUMAN_OVERRIDE_PREFIX}%"))
+                .where(func.coalesce(Claim.rule_id, "") != LLM_FAILURE_RULE_ID)
+                .order_by(Claim.id)
+                .limit(chunk_size)
+            )
+            if statuses:
+                query = query.where(Claim.status.in_(statuses))
+            rows = db.execute(query).all()
+            if not rows:
+                break
+            last_id = rows[-1][0]
+
+            ids, icds, cpts, confs, old_status, n_lines, multi_icd = zip(*rows)
+            result = adjudicate_columns(icds, cpts, [c if c is not None else 0.0 for c in confs], engine)
+            claim_updates = [
+                {"id": claim_id, "status": s, "rejection_reason": r, "rule_id": rid}
+                for claim_id, s, r, rid in zip(ids, result["status"], result["reason"], result["rule_id"])
+            ]
+            line_updates = []
+
+            # Several lines or secondary diagnoses: the claim-level engine decides, line by line
+            multi = {claim_id: pos for pos, (claim_id, n, several_icds) in enumerate(zip(ids, n_lines, multi_icd))
+                     if n > 1 or several_icds}
+            if multi:
+                lines = db.execute(
+                    select(ClaimLine.id, ClaimLine.claim_id, ClaimLine.cpt_code, ClaimLine.icd10_codes,
+                           ClaimLine.confidence_score)
+                    .where(ClaimLine.claim_id.in_(list(multi)))
+                    .order_by(ClaimLine.claim_id, ClaimLine.line_number)
+                ).all()
+                by_claim = {}
+                for line in lines:
+                    by_claim.setdefault(line.claim_id, []).append(line)
+                for claim_id, claim_lines in by_claim.items():
+                    decision = engine.evaluate_claim([
+                        {"cpt_code": line.cpt_code, "icd10_codes": (line.icd10_codes or "").split(","),
+                         "confidence": line.confidence_score or 0.0}
+                        for line in claim_lines
+                    ])
+                    claim_updates[multi[claim_id]].update(
+                        status=decision["status"], rejection_reason=decision["reason"], rule_id=decision["rule_id"]
+                    )
+                    line_updates += [
+                        {"key": line.id, "s": d["status"], "r": d["reason"], "rid": d["rule_id"]}
+                        for line, d in zip(claim_lines, decision["lines"])
+                    ]
+
+            # One line with one diagnosis: the line row gets the claim's decision
+            single_updates = [
+                {"key": u["id"], "s": u["status"], "r": u["rejection_reason"], "rid": u["rule_id"]}
+                for u, n in zip(claim_updates, n_lines) if n == 1 and u["id"] not in multi
+            ]
+
+            db.execute(update(Claim), claim_updates)
+            # Line rows are matched by their own id or by their claim's id, so these are Core UPDATEs
+            lines_table = ClaimLine.__table__
+            values = dict(status=bindparam("s"), rejection_reason=bindparam("r"), rule_id=bindparam("rid"))
+            if line_updates:
+                db.execute(lines_table.update().where(lines_table.c.id == bindparam("key")).values(**values), line_updates)
+            if single_updates:
+                db.execute(lines_table.update().where(lines_table.c.claim_id == bindparam("key")).values(**values), single_updates)
+            _sync_payouts(db, claim_updates, old_status, cpts)
+            db.commit()
+
+            totals["claims"] += len(rows)
+            totals["multi_line"] += len(multi)
+            totals["changed"] += sum(u["status"] != old for u, old in zip(claim_updates, old_status))
+            logger.info("Re-adjudicated %d claims (%d changed status)", totals["claims"], totals["changed"])
+        return totals
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Re-run the payer rules over every stored claim.")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument("--status", action="append", help="Only claims currently in this status (repeatable).")
+    args = parser.parse_args()
+    configure_logging()
+    print(readjudicate_claims(chunk_size=args.chunk_size, statuses=args.status))
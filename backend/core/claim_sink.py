@@ -0,0 +1,205 @@
+import time
+import queue
+import atexit
+import logging
+import threading
+from concurrent.futures import Future, InvalidStateError
+from typing import List, Optional
+from sqlalchemy import insert
+from backend.core.config import get_settings
+from backend.core.payments import payout_idempotency_key
+from backend.data.db import engine, Claim, ClaimLine, Payout
+from backend.core.telemetry import external_call
+
+logger = logging.getLogger(__name__)
+
+# Flush latencies kept for the stats (most recent ones)
+LATENCY_WINDOW = 1024
+
+def _resolve(future: Future, result=None, error: Optional[BaseException] = None):
+    # An asave_claim task that was cancelled cancels its Future too (asyncio.wrap_future).
+    # Its claim is written all the same, there is just nobody left to tell
+    if future.done():
+        return
+    try:
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+    except InvalidStateError:
+        pass
+
+class ClaimSink:
+    """
+    Write-behind buffer for finished claims.
+
+    Graph runs hand their claim rows (and payout, if any) to submit() and get a Future of
+    the new claim ID. One writer thread collects the rows and inserts them in bulk, one
+    transaction per batch instead of one commit (and fsync) per claim. A batch is written
+    as soon as it holds max_batch claims, or flush_ms after its first claim arrived.
+    """
+    def __init__(self, max_batch: int, flush_ms: float):
+        self.max_batch = max(1, max_batch)
+        self.flush_interval = max(0.0, flush_ms) / 1000.0
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._closed = False
+        self.flushes = 0
+        self.claims_written = 0
+        self.failed_flushes = 0
+        self.max_batch_seen = 0
+        self._latencies = []
+
+        self._thread = threading.Thread(target=self._run, name="claim-sink", daemon=True)
+        self._thread.start()
+
+    def submit(self, claim: dict, lines: List[dict], payout_amount: Optional[float] = None) -> Future:
+        """
+        Queues one claim (column values) and its line rows, plus a payout to put in the
+        outbox when payout_amount is given. The Future resolves to the claim ID once the
+        batch holding it is committed, or raises the error that failed the batch.
+        """
+        future = Future()
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("The claim sink is closed.")
+            self._queue.put(((claim, lines, payout_amount), future))
+        return future
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            batch = [item]
+            deadline = time.monotonic() + self.flush_interval
+            stop = False
+            while len(batch) < self.max_batch:
+                try:
+                    # Whatever already waits is taken right away, then we wait out the window
+                    item = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                if item is None:
+                    stop = True
+                    break
+                batch.append(item)
+            try:
+                self._flush(batch)
+            except Exception as e:
+                # The writer thread must outlive any one batch, or every later save hangs
+                logger.exception("Claim sink error: %s", e)
+            if stop:
+                return
+
+    def _flush(self, batch: list):
+        start = time.perf_counter()
+        try:
+            with external_call("db", "claim_batch_insert"):
+                ids = self._write([rows for rows, _ in batch])
+        except Exception as e:
+            logger.error("Claim sink could not write a batch of %d claims: %s", len(batch), e)
+            with self._lock:
+                self.failed_flushes += 1
+            for _, future in batch:
+                _resolve(future, error=e)
+            return
+
+        elapsed = time.perf_counter() - start
+        with self._lock:
+            self.flushes += 1
+            self.claims_written += len(batch)
+            self.max_batch_seen = max(self.max_batch_seen, len(batch))
+            self._latencies.append(elapsed)
+            del self._latencies[:-LATENCY_WINDOW]
+        for (_, future), claim_id in zip(batch, ids):
+            _resolve(future, result=claim_id)
+
+    @staticmethod
+    def _write(batch: List[tuple]) -> List[int]:
+        claims_table, lines_table = Claim.__table__, ClaimLine.__table__
+        claims = [claim for claim, _, _ in batch]
+        with engine.begin() as conn:
+            if engine.dialect.insert_executemany_returning_sort_by_parameter_order:
+                # One multi-row INSERT ... RETURNING id, IDs in the order of the rows
+                ids = conn.execute(
+                    insert(claims_table).returning(claims_table.c.id, sort_by_parameter_order=True), claims
+                ).scalars().all()
+            else:
+                ids = [conn.execute(insert(claims_table), claim).inserted_primary_key[0] for claim in claims]
+
+            lines = [
+                {**line, "claim_id": claim_id}
+                for claim_id, (_, claim_lines, _) in zip(ids, batch)
+                for line in claim_lines
+            ]
+            if lines:
+                conn.execute(insert(lines_table), lines)
+
+            # Payout outbox rows commit with their claims, so an approved claim is never left unpaid
+            payouts = [
+                {"claim_id": claim_id, "amount": amount, "idempotency_key": payout_idempotency_key(claim_id)}
+                for claim_id, (_, _, amount) in zip(ids, batch)
+                if amount is not None
+            ]
+            if payouts:
+                conn.execute(insert(Payout.__table__), payouts)
+        return ids
+
+    def close(self, timeout: Optional[float] = 10.0):
+        """
+        Stops taking claims and writes out everything still queued.
+        """
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._queue.put(None)
+        self._thread.join(timeout)
+
+    def stats(self) -> dict:
+        with self._lock:
+            latencies = sorted(self._latencies)
+            return {
+                "queued": self._queue.qsize(),
+                "flushes": self.flushes,
+                "failed_flushes": self.failed_flushes,
+                "claims_written": self.claims_written,
+                "avg_batch_size": round(self.claims_written / self.flushes, 2) if self.flushes else 0.0,
+                "max_batch_size": self.max_batch_seen,
+                "flush_ms_avg": round(sum(latencies) / len(latencies) * 1000, 3) if latencies else 0.0,
+                "flush_ms_p50": round(latencies[len(latencies) // 2] * 1000, 3) if latencies else 0.0,
+                "flush_ms_max": round(latencies[-1] * 1000, 3) if latencies else 0.0
+            }
+
+_sink = None
+_sink_lock = threading.Lock()
+
+def get_claim_sink() -> ClaimSink:
+    """
+    Returns the process-wide claim sink, starting its writer thread on first use.
+    """
+    global _sink
+    if _sink is None:
+        with _sink_lock:
+            if _sink is None:
+                settings = get_settings()
+                _sink = ClaimSink(settings.claim_sink_max_batch, settings.claim_sink_flush_ms)
+    return _sink
+
+def close_claim_sink():
+    """
+    Flushes and stops the claim sink (called on API shutdown and at interpreter exit).
+    """
+    global _sink
+    with _sink_lock:
+        sink, _sink = _sink, None
+    if sink is not None:
+        sink.close()
+
+def claim_sink_stats() -> dict:
+    if _sink is None:
+        return {"running": False}
+    return {"running": True, **_sink.stats()}
+
+atexit.register(close_claim_sink)
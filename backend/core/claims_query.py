@@ -0,0 +1,104 @@
+import json
+import base64
+import datetime
+from typing import Optional
+from sqlalchemy import select, tuple_
+from backend.data.db import SessionLocal, Claim
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+# Only the columns a work queue shows, so listing never loads notes or claim lines
+_LIST_COLUMNS = (
+    Claim.id, Claim.timestamp, Claim.status, Claim.rule_id, Claim.icd10_code, Claim.cpt_code,
+    Claim.confidence_score, Claim.rejection_reason, Claim.payment_amount
+)
+
+def as_utc(value: datetime.datetime) -> datetime.datetime:
+    """
+    Claim timestamps are UTC. SQLite reads them back naive and drops the offset of aware
+    values without converting them, so every value crossing the query is made aware UTC.
+    Naive inputs are taken as UTC.
+    """
+    if value.tzinfo is None:
+        return value.replace(tzinfo=datetime.timezone.utc)
+    return value.astimezone(datetime.timezone.utc)
+
+def encode_cursor(timestamp: datetime.datetime, claim_id: int) -> str:
+    return base64.urlsafe_b64encode(json.dumps([as_utc(timestamp).isoformat(), claim_id]).encode()).decode()
+
+def decode_cursor(cursor: str):
+    try:
+        timestamp, claim_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return as_utc(datetime.datetime.fromisoformat(timestamp)), int(claim_id)
+    except (ValueError, TypeError) as e:
+        raise ValueError(f"Invalid cursor: {cursor!r}") from e
+
+def claims_page_query(status: Optional[str] = None, rule_id: Optional[str] = None,
+                      since: Optional[datetime.datetime] = None, until: Optional[datetime.datetime] = None,
+                      limit: int = DEFAULT_PAGE_SIZE, cursor: Optional[str] = None, newest_first: bool = False):
+    """
+    The SELECT behind list_claims. It fetches limit + 1 rows; the extra one tells whether
+    there is a next page.
+    """
+    query = select(*_LIST_COLUMNS).where(Claim.timestamp.is_not(None))
+    if status is not None:
+        query = query.where(Claim.status == status)
+    if rule_id is not None:
+        query = query.where(Claim.rule_id == rule_id)
+    if since is not None:
+        query = query.where(Claim.timestamp >= as_utc(since))
+    if until is not None:
+        query = query.where(Claim.timestamp < as_utc(until))
+
+    position = tuple_(Claim.timestamp, Claim.id)
+    if cursor is not None:
+        after = decode_cursor(cursor)
+        query = query.where(position < after if newest_first else position > after)
+    if newest_first:
+        query = query.order_by(Claim.timestamp.desc(), Claim.id.desc())
+    else:
+        query = query.order_by(Claim.timestamp, Claim.id)
+    return query.limit(limit + 1)
+
+def claims_page(rows: list, limit: int) -> dict:
+    claims = [
+        {
+            "id": row.id,
+            "timestamp": as_utc(row.timestamp).isoformat(),
+            "status": row.status,
+            "rule_id": row.rule_id,
+            "icd10_code": row.icd10_code,
+            "cpt_code": row.cpt_code,
+            "confidence_score": row.confidence_score,
+            "rejection_reason": row.rejection_reason,
+            "payment_amount": row.payment_amount
+        }
+        for row in rows[:limit]
+    ]
+    next_cursor = None
+    if len(rows) > limit:
+        last = rows[limit - 1]
+        next_cursor = encode_cursor(last.timestamp, last.id)
+    return {"claims": claims, "next_cursor": next_cursor}
+
+def list_claims(status: Optional[str] = None, rule_id: Optional[str] = None,
+                since: Optional[datetime.datetime] = None, until: Optional[datetime.datetime] = None,
+                limit: int = DEFAULT_PAGE_SIZE, cursor: Optional[str] = None, newest_first: bool = False) -> dict:
+    """
+    One page of claims in time order, e.g. all suspicious claims oldest first, or the
+    rejections of one payer rule this week.
+
+    Pages are keyset-based: next_cursor holds the (timestamp, id) of the last claim
+    returned, and the next page starts right after it. Every page is a range scan of the
+    (status, timestamp) or (rule_id, timestamp) index, however deep into the queue, and
+    claims saved meanwhile never shift or repeat rows the way OFFSET pages do.
+    """
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    query = claims_page_query(status, rule_id, since, until, limit, cursor, newest_first)
+    db = SessionLocal()
+    try:
+        rows = db.execute(query).all()
+    finally:
+        db.close()
+    return claims_page(rows, limit)
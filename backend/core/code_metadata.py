@@ -0,0 +1,120 @@
+import mmap
+import struct
+import numpy as np
+
+# File layout of one code type's metadata (all integers little-endian):
+#
+#   header        magic, slot count, code count, code blob size, desc blob size
+#   present       uint8[slots]        1 if a code is stored under that row id
+#   hashes        16 bytes * slots    content hash of "code: description"
+#   code_offsets  uint64[slots + 1]   start of each code in the code blob
+#   desc_offsets  uint64[slots + 1]   start of each description in the desc blob
+#   code blob     packed UTF-8 codes
+#   desc blob     packed UTF-8 descriptions
+#
+# Slots are indexed directly by the database row id (the FAISS id), so turning a search
+# hit into its code is two offset reads and a slice. The file is memory-mapped, so
+# every worker process shares the same page-cache pages and nothing is parsed at startup.
+MAGIC = b"MCMETA01"
+_HEADER = struct.Struct("<8sQQQQ")
+HASH_SIZE = 16
+
+def _align(offset: int) -> int:
+    return (offset + 7) & ~7
+
+def write_code_metadata(path: str, items: dict):
+    """
+    Writes {row id: {"code", "desc", "hash"}} in the columnar format above.
+    """
+    slots = max(items) + 1 if items else 0
+    present = np.zeros(slots, dtype=np.uint8)
+    hashes = np.zeros((slots, HASH_SIZE), dtype=np.uint8)
+    code_offsets = np.zeros(slots + 1, dtype="<u8")
+    desc_offsets = np.zeros(slots + 1, dtype="<u8")
+    codes, descs = [], []
+
+    code_size = desc_size = 0
+    for row_id in range(slots):
+        item = items.get(row_id)
+        if item is not None:
+            code, desc = item["code"].encode("utf-8"), item["desc"].encode("utf-8")
+            present[row_id] = 1
+            hashes[row_id] = np.frombuffer(bytes.fromhex(item["hash"]), dtype=np.uint8)
+            codes.append(code)
+            descs.append(desc)
+            code_size += len(code)
+            desc_size += len(desc)
+        code_offsets[row_id + 1] = code_size
+        desc_offsets[row_id + 1] = desc_size
+
+    with open(path, "wb") as f:
+        f.write(_HEADER.pack(MAGIC, slots, len(items), code_size, desc_size))
+        for column in (present, hashes, code_offsets, desc_offsets):
+            f.write(b"\0" * (_align(f.tell()) - f.tell()))
+            f.write(column.tobytes())
+        f.write(b"".join(codes))
+        f.write(b"".join(descs))
+
+class CodeMetadata:
+    """
+    Read-only, memory-mapped view of a metadata file written by write_code_metadata.
+    Behaves like the {row id: {"code", "desc"}} dict it replaces.
+    """
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, slots, count, code_size, desc_size = _HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a code metadata file")
+        self._slots = slots
+        self._count = count
+
+        offset = _align(_HEADER.size)
+        self._present = np.frombuffer(self._mm, dtype=np.uint8, count=slots, offset=offset)
+        offset = _align(offset + slots)
+        self._hashes = np.frombuffer(self._mm, dtype=np.uint8, count=slots * HASH_SIZE, offset=offset)
+        offset = _align(offset + slots * HASH_SIZE)
+        self._code_offsets = np.frombuffer(self._mm, dtype="<u8", count=slots + 1, offset=offset)
+        offset += 8 * (slots + 1)
+        self._desc_offsets = np.frombuffer(self._mm, dtype="<u8", count=slots + 1, offset=offset)
+        offset += 8 * (slots + 1)
+        self._code_blob = offset
+        self._desc_blob = offset + code_size
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __contains__(self, row_id) -> bool:
+        return 0 <= row_id < self._slots and bool(self._present[row_id])
+
+    def __getitem__(self, row_id: int) -> dict:
+        if row_id not in self:
+            raise KeyError(row_id)
+        return {"code": self.code(row_id), "desc": self.description(row_id)}
+
+    def get(self, row_id: int, default=None):
+        return self[row_id] if row_id in self else default
+
+    def code(self, row_id: int) -> str:
+        start, end = self._code_offsets[row_id], self._code_offsets[row_id + 1]
+        return self._mm[self._code_blob + int(start):self._code_blob + int(end)].decode("utf-8")
+
+    def description(self, row_id: int) -> str:
+        start, end = self._desc_offsets[row_id], self._desc_offsets[row_id + 1]
+        return self._mm[self._desc_blob + int(start):self._desc_blob + int(end)].decode("utf-8")
+
+    def content_hash(self, row_id: int) -> str:
+        start = row_id * HASH_SIZE
+        return self._hashes[start:start + HASH_SIZE].tobytes().hex()
+
+    def ids(self):
+        return np.flatnonzero(self._present).tolist()
+
+    def to_dict(self) -> dict:
+        """Materializes every entry with its hash, as incremental builds need them all."""
+        return {
+            row_id: {"code": self.code(row_id), "desc": self.description(row_id), "hash": self.content_hash(row_id)}
+            for row_id in self.ids()
+        }
@@ -0,0 +1,327 @@
+"""
+Shared embedding service: one process owns the embedding model and every API worker,
+MCP server and vector DB build asks it for vectors over a Unix socket, instead of each
+loading its own copy of the model (and torch) into RAM.
+
+    python -m backend.core.embedding_service            # EMBEDDING_SERVICE_SOCKET
+    EMBEDDING_BACKEND=service uvicorn backend.app.main:app --workers 8
+
+Requests arriving within EMBEDDING_SERVICE_BATCH_WINDOW_MS of each other, from any
+client, go through the model as one batch. Batches run one at a time, so CPU inference
+is not split between competing processes; requests arriving meanwhile form the next batch.
+
+Wire format: every message is a frame, a 4-byte big-endian length followed by that many
+bytes. A request is one JSON frame ({"op": "encode", "texts": [...], "normalize": true},
+{"op": "info"} or {"op": "stats"}). The answer is a JSON frame, and for "encode" a second
+frame with the (rows x dim) float32 little-endian vectors.
+"""
+import os
+import json
+import time
+import signal
+import socket
+import struct
+import asyncio
+import logging
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
+import numpy as np
+from backend.core.config import get_settings
+from backend.core.telemetry import configure_logging, external_call
+
+logger = logging.getLogger(__name__)
+
+_LENGTH = struct.Struct(">I")
+
+# Frames above this size are refused, a client never needs more
+MAX_FRAME_BYTES = 64 * 1024 * 1024
+
+# Texts per request sent by RemoteEmbedder; larger calls (e.g. a vector DB build) are split
+REQUEST_MAX_TEXTS = 1024
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.where(norms == 0, 1.0, norms)
+
+# ---------- Server --------------------------------
+class EmbeddingServer:
+    """
+    Serves encode requests from many connections with one embedder, micro-batched.
+    The first request to arrive while the model is idle opens a batch_window; everything
+    that arrives within it (or max_batch texts, whichever comes first) is encoded together
+    on the single inference thread, duplicate texts once.
+    """
+    def __init__(self, embedder=None, socket_path: Optional[str] = None,
+                 batch_window_ms: Optional[float] = None, max_batch: Optional[int] = None):
+        settings = get_settings()
+        if embedder is None:
+            from backend.core.resources import load_embedding_model
+            embedder = load_embedding_model()
+        self.embedder = embedder
+        self.model_name = settings.embedding_model
+        self.dim = embedder.get_sentence_embedding_dimension()
+        self.socket_path = socket_path or settings.embedding_service_socket
+        self.batch_window = (settings.embedding_service_batch_window_ms if batch_window_ms is None else batch_window_ms) / 1000.0
+        self.max_batch = max(1, max_batch or settings.embedding_service_max_batch)
+        # One thread: batches never compete with each other for the CPU
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="embedding")
+        self._pending = [] # [(texts, normalize, future), ...]
+        self._pending_texts = 0
+        self._timer = None
+        self._busy = False
+        self.requests = 0
+        self.batches = 0
+        self.texts = 0
+        self.encode_seconds = 0.0
+
+    # ----- Micro-batching -----
+    async def encode(self, texts: List[str], normalize: bool) -> np.ndarray:
+        if not texts:
+            return np.zeros((0, self.dim), dtype=np.float32)
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((texts, normalize, future))
+        self._pending_texts += len(texts)
+        self.requests += 1
+        if self._busy:
+            pass # The running batch starts the next one when it finishes
+        elif self._pending_texts >= self.max_batch:
+            self._flush()
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(self.batch_window, self._flush)
+        return await future
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if self._busy or not self._pending:
+            return
+        batch, self._pending, self._pending_texts = self._pending, [], 0
+        unique = list(dict.fromkeys(text for texts, _, _ in batch for text in texts))
+        self._busy = True
+        loop = asyncio.get_running_loop()
+        work = loop.run_in_executor(self._executor, self._encode, unique)
+        work.add_done_callback(lambda done: self._deliver(batch, unique, done))
+
+    def _encode(self, texts: List[str]) -> np.ndarray:
+        start = time.perf_counter()
+        vectors = np.asarray(
+            self.embedder.encode(texts, batch_size=min(len(texts), self.max_batch), normalize_embeddings=False),
+            dtype=np.float32
+        )
+        self.encode_seconds += time.perf_counter() - start
+        return vectors
+
+    def _deliver(self, batch, unique: List[str], done):
+        self._busy = False
+        self.batches += 1
+        self.texts += len(unique)
+        error = asyncio.CancelledError() if done.cancelled() else done.exception()
+        if error is None:
+            vectors = done.result()
+            rows = {text: row for row, text in enumerate(unique)}
+            logger.debug("Encoded a batch of %d texts for %d requests", len(unique), len(batch))
+        for texts, normalize, future in batch:
+            if future.done():
+                continue
+            if error is not None:
+                future.set_exception(error)
+                continue
+            result = vectors[[rows[text] for text in texts]]
+            future.set_result(_normalize(result) if normalize else result)
+        # Requests that came in while the model was busy have waited long enough
+        if self._pending:
+            self._flush()
+
+    def stats(self) -> dict:
+        return {
+            "requests": self.requests,
+            "batches": self.batches,
+            "texts": self.texts,
+            "avg_batch_size": round(self.texts / self.batches, 2) if self.batches else 0.0,
+            "encode_seconds": round(self.encode_seconds, 3),
+            "queued_texts": self._pending_texts
+        }
+
+    # ----- Connections -----
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                try:
+                    request = json.loads(await self._read_frame(reader))
+                except asyncio.IncompleteReadError:
+                    break # Client closed the connection
+                await self._answer(request, writer)
+        except asyncio.CancelledError:
+            pass # Service shutting down
+        except Exception as e:
+            logger.warning("Embedding service connection dropped: %s", e)
+        finally:
+            writer.close()
+
+    @staticmethod
+    async def _read_frame(reader: asyncio.StreamReader) -> bytes:
+        (length,) = _LENGTH.unpack(await reader.readexactly(_LENGTH.size))
+        if length > MAX_FRAME_BYTES:
+            raise ValueError(f"Frame of {length} bytes is too large")
+        return await reader.readexactly(length)
+
+    @staticmethod
+    def _write_frame(writer: asyncio.StreamWriter, payload: bytes):
+        writer.write(_LENGTH.pack(len(payload)) + payload)
+
+    async def _answer(self, request: dict, writer: asyncio.StreamWriter):
+        op = request.get("op")
+        if op == "encode":
+            try:
+                texts = [str(text) for text in request["texts"]]
+                vectors = await self.encode(texts, bool(request.get("normalize", False)))
+            except Exception as e:
+                logger.error("Encoding failed: %s", e)
+                self._write_frame(writer, json.dumps({"ok": False, "error": f"{type(e).__name__}: {e}"}).encode())
+            else:
+                self._write_frame(writer, json.dumps({"ok": True, "rows": len(texts), "dim": self.dim}).encode())
+                self._write_frame(writer, np.ascontiguousarray(vectors, dtype="<f4").tobytes())
+        elif op == "info":
+            self._write_frame(writer, json.dumps({"ok": True, "model": self.model_name, "dim": self.dim}).encode())
+        elif op == "stats":
+            self._write_frame(writer, json.dumps({"ok": True, **self.stats()}).encode())
+        else:
+            self._write_frame(writer, json.dumps({"ok": False, "error": f"Unknown op {op!r}"}).encode())
+        await writer.drain()
+
+    async def serve(self, ready: Optional[threading.Event] = None):
+        """
+        Listens on the Unix socket until cancelled. A socket file left by a previous run is replaced.
+        """
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+        server = await asyncio.start_unix_server(self._handle, path=self.socket_path)
+        logger.info("Embedding service (%s, dim %d) listening on %s", self.model_name, self.dim, self.socket_path)
+        if ready is not None:
+            ready.set()
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            self._executor.shutdown(wait=False)
+            if os.path.exists(self.socket_path):
+                os.unlink(self.socket_path)
+
+# ---------- Client --------------------------------
+class EmbeddingServiceError(RuntimeError):
+    pass
+
+class RemoteEmbedder:
+    """
+    Drop-in for the SentenceTransformer (encode / get_sentence_embedding_dimension) that
+    asks the embedding service. Each thread keeps its own connection, reconnecting once
+    when the service was restarted.
+    """
+    def __init__(self, socket_path: Optional[str] = None, timeout: Optional[float] = None):
+        settings = get_settings()
+        self.socket_path = socket_path or settings.embedding_service_socket
+        self.timeout = settings.embedding_service_timeout if timeout is None else timeout
+        self._local = threading.local()
+        self._info = None
+
+    def _connect(self) -> socket.socket:
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        try:
+            sock.connect(self.socket_path)
+        except OSError as e:
+            sock.close()
+            raise EmbeddingServiceError(
+                f"Embedding service not reachable at {self.socket_path} ({e}). "
+                "Start it with `python -m backend.core.embedding_service`."
+            ) from e
+        return sock
+
+    @staticmethod
+    def _recv_exactly(sock: socket.socket, length: int) -> bytearray:
+        buffer = bytearray(length)
+        view, received = memoryview(buffer), 0
+        while received < length:
+            count = sock.recv_into(view[received:])
+            if count == 0:
+                raise ConnectionError("Embedding service closed the connection")
+            received += count
+        return buffer
+
+    def _recv_frame(self, sock: socket.socket) -> bytearray:
+        (length,) = _LENGTH.unpack(self._recv_exactly(sock, _LENGTH.size))
+        return self._recv_exactly(sock, length)
+
+    def _exchange(self, sock: socket.socket, request: dict):
+        body = json.dumps(request).encode("utf-8")
+        sock.sendall(_LENGTH.pack(len(body)) + body)
+        header = json.loads(self._recv_frame(sock))
+        if not header.get("ok"):
+            raise EmbeddingServiceError(header.get("error", "Embedding service error"))
+        payload = self._recv_frame(sock) if request["op"] == "encode" else None
+        return header, payload
+
+    def _request(self, request: dict):
+        for attempt in (1, 2):
+            sock = getattr(self._local, "sock", None)
+            if sock is None:
+                sock = self._local.sock = self._connect()
+            try:
+                return self._exchange(sock, request)
+            except (ConnectionError, socket.timeout, OSError) as e:
+                # A half-read answer leaves the connection unusable, start over on a new one
+                sock.close()
+                self._local.sock = None
+                if attempt == 2 or isinstance(e, socket.timeout):
+                    raise EmbeddingServiceError(f"Embedding service request failed: {e}") from e
+
+    def info(self) -> dict:
+        if self._info is None:
+            info, _ = self._request({"op": "info"})
+            model = get_settings().embedding_model
+            if info["model"] != model:
+                # Vectors of another model would not match the indexes (or the embedding cache keys)
+                raise EmbeddingServiceError(f"Embedding service runs {info['model']}, expected {model}")
+            self._info = info
+        return self._info
+
+    def stats(self) -> dict:
+        return self._request({"op": "stats"})[0]
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self.info()["dim"]
+
+    def encode(self, texts, batch_size: int = 32, normalize_embeddings: bool = False, **kwargs) -> np.ndarray:
+        single = isinstance(texts, str)
+        texts = [texts] if single else list(texts)
+        dim = self.get_sentence_embedding_dimension()
+        parts = []
+        with external_call("embedding_service", "encode"):
+            for start in range(0, len(texts), REQUEST_MAX_TEXTS):
+                chunk = texts[start:start + REQUEST_MAX_TEXTS]
+                header, payload = self._request({"op": "encode", "texts": chunk, "normalize": normalize_embeddings})
+                parts.append(np.frombuffer(payload, dtype="<f4").reshape(header["rows"], header["dim"]))
+        vectors = np.concatenate(parts) if parts else np.zeros((0, dim), dtype=np.float32)
+        return vectors[0] if single else vectors
+
+# ---------- CLI -----------------------------------
+def main():
+    parser = argparse.ArgumentParser(description="Serve the embedding model to every process on this host.")
+    parser.add_argument("--socket", help="Unix socket path (default: EMBEDDING_SERVICE_SOCKET).")
+    parser.add_argument("--batch-window-ms", type=float, help="Micro-batching window (default: EMBEDDING_SERVICE_BATCH_WINDOW_MS).")
+    parser.add_argument("--max-batch", type=int, help="Texts per model batch (default: EMBEDDING_SERVICE_MAX_BATCH).")
+    args = parser.parse_args()
+    configure_logging()
+    # Stop on SIGTERM like on Ctrl+C, so the socket file is removed
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+    server = EmbeddingServer(socket_path=args.socket, batch_window_ms=args.batch_window_ms, max_batch=args.max_batch)
+    try:
+        asyncio.run(server.serve())
+    except KeyboardInterrupt:
+        logger.info("Embedding service stopped. %s", server.stats())
+
+if __name__ == "__main__":
+    main()
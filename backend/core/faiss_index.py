@@ -0,0 +1,147 @@
+import faiss
+import numpy as np
+from dataclasses import dataclass, asdict, replace
+from backend.core.config import get_settings
+
+# Supported index layouts:
+#   flat     - exact brute force search (IndexFlatIP), best for small code sets
+#   ivf_flat - inverted file, only the `nprobe` closest clusters are scanned
+#   hnsw     - graph based search, no training, fast at high recall, more RAM
+#   ivf_pq   - inverted file with product-quantized vectors, smallest memory footprint
+INDEX_TYPES = ("flat", "ivf_flat", "hnsw", "ivf_pq")
+
+# FAISS wants roughly 39 training points per IVF cluster
+MIN_POINTS_PER_CENTROID = 39
+
+@dataclass(frozen=True)
+class IndexConfig:
+    """
+    Build-time and query-time parameters of one FAISS index.
+    """
+    index_type: str = "flat"
+    nlist: int = 1024 # IVF clusters
+    hnsw_m: int = 32 # HNSW graph neighbours per node
+    hnsw_ef_construction: int = 200
+    pq_m: int = 48 # PQ sub-vectors, must divide the embedding size (384 / 48 = 8 dims each)
+    pq_nbits: int = 8 # Bits per PQ code
+    nprobe: int = 16 # IVF clusters scanned per query
+    ef_search: int = 64 # HNSW candidate list size per query
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "IndexConfig":
+        known = {k: v for k, v in data.items() if k in cls.__dataclass_fields__}
+        return cls(**known)
+
+def index_config_from_settings() -> IndexConfig:
+    settings = get_settings()
+    config = IndexConfig(
+        index_type = settings.vector_index_type,
+        nlist = settings.vector_nlist,
+        hnsw_m = settings.vector_hnsw_m,
+        hnsw_ef_construction = settings.vector_hnsw_ef_construction,
+        pq_m = settings.vector_pq_m,
+        pq_nbits = settings.vector_pq_nbits,
+    )
+    if config.index_type not in INDEX_TYPES:
+        raise ValueError(f"Unknown VECTOR_INDEX_TYPE '{config.index_type}'. Use one of: {', '.join(INDEX_TYPES)}")
+    return with_query_overrides(config)
+
+def with_query_overrides(config: IndexConfig) -> IndexConfig:
+    """
+    Applies VECTOR_NPROBE / VECTOR_EF_SEARCH from the settings, when set,
+    on top of a built or persisted config.
+    """
+    settings = get_settings()
+    if settings.vector_nprobe is not None:
+        config = replace(config, nprobe=settings.vector_nprobe)
+    if settings.vector_ef_search is not None:
+        config = replace(config, ef_search=settings.vector_ef_search)
+    return config
+
+def build_index(vectors: np.ndarray, config: IndexConfig, ids: np.ndarray = None):
+    """
+    Builds (and trains, where needed) a FAISS inner-product index over normalized vectors.
+
+    Returns the index and the effective config. Code sets too small to train the requested
+    layout fall back to a flat index, and nlist is capped to what the data can support.
+    When `ids` are given the index is wrapped in an IndexIDMap2, so searches return those
+    ids (the database row ids) and single vectors can later be removed or replaced.
+    """
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    n, d = vectors.shape
+    index_type = config.index_type
+
+    if index_type in ("ivf_flat", "ivf_pq"):
+        nlist = max(1, min(config.nlist, n // MIN_POINTS_PER_CENTROID))
+        min_points = max(nlist, 2 ** config.pq_nbits if index_type == "ivf_pq" else 1)
+        if n < MIN_POINTS_PER_CENTROID or n < min_points:
+            index_type, nlist = "flat", config.nlist
+        config = replace(config, nlist=nlist)
+    config = replace(config, index_type=index_type)
+
+    if index_type == "flat":
+        index = faiss.IndexFlatIP(d)
+    elif index_type == "hnsw":
+        index = faiss.IndexHNSWFlat(d, config.hnsw_m, faiss.METRIC_INNER_PRODUCT)
+        index.hnsw.efConstruction = config.hnsw_ef_construction
+    else:
+        quantizer = faiss.IndexFlatIP(d)
+        if index_type == "ivf_flat":
+            index = faiss.IndexIVFFlat(quantizer, d, config.nlist, faiss.METRIC_INNER_PRODUCT)
+        else:
+            index = faiss.IndexIVFPQ(quantizer, d, config.nlist, config.pq_m, config.pq_nbits, faiss.METRIC_INNER_PRODUCT)
+        index.train(vectors)
+
+    if ids is not None:
+        index = faiss.IndexIDMap2(index)
+        index.add_with_ids(vectors, np.ascontiguousarray(ids, dtype=np.int64))
+    else:
+        index.add(vectors)
+    apply_search_params(index, config)
+    return index, config
+
+def supports_removal(config: IndexConfig) -> bool:
+    """HNSW graphs cannot delete vectors, every other layout can."""
+    return config.index_type != "hnsw"
+
+def apply_search_params(index, config: IndexConfig):
+    """
+    Sets the query-time knobs (nprobe for IVF, efSearch for HNSW) on a loaded index.
+    """
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        ivf.nprobe = min(config.nprobe, ivf.nlist)
+
+    inner = faiss.downcast_index(index.index) if hasattr(index, "id_map") else index
+    if hasattr(inner, "hnsw"):
+        inner.hnsw.efSearch = config.ef_search
+
+def _mmap_flags(index_type: str = None) -> list:
+    # Flat storage (flat, HNSW) maps with IO_FLAG_MMAP_IFC, IVF inverted lists with IO_FLAG_MMAP.
+    # Combining both fails on IVF, so they are tried one at a time.
+    ifc = getattr(faiss, "IO_FLAG_MMAP_IFC", None)
+    if index_type in ("ivf_flat", "ivf_pq"):
+        flags = [faiss.IO_FLAG_MMAP]
+    elif index_type in ("flat", "hnsw"):
+        flags = [ifc]
+    else:
+        flags = [ifc, faiss.IO_FLAG_MMAP]
+    return [flag for flag in flags if flag is not None]
+
+def read_index(path: str, index_type: str = None, mmap: bool = True):
+    """
+    Loads a saved index. With mmap=True the vectors stay in the page cache and are shared
+    by every process that searches the same file, instead of being copied into each one.
+    Falls back to a regular read when this FAISS build cannot map the layout.
+    The mapped index is read-only, so code that modifies an index must pass mmap=False.
+    """
+    if mmap:
+        for flag in _mmap_flags(index_type):
+            try:
+                return faiss.read_index(path, flag | faiss.IO_FLAG_READ_ONLY)
+            except RuntimeError:
+                continue
+    return faiss.read_index(path)
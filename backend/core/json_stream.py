@@ -0,0 +1,76 @@
+import re
+from typing import Optional
+
+# The only characters that can open or close a JSON value or a string
+_STRUCTURAL = re.compile(r'[{}\[\]"\\]')
+
+class JsonObjectScanner:
+    """
+    Finds the first complete top-level JSON object in text that arrives piece by piece,
+    e.g. the streamed tokens of an LLM answer. Anything before the opening brace (a
+    markdown fence, "Here is the JSON:") and after the closing one is ignored, so the
+    caller can stop the generation as soon as feed() returns True.
+    Only brackets and strings are tracked; the object is validated by json.loads later.
+    """
+    def __init__(self):
+        self._parts = []
+        self._length = 0
+        self._start = None # Offset of the opening brace
+        self._depth = 0
+        self._in_string = False
+        self._escaped_at = -1 # Offset of the character after a backslash in a string
+        self.result: Optional[str] = None
+
+    def feed(self, text: str) -> bool:
+        """
+        Adds the next piece of text. Returns True once the object is complete (see .result).
+        """
+        if self.result is not None:
+            return True
+        offset = self._length
+        self._parts.append(text)
+        self._length += len(text)
+
+        for match in _STRUCTURAL.finditer(text):
+            char, position = match.group(), offset + match.start()
+            if position == self._escaped_at:
+                # The character right after a backslash is never structural
+                continue
+            if self._in_string:
+                if char == "\\":
+                    self._escaped_at = position + 1
+                elif char == '"':
+                    self._in_string = False
+                continue
+            if self._start is None:
+                if char == "{":
+                    self._start = position
+                    self._depth = 1
+                continue
+            if char == '"':
+                self._in_string = True
+            elif char in "{[":
+                self._depth += 1
+            elif char in "}]":
+                self._depth -= 1
+                if self._depth == 0:
+                    end = offset + match.end()
+                    self.result = "".join(self._parts)[self._start:end]
+                    self._parts = [self.result]
+                    return True
+        return False
+
+    @property
+    def text(self) -> str:
+        """Everything fed so far."""
+        return "".join(self._parts)
+
+def first_json_object(text: str) -> str:
+    """
+    The first complete top-level JSON object in text, without fences or trailing chatter.
+    Raises ValueError when the text holds no complete object (e.g. a truncated answer).
+    """
+    scanner = JsonObjectScanner()
+    if not scanner.feed(text):
+        raise ValueError("No complete JSON object in the LLM answer")
+    return scanner.result
@@ -1,13 +1,78 @@
+import json
+import threading
+import httpx
+from typing import Any, Callable, Optional
 from langchain_ollama import ChatOllama
+from backend.core.config import get_settings
 
-def get_llm():
+# Process-wide pool of LLM clients.
+# Every ChatOllama owns an httpx client with its own connection pool, so building one per
+# call means a new TCP connection per call. Instead we keep one client per distinct
+# configuration and every node, endpoint and worker thread shares it.
+_llm_pool = {}
+_llm_pool_lock = threading.Lock()
+
+# Builds the pooled clients: ChatOllama, unless replaced with set_llm_factory
+_llm_factory = None
+
+def _build_llm(**overrides) -> ChatOllama:
+    settings = get_settings()
+    client_kwargs = {
+        "timeout": httpx.Timeout(settings.llm_timeout, connect=settings.llm_connect_timeout),
+        "limits": httpx.Limits(
+            max_connections = settings.llm_max_connections,
+            max_keepalive_connections = settings.llm_max_keepalive_connections,
+            keepalive_expiry = settings.llm_keepalive_expiry,
+        ),
+    }
+    params = {
+        "model": settings.ollama_model,
+        "base_url": settings.ollama_host,
+        "temperature": settings.llm_temperature,
+        "keep_alive": settings.ollama_keep_alive,
+        "client_kwargs": client_kwargs,
+    }
+    params.update(overrides)
+    return ChatOllama(**params)
+
+def get_llm(**overrides) -> ChatOllama:
     """
-    Initializes and return the local Llama 3.2 model via Ollama.
+    Returns the shared local Llama 3.2 model via Ollama.
     We set temperature to 0.0 because medical coding requires strict factual accuracy,
     not creative hallucinations.
+
+    Model, host, timeouts and connection limits come from the settings. Keyword
+    overrides (e.g. num_predict=256) select a separate pooled client for that configuration.
+    """
+    # A JSON schema given as format= is a dict, which cannot be part of a dict key as is
+    key = tuple(sorted(
+        (name, json.dumps(value, sort_keys=True) if isinstance(value, (dict, list)) else value)
+        for name, value in overrides.items()
+    ))
+    llm = _llm_pool.get(key)
+    if llm is None:
+        with _llm_pool_lock:
+            llm = _llm_pool.get(key)
+            if llm is None:
+                llm = (_llm_factory or _build_llm)(**overrides)
+                _llm_pool[key] = llm
+    return llm
+
+def reset_llm_pool():
+    """
+    Drops every pooled client, e.g. after the settings changed.
+    The next get_llm() call builds fresh clients.
+    """
+    with _llm_pool_lock:
+        _llm_pool.clear()
+
+def set_llm_factory(factory: Optional[Callable[..., Any]]):
+    """
+    Makes get_llm() build its clients with factory(**overrides) instead of ChatOllama,
+    e.g. a fake chat model for offline benchmarks (see benchmarks/fakes.py).
+    None goes back to ChatOllama. Clients already in the pool are dropped.
     """
-    llm = ChatOllama(
-        model = "llama3.2",
-        temperature = 0.0,
-    )
-    return llm
\ No newline at end of file
+    global _llm_factory
+    with _llm_pool_lock:
+        _llm_factory = factory
+        _llm_pool.clear()
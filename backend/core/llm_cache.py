@@ -0,0 +1,172 @@
+import os
+import time
+import sqlite3
+import hashlib
+import threading
+from typing import Optional
+from backend.core.config import get_settings
+from backend.core.telemetry import CACHE_EVENTS, external_call
+
+# Deleted in one go once the cache outgrows its limit, so eviction does not run on every write
+EVICT_TO_FRACTION = 0.9
+
+# How many writes a process makes between two size checks
+SIZE_CHECK_EVERY = 64
+
+# A hit only refreshes last_used when it is older than this (seconds), so reads of hot
+# entries do not take the write lock every time. LRU order is approximate within it
+TOUCH_INTERVAL = 60.0
+
+class LLMResponseCache:
+    """
+    Content-addressed store of LLM responses in a local SQLite file.
+
+    Entries are keyed by a hash of (model, prompt template version, rendered prompt), so a
+    resubmitted note gets the answer Ollama gave the first time, and changing a prompt
+    template (bump its version) or the model never serves stale answers.
+    WAL mode lets every uvicorn/MCP worker on the machine read and write the same file.
+    When the stored responses exceed max_bytes the least recently used ones (to within
+    TOUCH_INTERVAL) are evicted.
+    """
+    def __init__(self, path: str, max_bytes: int):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._writes_since_check = 0
+        self.hits = 0
+        self.misses = 0
+        self.bypassed = 0
+        self.writes = 0
+        self.evictions = 0
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        db = self._db()
+        db.execute("""
+            CREATE TABLE IF NOT EXISTS llm_responses (
+                key TEXT PRIMARY KEY,
+                model TEXT NOT NULL,
+                template TEXT NOT NULL,
+                response TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                last_used REAL NOT NULL
+            )
+        """)
+        db.execute("CREATE INDEX IF NOT EXISTS ix_llm_responses_last_used ON llm_responses (last_used)")
+
+    def _db(self) -> sqlite3.Connection:
+        # sqlite3 connections must not be shared between threads, so each thread opens its own
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            self._local.db = db
+        return db
+
+    @staticmethod
+    def key(model: str, template_version: str, prompt: str) -> str:
+        return hashlib.sha256("\0".join((model, template_version, prompt)).encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        db = self._db()
+        with external_call("llm_cache", "get"):
+            row = db.execute("SELECT response, last_used FROM llm_responses WHERE key = ?", (key,)).fetchone()
+            with self._lock:
+                if row is None:
+                    self.misses += 1
+                else:
+                    self.hits += 1
+            CACHE_EVENTS.labels("llm_response", "miss" if row is None else "hit").inc()
+            if row is None:
+                return None
+            now = time.time()
+            if now - row[1] > TOUCH_INTERVAL:
+                # Another worker may have touched it meanwhile, then there is nothing to write
+                db.execute("UPDATE llm_responses SET last_used = ? WHERE key = ? AND last_used < ?",
+                           (now, key, now - TOUCH_INTERVAL))
+        return row[0]
+
+    def put(self, key: str, model: str, template_version: str, response: str):
+        now = time.time()
+        with external_call("llm_cache", "put"):
+            self._db().execute(
+                "INSERT OR REPLACE INTO llm_responses (key, model, template, response, size, created_at, last_used) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, model, template_version, response, len(response.encode("utf-8")), now, now)
+            )
+        with self._lock:
+            self.writes += 1
+            self._writes_since_check += 1
+            check = self._writes_since_check >= SIZE_CHECK_EVERY or self.writes == 1
+            if check:
+                self._writes_since_check = 0
+        if check:
+            self._evict()
+
+    def record_bypass(self):
+        with self._lock:
+            self.bypassed += 1
+        CACHE_EVENTS.labels("llm_response", "bypass").inc()
+
+    def _evict(self):
+        db = self._db()
+        total = db.execute("SELECT COALESCE(SUM(size), 0) FROM llm_responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        to_free = total - int(self.max_bytes * EVICT_TO_FRACTION)
+        victims, freed = [], 0
+        for key, size in db.execute("SELECT key, size FROM llm_responses ORDER BY last_used"):
+            victims.append((key,))
+            freed += size
+            if freed >= to_free:
+                break
+        db.executemany("DELETE FROM llm_responses WHERE key = ?", victims)
+        with self._lock:
+            self.evictions += len(victims)
+
+    def clear(self):
+        self._db().execute("DELETE FROM llm_responses")
+
+    def stats(self) -> dict:
+        entries, size = self._db().execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM llm_responses"
+        ).fetchone()
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": entries,
+                "bytes": size,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "bypassed": self.bypassed,
+                "writes": self.writes,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0
+            }
+
+_cache = None
+_cache_lock = threading.Lock()
+
+def get_llm_cache() -> Optional[LLMResponseCache]:
+    """
+    Returns the process-wide response cache, or None when caching is off
+    (LLM_CACHE_ENABLED=0, or a temperature above 0 makes answers non-deterministic).
+    """
+    global _cache
+    settings = get_settings()
+    if not settings.llm_cache_enabled or settings.llm_temperature > 0:
+        return None
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = LLMResponseCache(settings.llm_cache_path, int(settings.llm_cache_max_mb * 1024 * 1024))
+    return _cache
+
+def llm_cache_stats() -> dict:
+    cache = get_llm_cache()
+    if cache is None:
+        return {"enabled": False}
+    return {"enabled": True, **cache.stats()}
@@ -0,0 +1,265 @@
+"""
+ONNX Runtime backend of the embedding model (EMBEDDING_BACKEND=onnx).
+
+On CPU-only nodes the SentenceTransformer runs in fp32 PyTorch. This backend runs the
+same network exported to ONNX, by default with int8 (dynamically quantized) weights, and
+imports neither torch nor sentence_transformers: only onnxruntime, tokenizers and numpy.
+
+The export is a one-time step on a machine that has torch, sentence-transformers and onnx:
+
+    python -m backend.core.onnx_embedder export     # writes EMBEDDING_ONNX_DIR
+    python -m backend.core.onnx_embedder check      # tolerance check of an existing export
+
+Both compare the ONNX vectors with the fp32 model's on the code descriptions in the
+database. The FAISS indexes keep their fp32 vectors, so a query embedded with the
+quantized model must land where the fp32 one would; an export whose cosine similarity
+to the fp32 vectors drops below EMBEDDING_ONNX_MIN_COSINE is rejected.
+"""
+import os
+import sys
+import json
+import shutil
+import logging
+import argparse
+import tempfile
+from typing import List, Optional
+import numpy as np
+from backend.core.config import get_settings
+from backend.core.telemetry import configure_logging
+
+logger = logging.getLogger(__name__)
+
+# Written next to the .onnx files: how to tokenize and pool, and the tolerance check results
+MANIFEST_NAME = "embedder.json"
+FP32_FILE = "model.onnx"
+INT8_FILE = "model_int8.onnx"
+
+# Used by the tolerance check when the database has no codes yet
+FALLBACK_CHECK_TEXTS = (
+    "acute pharyngitis", "sore throat", "rapid strep test", "type 2 diabetes mellitus without complications",
+    "essential hypertension", "cough", "electrocardiogram with interpretation", "office visit established patient",
+    "fracture of the left wrist", "x-ray of the chest two views", "low back pain", "influenza vaccination"
+)
+
+class OnnxEmbedder:
+    """
+    Drop-in for the SentenceTransformer (encode / get_sentence_embedding_dimension) that
+    runs an export of this module. Texts are tokenized with the model's own tokenizer,
+    sorted by length so each batch is padded as little as possible, and pooled and
+    normalized like the SentenceTransformer pipeline they were exported from.
+    """
+    def __init__(self, model_dir: Optional[str] = None, file: Optional[str] = None, threads: Optional[int] = None):
+        import onnxruntime
+        from tokenizers import Tokenizer
+
+        settings = get_settings()
+        self.model_dir = model_dir or settings.embedding_onnx_dir
+        self.file = file or settings.embedding_onnx_file
+        manifest_path = os.path.join(self.model_dir, MANIFEST_NAME)
+        if not os.path.exists(manifest_path):
+            raise FileNotFoundError(
+                f"No ONNX embedding model in {self.model_dir}. Run `python -m backend.core.onnx_embedder export` first."
+            )
+        with open(manifest_path, "r") as f:
+            self.manifest = json.load(f)
+        if self.manifest["model"] != settings.embedding_model:
+            # Vectors of another model would not match the indexes (or the embedding cache keys)
+            raise ValueError(f"{self.model_dir} holds an export of {self.manifest['model']}, expected {settings.embedding_model}")
+        check = self.manifest.get("checks", {}).get(self.file)
+        if not check or not check["passed"]:
+            logger.warning("%s has not passed the tolerance check against the fp32 model", self.file)
+
+        options = onnxruntime.SessionOptions()
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        threads = settings.embedding_onnx_threads if threads is None else threads
+        if threads > 0:
+            options.intra_op_num_threads = threads
+        logger.info("Loading ONNX embedding model %s (%s)", self.manifest["model"], self.file)
+        self.session = onnxruntime.InferenceSession(
+            os.path.join(self.model_dir, self.file), options, providers=["CPUExecutionProvider"]
+        )
+        self.input_names = [i.name for i in self.session.get_inputs()]
+
+        self.tokenizer = Tokenizer.from_file(os.path.join(self.model_dir, "tokenizer.json"))
+        self.tokenizer.enable_truncation(self.manifest["max_seq_length"])
+        self.tokenizer.enable_padding(pad_id=self.manifest["pad_id"], pad_token=self.manifest["pad_token"])
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self.manifest["dim"]
+
+    def _pool(self, hidden: np.ndarray, mask: np.ndarray) -> np.ndarray:
+        pooling = self.manifest["pooling"]
+        if pooling == "cls":
+            return hidden[:, 0]
+        weights = mask[:, :, None].astype(np.float32)
+        if pooling == "max":
+            return np.where(weights > 0, hidden, -1e9).max(axis=1)
+        return (hidden * weights).sum(axis=1) / np.clip(weights.sum(axis=1), 1e-9, None)
+
+    def encode(self, texts, batch_size: int = 32, normalize_embeddings: bool = False, **kwargs) -> np.ndarray:
+        single = isinstance(texts, str)
+        texts = [texts] if single else list(texts)
+        vectors = np.zeros((len(texts), self.manifest["dim"]), dtype=np.float32)
+        order = np.argsort([-len(text) for text in texts], kind="stable")
+        for start in range(0, len(texts), max(1, batch_size)):
+            rows = order[start:start + batch_size]
+            encodings = self.tokenizer.encode_batch([texts[row] for row in rows])
+            mask = np.array([e.attention_mask for e in encodings], dtype=np.int64)
+            feed = {"input_ids": np.array([e.ids for e in encodings], dtype=np.int64), "attention_mask": mask}
+            if "token_type_ids" in self.input_names:
+                feed["token_type_ids"] = np.array([e.type_ids for e in encodings], dtype=np.int64)
+            hidden = self.session.run(None, {name: feed[name] for name in self.input_names})[0]
+            vectors[rows] = self._pool(hidden, mask)
+        if normalize_embeddings or self.manifest["normalize"]:
+            norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+            vectors /= np.where(norms == 0, 1.0, norms)
+        return vectors[0] if single else vectors
+
+# ---------- Tolerance check -----------------------
+def check_tolerance(embedder, reference, texts: List[str], min_cosine: Optional[float] = None) -> dict:
+    """
+    Compares embedder's vectors with reference's (the fp32 model) on the same texts.
+    """
+    if min_cosine is None:
+        min_cosine = get_settings().embedding_onnx_min_cosine
+    a = np.asarray(embedder.encode(texts, normalize_embeddings=True), dtype=np.float32)
+    b = np.asarray(reference.encode(texts, normalize_embeddings=True), dtype=np.float32)
+    cosine = (a * b).sum(axis=1)
+    return {
+        "texts": len(texts),
+        "min_cosine": round(float(cosine.min()), 6),
+        "mean_cosine": round(float(cosine.mean()), 6),
+        "max_abs_diff": round(float(np.abs(a - b).max()), 6),
+        "threshold": min_cosine,
+        "passed": bool(cosine.min() >= min_cosine)
+    }
+
+def check_texts(limit: int = 2000) -> List[str]:
+    """
+    Code descriptions from the database, both as indexed ("J02.9: Acute pharyngitis")
+    and bare, which is closer to the phrases extracted from notes.
+    """
+    try:
+        from backend.data.db import SessionLocal, ICD10Code, CPTCode
+        with SessionLocal() as db:
+            records = db.query(ICD10Code).limit(limit // 4).all() + db.query(CPTCode).limit(limit // 4).all()
+    except Exception as e:
+        logger.warning("Could not read code descriptions for the tolerance check: %s", e)
+        records = []
+    texts = [f"{r.code}: {r.description}" for r in records] + [r.description for r in records]
+    return texts or list(FALLBACK_CHECK_TEXTS)
+
+def run_checks(model_dir: str, reference, texts: List[str]) -> dict:
+    """
+    Checks every .onnx file of an export and records the results in its manifest.
+    """
+    manifest_path = os.path.join(model_dir, MANIFEST_NAME)
+    with open(manifest_path, "r") as f:
+        manifest = json.load(f)
+    checks = {}
+    for file in (FP32_FILE, INT8_FILE):
+        if os.path.exists(os.path.join(model_dir, file)):
+            checks[file] = check_tolerance(OnnxEmbedder(model_dir, file=file), reference, texts)
+            logger.info("%s vs fp32: %s", file, checks[file])
+    manifest["checks"] = checks
+    with open(manifest_path, "w") as f:
+        json.dump(manifest, f, indent=2)
+    return checks
+
+# ---------- Export --------------------------------
+def export_onnx_model(out_dir: Optional[str] = None, model_name: Optional[str] = None, quantize: bool = True,
+                      opset: int = 17, reference=None) -> dict:
+    """
+    Exports the configured SentenceTransformer to out_dir: the transformer as model.onnx
+    (fp32), an int8 copy as model_int8.onnx, the tokenizer and the pooling settings.
+    Needs torch, sentence-transformers and onnx, unlike loading the result.
+    `reference` is an already loaded SentenceTransformer to export instead of model_name.
+    Returns the tolerance checks of the exported files.
+    """
+    import torch
+    from sentence_transformers import SentenceTransformer
+
+    settings = get_settings()
+    out_dir = out_dir or settings.embedding_onnx_dir
+    model_name = model_name or settings.embedding_model
+    reference = reference or SentenceTransformer(model_name, device="cpu")
+    transformer, pooling = reference[0], reference[1]
+    auto_model = transformer.auto_model.eval()
+    tokenizer = transformer.tokenizer
+    os.makedirs(out_dir, exist_ok=True)
+
+    sample = tokenizer(["acute pharyngitis", "sore throat"], padding=True, return_tensors="pt")
+    input_names = [name for name in ("input_ids", "attention_mask", "token_type_ids") if name in sample]
+
+    class _Encoder(torch.nn.Module):
+        # The transformer only, pooling and normalization are cheap and done in numpy
+        def __init__(self):
+            super().__init__()
+            self.model = auto_model
+
+        def forward(self, *inputs):
+            return self.model(**dict(zip(input_names, inputs))).last_hidden_state
+
+    axes = {0: "batch", 1: "sequence"}
+    fp32_path = os.path.join(out_dir, FP32_FILE)
+    logger.info("Exporting %s to %s", model_name, fp32_path)
+    with torch.no_grad():
+        torch.onnx.export(
+            _Encoder(), tuple(sample[name] for name in input_names), fp32_path,
+            input_names = input_names,
+            output_names = ["last_hidden_state"],
+            dynamic_axes = {**{name: axes for name in input_names}, "last_hidden_state": axes},
+            opset_version = opset,
+            dynamo = False
+        )
+
+    if quantize:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+        # Weights to int8, activations quantized on the fly: no calibration data needed
+        quantize_dynamic(fp32_path, os.path.join(out_dir, INT8_FILE), weight_type=QuantType.QInt8)
+
+    with tempfile.TemporaryDirectory() as scratch:
+        tokenizer.save_pretrained(scratch)
+        shutil.copy(os.path.join(scratch, "tokenizer.json"), os.path.join(out_dir, "tokenizer.json"))
+
+    # sentence-transformers 6 stores the mode, older versions derive it from flags
+    pooling_mode = getattr(pooling, "pooling_mode", None) or pooling.get_pooling_mode_str()
+    if pooling_mode not in ("mean", "cls", "max"):
+        raise ValueError(f"Pooling mode {pooling_mode} is not supported by the ONNX backend")
+    manifest = {
+        "model": model_name,
+        "dim": reference.get_sentence_embedding_dimension(),
+        "max_seq_length": reference.max_seq_length,
+        "pad_token": tokenizer.pad_token,
+        "pad_id": tokenizer.pad_token_id,
+        "pooling": pooling_mode,
+        "normalize": any(type(module).__name__ == "Normalize" for module in reference),
+        "inputs": input_names,
+        "opset": opset
+    }
+    with open(os.path.join(out_dir, MANIFEST_NAME), "w") as f:
+        json.dump(manifest, f, indent=2)
+    return run_checks(out_dir, reference, check_texts())
+
+def main():
+    parser = argparse.ArgumentParser(description="Export the embedding model to ONNX and check it against fp32.")
+    parser.add_argument("command", choices=("export", "check"))
+    parser.add_argument("--out-dir", help="Default: EMBEDDING_ONNX_DIR.")
+    parser.add_argument("--no-quantize", action="store_true", help="Only write the fp32 model.onnx.")
+    parser.add_argument("--opset", type=int, default=17)
+    args = parser.parse_args()
+    configure_logging()
+
+    if args.command == "export":
+        checks = export_onnx_model(args.out_dir, quantize=not args.no_quantize, opset=args.opset)
+    else:
+        from backend.core.resources import load_embedding_model
+        checks = run_checks(args.out_dir or get_settings().embedding_onnx_dir, load_embedding_model(), check_texts())
+    for file, check in checks.items():
+        print(f"{file}: min cosine {check['min_cosine']:.4f}, mean {check['mean_cosine']:.4f} "
+              f"({'ok' if check['passed'] else 'BELOW ' + str(check['threshold'])})")
+    if not all(check["passed"] for check in checks.values()):
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
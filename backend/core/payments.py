@@ -1,43 +1,79 @@
 import stripe
 import os
+import logging
+from typing import Optional
 from dotenv import load_dotenv
+from backend.core.telemetry import external_call
+
+logger = logging.getLogger(__name__)
 
 # For this stage, we use a mock/test key. 
 load_dotenv()
 stripe.api_key = os.getenv("STRIPE_API_KEY")
 
-def process_claim_payout(claim_id: int, amount: float):
+def _payment_intent_params(claim_id: int, amount: float) -> dict:
+    # In a real RCM app, we would create a 'Transfer' to the doctor's account.
+    # For our simulator, we create a 'PaymentIntent' to confirm the money is ready.
+    return dict(
+        description = f"Payout for Medical Claim ID: {claim_id}",
+        shipping={
+            "name": "Jenny Rosen",
+            "address": {
+            "line1": "510 Townsend St",
+            "postal_code": "98140",
+            "city": "San Francisco",
+            "state": "CA",
+            "country": "US",
+        },
+    },
+        amount = int(amount * 100), # Stripe uses cents
+        currency = "usd",
+        payment_method_types = ["card"],
+        # We use test token that always succeeds
+        confirm = True,
+        payment_method = "pm_card_visa"
+    )
+
+def payout_amount(cpt_codes) -> float:
+    # Determine Payout Amount per line (Simplified: $50 for Strep, $20 for others)
+    return sum(50.0 if cpt == "87880" else 20.0 for cpt in cpt_codes)
+
+def payout_idempotency_key(claim_id: int) -> str:
+    # Stripe returns the first result for a repeated key, so a retried payout never pays twice
+    return f"claim-{claim_id}-payout"
+
+def process_claim_payout(claim_id: int, amount: float, idempotency_key: Optional[str] = None):
     """
     Simulates a payout for an approved medical claim.
     Returns a mock transaction ID.
     """
     try:
-        # In a real RCM app, we would create a 'Transfer' to the doctor's account.
-        # For our simulator, we create a 'PaymentIntent' to confirm the money is ready.
-        intent = stripe.PaymentIntent.create(
-            description = f"Payout for Medical Claim ID: {claim_id}",
-            shipping={
-                "name": "Jenny Rosen",
-                "address": {
-                "line1": "510 Townsend St",
-                "postal_code": "98140",
-                "city": "San Francisco",
-                "state": "CA",
-                "country": "US",
-            },
-        },
-            amount = int(amount * 100), # Stripe uses cents
-            currency = "usd",
-            payment_method_types = ["card"],
-            # We use test token that always succeeds
-            confirm = True,
-            payment_method = "pm_card_visa"
-        )
+        with external_call("stripe", "payment_intent"):
+            intent = stripe.PaymentIntent.create(**_payment_intent_params(claim_id, amount), idempotency_key=idempotency_key)
+        return {
+            "success": True,
+            "transaction_id": intent.id,
+            "amount_paid": amount
+        }
+    except Exception as e:
+        logger.warning("Stripe Error for claim %s: %s", claim_id, e)
+        return {"success": False, "error": str(e)}
+
+async def aprocess_claim_payout(claim_id: int, amount: float, idempotency_key: Optional[str] = None):
+    """
+    Async version of process_claim_payout.
+    Uses Stripe's async HTTP client (httpx), so waiting on Stripe does not block the event loop.
+    """
+    try:
+        with external_call("stripe", "payment_intent"):
+            intent = await stripe.PaymentIntent.create_async(
+                **_payment_intent_params(claim_id, amount), idempotency_key=idempotency_key
+            )
         return {
             "success": True,
             "transaction_id": intent.id,
             "amount_paid": amount
         }
     except Exception as e:
-        print(f"Stripe Error: {e}")
+        logger.warning("Stripe Error for claim %s: %s", claim_id, e)
         return {"success": False, "error": str(e)}
\ No newline at end of file
@@ -0,0 +1,222 @@
+import random
+import asyncio
+import logging
+import argparse
+import datetime
+from typing import Awaitable, Callable, Optional
+from sqlalchemy import select, update, func
+from backend.core.config import get_settings
+from backend.core.payments import aprocess_claim_payout
+from backend.data.db import AsyncSessionLocal, Claim, Payout
+from backend.core.telemetry import configure_logging, record_error
+
+logger = logging.getLogger(__name__)
+
+def _now() -> datetime.datetime:
+    return datetime.datetime.now(datetime.timezone.utc)
+
+class PayoutDispatcher:
+    """
+    Drains the payouts outbox in the background.
+
+    Due 'pending' payouts of claims that are still approved are claimed (-> 'processing')
+    and sent to Stripe, at most
+    `concurrency` at a time. A paid payout records its transaction id on the payout and
+    on the claim. A failed one goes back to 'pending' with an exponential, jittered
+    backoff, and to 'failed' after max_attempts. Every attempt of a payout sends the
+    same idempotency key (derived from the claim id), so a retry after a timeout or a
+    crash cannot pay a claim twice. Due payouts whose claim is no longer approved (e.g.
+    rejected by a re-adjudication after the payout was queued) are 'cancelled' instead.
+
+    `pay` has the signature of aprocess_claim_payout(claim_id, amount, idempotency_key)
+    and can be replaced by a stub in tests.
+    """
+    def __init__(self, pay: Optional[Callable[..., Awaitable[dict]]] = None, concurrency: Optional[int] = None,
+                 max_attempts: Optional[int] = None, backoff_base: Optional[float] = None,
+                 backoff_max: Optional[float] = None, poll_interval: Optional[float] = None):
+        settings = get_settings()
+        self.pay = pay or aprocess_claim_payout
+        self.concurrency = max(1, concurrency or settings.payout_concurrency)
+        self.max_attempts = max(1, max_attempts or settings.payout_max_attempts)
+        self.backoff_base = settings.payout_backoff_base if backoff_base is None else backoff_base
+        self.backoff_max = settings.payout_backoff_max if backoff_max is None else backoff_max
+        self.poll_interval = settings.payout_poll_interval if poll_interval is None else poll_interval
+        self._in_flight = set()
+        self._stopping = None
+        self.paid = 0
+        self.retried = 0
+        self.failed = 0
+        self.cancelled = 0
+
+    def backoff(self, attempts: int) -> float:
+        # 1x, 2x, 4x, ... the base delay, capped, with jitter so retries do not arrive in waves
+        delay = min(self.backoff_max, self.backoff_base * 2 ** (attempts - 1))
+        return delay * random.uniform(0.5, 1.0)
+
+    async def recover(self) -> int:
+        """
+        Puts payouts left 'processing' by a crashed dispatcher back in the queue. Safe to
+        resend thanks to the idempotency key. Only call it while no other dispatcher runs.
+        """
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(
+                update(Payout).where(Payout.status == "processing")
+                .values(status="pending", next_attempt_at=_now(), updated_at=_now())
+                .execution_options(synchronize_session=False)
+            )
+            await db.commit()
+        return result.rowcount
+
+    async def _claim_due(self, limit: int) -> list:
+        now = _now()
+        approved = select(Claim.id).where(Claim.status == "approved")
+        async with AsyncSessionLocal() as db:
+            # A claim rejected after its payout was queued must never be paid
+            cancelled = await db.execute(
+                update(Payout).where(Payout.status == "pending", Payout.next_attempt_at <= now,
+                                     Payout.claim_id.not_in(approved))
+                .values(status="cancelled", updated_at=now)
+                .execution_options(synchronize_session=False)
+            )
+            if cancelled.rowcount:
+                self.cancelled += cancelled.rowcount
+                logger.warning("Cancelled %d payouts whose claim is no longer approved.", cancelled.rowcount)
+            due = (await db.execute(
+                select(Payout.id).where(Payout.status == "pending", Payout.next_attempt_at <= now)
+                .order_by(Payout.next_attempt_at).limit(limit)
+            )).scalars().all()
+            if not due:
+                await db.commit()
+                return []
+            # Only rows still 'pending' (of a claim still approved) are taken, so two dispatchers
+            # never send the same payout at once
+            claimed = (await db.execute(
+                update(Payout).where(Payout.id.in_(due), Payout.status == "pending", Payout.claim_id.in_(approved))
+                .values(status="processing", updated_at=now)
+                .returning(Payout.id, Payout.claim_id, Payout.amount, Payout.idempotency_key, Payout.attempts)
+                .execution_options(synchronize_session=False)
+            )).all()
+            await db.commit()
+        return claimed
+
+    async def _attempt(self, payout):
+        try:
+            result = await self.pay(payout.claim_id, payout.amount, payout.idempotency_key)
+        except Exception as e:
+            record_error("payout", e)
+            result = {"success": False, "error": str(e)}
+
+        attempts = payout.attempts + 1
+        async with AsyncSessionLocal() as db:
+            if result.get("success"):
+                await db.execute(
+                    update(Payout).where(Payout.id == payout.id)
+                    .values(status="paid", attempts=attempts, transaction_id=result["transaction_id"],
+                            last_error=None, updated_at=_now())
+                    .execution_options(synchronize_session=False)
+                )
+                await db.execute(
+                    update(Claim).where(Claim.id == payout.claim_id)
+                    .values(stripe_transaction_id=result["transaction_id"], payment_amount=payout.amount)
+                    .execution_options(synchronize_session=False)
+                )
+                self.paid += 1
+                logger.info("Payment Successful for claim %s! TX: %s", payout.claim_id, result["transaction_id"],
+                            extra={"claim_id": payout.claim_id, "attempts": attempts})
+            else:
+                final = attempts >= self.max_attempts
+                await db.execute(
+                    update(Payout).where(Payout.id == payout.id)
+                    .values(status="failed" if final else "pending", attempts=attempts,
+                            last_error=result.get("error"), updated_at=_now(),
+                            next_attempt_at=_now() + datetime.timedelta(seconds=self.backoff(attempts)))
+                    .execution_options(synchronize_session=False)
+                )
+                if final:
+                    self.failed += 1
+                    record_error("payout", "gave_up")
+                    logger.error("Payout for claim %s failed after %d attempts: %s", payout.claim_id, attempts,
+                                 result.get("error"), extra={"claim_id": payout.claim_id, "attempts": attempts})
+                else:
+                    self.retried += 1
+                    logger.info("Payout for claim %s failed (attempt %d), retrying: %s", payout.claim_id, attempts,
+                                result.get("error"), extra={"claim_id": payout.claim_id, "attempts": attempts})
+            await db.commit()
+
+    async def dispatch_due(self) -> int:
+        """
+        Starts attempts for due payouts, up to the free concurrency slots. Returns how many started.
+        """
+        free = self.concurrency - len(self._in_flight)
+        if free <= 0:
+            return 0
+        claimed = await self._claim_due(free)
+        for payout in claimed:
+            task = asyncio.create_task(self._attempt(payout))
+            self._in_flight.add(task)
+            task.add_done_callback(self._in_flight.discard)
+        return len(claimed)
+
+    async def drain(self):
+        """
+        Pays everything that is due now (and waits for it). Retries scheduled later are left queued.
+        """
+        while True:
+            started = await self.dispatch_due()
+            if not started and not self._in_flight:
+                return
+            if self._in_flight:
+                await asyncio.wait(set(self._in_flight), return_when=asyncio.FIRST_COMPLETED)
+
+    async def run(self):
+        """
+        Dispatches until stop() is called, then lets the attempts in flight finish.
+        """
+        self._stopping = asyncio.Event()
+        try:
+            recovered = await self.recover()
+            if recovered:
+                logger.warning("Requeued %d payouts interrupted by a previous run.", recovered)
+        except Exception as e:
+            logger.exception("Payout dispatcher error: %s", e)
+        while not self._stopping.is_set():
+            try:
+                await self.dispatch_due()
+            except Exception as e:
+                logger.exception("Payout dispatcher error: %s", e)
+            # Wake up when a slot frees, stop() is called, or it is time to poll again
+            stop_wait = asyncio.create_task(self._stopping.wait())
+            await asyncio.wait({stop_wait, *self._in_flight}, timeout=self.poll_interval,
+                               return_when=asyncio.FIRST_COMPLETED)
+            stop_wait.cancel()
+        if self._in_flight:
+            await asyncio.wait(set(self._in_flight))
+
+    def stop(self):
+        if self._stopping is not None:
+            self._stopping.set()
+
+    async def stats(self) -> dict:
+        async with AsyncSessionLocal() as db:
+            counts = dict((await db.execute(select(Payout.status, func.count()).group_by(Payout.status))).all())
+        return {
+            "outbox": counts,
+            "in_flight": len(self._in_flight),
+            "paid": self.paid,
+            "retried": self.retried,
+            "failed": self.failed,
+            "cancelled": self.cancelled
+        }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Pay the approved claims queued in the payouts outbox.")
+    parser.add_argument("--drain", action="store_true", help="Pay what is due now and exit instead of running forever.")
+    args = parser.parse_args()
+    configure_logging()
+
+    async def main():
+        dispatcher = PayoutDispatcher()
+        await (dispatcher.drain() if args.drain else dispatcher.run())
+        print(await dispatcher.stats())
+
+    asyncio.run(main())
@@ -0,0 +1,238 @@
+import os
+import json
+import time
+import logging
+import threading
+from typing import Optional
+from backend.core.config import get_settings
+from backend.core.faiss_index import IndexConfig, apply_search_params, with_query_overrides, read_index
+from backend.core.code_metadata import CodeMetadata
+from backend.core.search_cache import embedding_cache, index_version
+
+logger = logging.getLogger(__name__)
+
+# Define where the vector indexes and their metadata live
+DATA_DIR = get_settings().vector_data_dir
+
+# Every build writes its files under a new version name, then atomically replaces this
+# small manifest to point at them. Readers either see the old set or the new one, never a mix.
+MANIFEST_PATH = os.path.join(DATA_DIR, "vector_manifest.json")
+
+# Layout written before versioned builds existed, still readable
+ICD10_INDEX_PATH = os.path.join(DATA_DIR, "icd10.index")
+CPT_INDEX_PATH = os.path.join(DATA_DIR, "cpt.index")
+META_PATH = os.path.join(DATA_DIR, "vector_meta.json")
+
+# Heavy resources are loaded on first use, not at import time, and shared by every
+# module in the process (vector_store, the MCP librarian, the agent graph).
+_embedder = None
+_embedder_lock = threading.Lock()
+
+_indexes = None
+_indexes_lock = threading.Lock()
+_last_reload_check = 0.0
+
+class VectorIndexes:
+    """
+    The FAISS indexes and the metadata that maps their ids back to codes,
+    loaded together so searches always see a consistent pair.
+    """
+    def __init__(self, icd10, cpt, metadata: dict, version: str, manifest_mtime_ns: Optional[int] = None):
+        self.icd10 = icd10
+        self.cpt = cpt
+        self.metadata = metadata # code type -> CodeMetadata (or a dict for JSON metadata), by row id
+        self.version = version
+        self.versions = {"icd10": version, "cpt": version}
+        self.manifest_mtime_ns = manifest_mtime_ns
+
+    def index(self, code_type: str):
+        return self.icd10 if code_type == "icd10" else self.cpt
+
+def load_embedding_model():
+    """
+    Loads the configured SentenceTransformer into this process.
+    torch and sentence_transformers are only imported here, so processes that never
+    embed anything never pay for them.
+    """
+    import torch
+    from sentence_transformers import SentenceTransformer
+
+    # Detect Hardware (GPU vs CPU) and creates 384-dimensional vectors
+    device = "cuda" if torch.cuda.is_available() else "cpu"
+    model_name = get_settings().embedding_model
+    logger.info("Loading embedding model %s on: %s", model_name, device.upper())
+    return SentenceTransformer(model_name, device=device)
+
+def get_embedder():
+    """
+    Returns the shared embedder, creating it on first call: the model itself with
+    EMBEDDING_BACKEND=local, its ONNX export with EMBEDDING_BACKEND=onnx (see
+    backend/core/onnx_embedder.py), or a client of the shared embedding service with
+    EMBEDDING_BACKEND=service (see backend/core/embedding_service.py).
+    """
+    global _embedder
+    if _embedder is None:
+        with _embedder_lock:
+            if _embedder is None:
+                backend = get_settings().embedding_backend
+                if backend == "local":
+                    _embedder = load_embedding_model()
+                elif backend == "onnx":
+                    from backend.core.onnx_embedder import OnnxEmbedder
+                    _embedder = OnnxEmbedder()
+                elif backend == "service":
+                    from backend.core.embedding_service import RemoteEmbedder
+                    _embedder = RemoteEmbedder()
+                    logger.info("Using the embedding service at %s", _embedder.socket_path)
+                else:
+                    raise ValueError(f"Unknown EMBEDDING_BACKEND '{backend}'. Use local, onnx or service")
+    return _embedder
+
+def embedding_identity() -> dict:
+    """
+    What the configured embedder produces vectors with: the model and the backend (with
+    the ONNX file, int8 and fp32 exports differ). The vector DB manifest records it, so an
+    index is never extended with vectors of another model.
+    """
+    settings = get_settings()
+    backend = settings.embedding_backend
+    if backend == "onnx":
+        backend = f"onnx:{settings.embedding_onnx_file}"
+    return {"model": settings.embedding_model, "backend": backend}
+
+def set_embedder(embedder):
+    """
+    Replaces the shared embedding model with any object that has encode() and
+    get_sentence_embedding_dimension(), e.g. a fast stand-in for offline benchmarks.
+    None loads the configured model again on the next call. Cached query vectors
+    of the previous model are dropped.
+    """
+    global _embedder
+    with _embedder_lock:
+        _embedder = embedder
+    embedding_cache.clear()
+
+def read_manifest() -> Optional[dict]:
+    """Returns the manifest of the current vector DB version, or None if there is none yet."""
+    try:
+        with open(MANIFEST_PATH, "r") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+def _manifest_mtime_ns() -> Optional[int]:
+    try:
+        return os.stat(MANIFEST_PATH).st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+def data_path(name: str) -> str:
+    return os.path.join(DATA_DIR, name)
+
+def _read_metadata(path: str) -> dict:
+    with open(path, "r") as f:
+        raw = json.load(f)
+    # Legacy metadata is a list in index order, versioned metadata is keyed by row id
+    return {
+        code_type: dict(enumerate(items)) if isinstance(items, list) else {int(k): v for k, v in items.items()}
+        for code_type, items in raw.items() if code_type in ("icd10", "cpt")
+    }
+
+def read_code_metadata(manifest: dict) -> dict:
+    """
+    Opens the metadata of a published version: one memory-mapped CodeMetadata file per
+    code type, or the single JSON file written by versions before the binary format.
+    """
+    if "meta" in manifest["icd10"]:
+        return {code_type: CodeMetadata(data_path(manifest[code_type]["meta"])) for code_type in ("icd10", "cpt")}
+    return _read_metadata(data_path(manifest["meta"]))
+
+def _load_vector_indexes() -> VectorIndexes:
+    mtime = _manifest_mtime_ns()
+    manifest = read_manifest()
+    mmap = get_settings().vector_mmap
+
+    if manifest is not None:
+        configs = {code_type: IndexConfig.from_dict(manifest[code_type]["config"]) for code_type in ("icd10", "cpt")}
+        # Map the FAISS indexes, the pages are shared with every other worker process
+        index_icd10 = read_index(data_path(manifest["icd10"]["index"]), configs["icd10"].index_type, mmap=mmap)
+        index_cpt = read_index(data_path(manifest["cpt"]["index"]), configs["cpt"].index_type, mmap=mmap)
+        # Load Metadata to map math back to readable text
+        metadata = read_code_metadata(manifest)
+        version = manifest["version"]
+    else:
+        missing = [p for p in (ICD10_INDEX_PATH, CPT_INDEX_PATH, META_PATH) if not os.path.exists(p)]
+        if missing:
+            raise FileNotFoundError(
+                f"Vector DB not built yet (missing {', '.join(missing)}). "
+                "Run `python -m backend.core.vector_store` first."
+            )
+        index_icd10 = read_index(ICD10_INDEX_PATH, mmap=mmap)
+        index_cpt = read_index(CPT_INDEX_PATH, mmap=mmap)
+        configs = {}
+        metadata = _read_metadata(META_PATH)
+        version = index_version(ICD10_INDEX_PATH, CPT_INDEX_PATH, META_PATH)
+
+    # Apply the query-time knobs (nprobe / efSearch) of approximate indexes
+    apply_search_params(index_icd10, with_query_overrides(configs.get("icd10", IndexConfig())))
+    apply_search_params(index_cpt, with_query_overrides(configs.get("cpt", IndexConfig())))
+
+    return VectorIndexes(index_icd10, index_cpt, metadata, version, mtime)
+
+def get_vector_indexes() -> VectorIndexes:
+    """
+    Returns the loaded FAISS indexes and metadata, reading them from disk on first call.
+    Raises FileNotFoundError with a hint if build_vector_db has not been run.
+
+    Every VECTOR_RELOAD_INTERVAL seconds the manifest is checked, and when another process
+    published a new version it is loaded and swapped in. Searches already running keep
+    the object they hold, so a reload never disturbs them.
+    """
+    global _indexes, _last_reload_check
+    if _indexes is None:
+        with _indexes_lock:
+            if _indexes is None:
+                _indexes = _load_vector_indexes()
+                _last_reload_check = time.monotonic()
+        return _indexes
+
+    interval = get_settings().vector_reload_interval
+    if interval > 0 and time.monotonic() - _last_reload_check >= interval:
+        # Only one thread checks, the others keep serving the current version
+        if _indexes_lock.acquire(blocking=False):
+            try:
+                _last_reload_check = time.monotonic()
+                current = _indexes
+                if _manifest_mtime_ns() != current.manifest_mtime_ns:
+                    manifest = read_manifest()
+                    if manifest is not None and manifest["version"] != current.version:
+                        _indexes = _load_vector_indexes()
+                        logger.info("Hot-reloaded vector DB version %s", _indexes.version)
+            except Exception as e:
+                logger.warning("Vector DB hot reload failed, keeping version %s: %s", _indexes.version, e)
+            finally:
+                _indexes_lock.release()
+    return _indexes
+
+def reset_vector_indexes():
+    """
+    Forgets the loaded indexes so the next search reads the files again,
+    e.g. after build_vector_db rewrote them in this process.
+    """
+    global _indexes
+    with _indexes_lock:
+        _indexes = None
+
+def warm_up(require_indexes: bool = False):
+    """
+    Loads the embedding model and the vector indexes up front.
+    Servers call this at startup so the first request does not pay the loading cost.
+    A missing vector DB is only reported (searches will raise) unless require_indexes is set.
+    """
+    get_embedder()
+    try:
+        get_vector_indexes()
+    except FileNotFoundError as e:
+        if require_indexes:
+            raise
+        logger.warning("%s", e)
@@ -0,0 +1,243 @@
+import os
+import csv
+import logging
+import argparse
+import threading
+from typing import Dict, List, NamedTuple, Optional
+from backend.core.config import get_settings
+
+logger = logging.getLogger(__name__)
+
+# Rule 1 threshold. Lowered it slightly to 0.80 because FAISS math can be strict
+MIN_CONFIDENCE = 0.80
+
+INVALID_CODES = ("none", "null", "", "undefined")
+
+# A claim is as bad as its worst line
+STATUS_SEVERITY = {"approved": 0, "suspicious": 1, "rejected": 2}
+
+# Marks a trie node where a listed ICD-10 prefix ends
+_END = "$"
+
+class CoverageRow(NamedTuple):
+    """LCD/NCD style coverage: the procedure is only covered for diagnoses starting with icd10_prefix."""
+    rule_id: str
+    cpt_code: str
+    icd10_prefix: str
+    reason: str
+
+class NcciRow(NamedTuple):
+    """NCCI style edit: column2_cpt cannot be billed on the same claim as column1_cpt."""
+    rule_id: str
+    column1_cpt: str
+    column2_cpt: str
+    reason: str
+
+class _CoverageRule:
+    def __init__(self, rule_id: str, reason: str):
+        self.rule_id = rule_id
+        self.reason = reason
+        self.prefixes = []
+        self.trie = {}
+
+    def add_prefix(self, prefix: str):
+        self.prefixes.append(prefix)
+        node = self.trie
+        for char in prefix:
+            node = node.setdefault(char, {})
+        node[_END] = True
+
+    def covers(self, icd: str) -> bool:
+        # Walks the diagnosis once, O(len(code)) however many prefixes the rule lists
+        node = self.trie
+        for char in icd:
+            if _END in node:
+                return True
+            node = node.get(char)
+            if node is None:
+                return False
+        return _END in node
+
+def normalize_cpt(code) -> str:
+    return str(code).strip().upper()
+
+def normalize_icd(code) -> str:
+    # "J02.9", "j029" and "J02.9 " are the same diagnosis
+    return str(code).strip().upper().replace(".", "")
+
+def _result(status: str, reason: str, rule_id: str) -> dict:
+    return {"status": status, "reason": reason, "rule_id": rule_id}
+
+class RuleEngine:
+    """
+    Payer rules compiled for lookup instead of scanning.
+
+    Coverage rules are grouped in a hash map by CPT code, each holding a prefix trie of its
+    ICD-10 prefixes. NCCI edits are a hash map from the column 1 CPT to its column 2 codes.
+    A line only touches the rules of its own CPT code, so evaluating a claim costs
+    O(number of matching rules), not O(size of the rule tables).
+    """
+    def __init__(self, coverage: List[CoverageRow] = (), ncci: List[NcciRow] = (),
+                 min_confidence: float = MIN_CONFIDENCE):
+        self.min_confidence = min_confidence
+        self.rule_count = len(coverage) + len(ncci)
+
+        self._coverage: Dict[str, Dict[str, _CoverageRule]] = {}
+        for row in coverage:
+            rules = self._coverage.setdefault(normalize_cpt(row.cpt_code), {})
+            rule = rules.get(row.rule_id)
+            if rule is None:
+                rule = rules[row.rule_id] = _CoverageRule(row.rule_id, row.reason)
+            rule.add_prefix(normalize_icd(row.icd10_prefix))
+
+        self._ncci: Dict[str, Dict[str, NcciRow]] = {}
+        for row in ncci:
+            self._ncci.setdefault(normalize_cpt(row.column1_cpt), {})[normalize_cpt(row.column2_cpt)] = row
+
+    @property
+    def coverage_cpts(self) -> List[str]:
+        return list(self._coverage)
+
+    def coverage_for(self, cpt: str) -> list:
+        """The coverage rules of a normalized CPT code, in evaluation order."""
+        return list(self._coverage.get(cpt, {}).values())
+
+    def evaluate_line(self, icd_codes: List[str], cpt_code: str, confidence: float) -> dict:
+        """
+        Evaluates one claim line: a procedure and the diagnoses linked to it.
+        """
+        # Clean the inputs strictly (Convert to lowercase to catch string 'none')
+        icds = [normalize_icd(icd) for icd in icd_codes if str(icd).strip().lower() not in INVALID_CODES]
+        cpt = normalize_cpt(cpt_code)
+
+        # Rule 0: Missing or 'None' data
+        if not icds or cpt.lower() in INVALID_CODES:
+            return _result("rejected", "Missing diagnosis or procedure code.", "R0_MISSING_DATA")
+
+        # Rule 1: AI Confidence threshold
+        if confidence < self.min_confidence:
+            return _result(
+                "suspicious",
+                f"AI confidence ({confidence}) is below the {self.min_confidence:.0%} threshold. Manual review required",
+                "R1_LOW_CONFIDENCE"
+            )
+
+        # Coverage (Cross-Walking): one of the linked diagnoses must be covered for the procedure
+        for rule in self._coverage.get(cpt, {}).values():
+            if not any(rule.covers(icd) for icd in icds):
+                return _result("rejected", rule.reason, rule.rule_id)
+
+        # If it passes all rules, the insurance company approves it!
+        return _result("approved", "Claim meets all medical necessity rules.", "PASS")
+
+    def evaluate_claim(self, lines: List[dict]) -> dict:
+        """
+        Adjudicates every line of a claim ({"cpt_code", "icd10_codes", "confidence"}),
+        plus the NCCI edits between its lines. Returns the decision of the worst line,
+        with the per-line decisions under "lines".
+        """
+        if not lines:
+            return {**_result("rejected", "Missing diagnosis or procedure code.", "R0_MISSING_DATA"), "lines": []}
+
+        decisions = [self.evaluate_line(line["icd10_codes"], line["cpt_code"], line["confidence"]) for line in lines]
+
+        # NCCI: a column 2 code is denied when its column 1 code is billed on another line
+        cpts = [normalize_cpt(line["cpt_code"]) for line in lines]
+        billed = set(cpts)
+        for column1 in billed:
+            for column2, row in self._ncci.get(column1, {}).items():
+                if column2 == column1 or column2 not in billed:
+                    continue
+                for i, cpt in enumerate(cpts):
+                    if cpt == column2 and decisions[i]["status"] == "approved":
+                        decisions[i] = _result("rejected", row.reason, row.rule_id)
+
+        worst = max(range(len(decisions)), key=lambda i: STATUS_SEVERITY[decisions[i]["status"]])
+        decision = dict(decisions[worst])
+        if len(lines) > 1 and decision["status"] != "approved":
+            decision["reason"] = f"Line {worst + 1}: {decision['reason']}"
+        decision["lines"] = decisions
+        return decision
+
+# ---------- Loading rule tables -------------------
+
+def load_rules_from_files(rules_dir: str):
+    """
+    Reads coverage.csv and ncci.csv from rules_dir (either may be missing).
+    """
+    def read(name: str, row_type):
+        path = os.path.join(rules_dir, name)
+        if not os.path.exists(path):
+            return []
+        with open(path, newline="", encoding="utf-8") as f:
+            return [row_type(**{field: row[field] for field in row_type._fields}) for row in csv.DictReader(f)]
+
+    return read("coverage.csv", CoverageRow), read("ncci.csv", NcciRow)
+
+def load_rules_from_db():
+    from backend.data.db import SessionLocal, PayerRule
+    db = SessionLocal()
+    try:
+        coverage, ncci = [], []
+        for rule in db.query(PayerRule).all():
+            if rule.kind == "coverage":
+                coverage.append(CoverageRow(rule.rule_id, rule.cpt_code, rule.other_code, rule.reason))
+            elif rule.kind == "ncci":
+                ncci.append(NcciRow(rule.rule_id, rule.cpt_code, rule.other_code, rule.reason))
+        return coverage, ncci
+    finally:
+        db.close()
+
+def import_rules_to_db(coverage: List[CoverageRow], ncci: List[NcciRow]):
+    """
+    Replaces the payer_rules table with the given rules.
+    """
+    from backend.data.db import SessionLocal, PayerRule, init_db
+    init_db()
+    db = SessionLocal()
+    try:
+        db.query(PayerRule).delete()
+        db.add_all([PayerRule(rule_id=r.rule_id, kind="coverage", cpt_code=r.cpt_code,
+                              other_code=r.icd10_prefix, reason=r.reason) for r in coverage])
+        db.add_all([PayerRule(rule_id=r.rule_id, kind="ncci", cpt_code=r.column1_cpt,
+                              other_code=r.column2_cpt, reason=r.reason) for r in ncci])
+        db.commit()
+    finally:
+        db.close()
+
+_engine: Optional[RuleEngine] = None
+_engine_lock = threading.Lock()
+
+def get_rule_engine() -> RuleEngine:
+    """
+    Returns the process-wide engine, compiled on first use from PAYER_RULES_SOURCE
+    ('files' reads PAYER_RULES_DIR, 'db' reads the payer_rules table).
+    """
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                settings = get_settings()
+                if settings.payer_rules_source == "db":
+                    coverage, ncci = load_rules_from_db()
+                else:
+                    coverage, ncci = load_rules_from_files(settings.payer_rules_dir)
+                _engine = RuleEngine(coverage, ncci)
+                logger.info("Compiled %d payer rules from %s", _engine.rule_count, settings.payer_rules_source)
+    return _engine
+
+def reset_rule_engine():
+    """
+    Drops the compiled engine so the next claim recompiles the (changed) rule tables.
+    """
+    global _engine
+    with _engine_lock:
+        _engine = None
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Copy the payer rule CSV files into the payer_rules table.")
+    parser.add_argument("--rules-dir", default=get_settings().payer_rules_dir)
+    args = parser.parse_args()
+    coverage, ncci = load_rules_from_files(args.rules_dir)
+    import_rules_to_db(coverage, ncci)
+    print(f"Imported {len(coverage)} coverage and {len(ncci)} NCCI rows into the database.")
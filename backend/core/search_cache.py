@@ -0,0 +1,97 @@
+import os
+import threading
+from collections import OrderedDict
+from backend.core.config import get_settings
+from backend.core.telemetry import CACHE_EVENTS
+
+class LRUCache:
+    """
+    A small thread-safe LRU cache with hit/miss/eviction counters.
+    Used by the vector search librarian to skip re-embedding and re-searching
+    clinical phrases that show up again and again across claims.
+    """
+    def __init__(self, maxsize: int, name: str = "lru"):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        # Labelled children resolved once, so counting a lookup is a single increment
+        self._hit_events = CACHE_EVENTS.labels(name, "hit")
+        self._miss_events = CACHE_EVENTS.labels(name, "miss")
+
+    def get(self, key):
+        """Returns the cached value (and marks it recently used), or None on a miss."""
+        with self._lock:
+            value = self._data.get(key)
+            if value is None:
+                self.misses += 1
+                self._miss_events.inc()
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+        self._hit_events.inc()
+        return value
+
+    def put(self, key, value):
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0
+            }
+
+def normalize_query(text: str) -> str:
+    """
+    Canonical form of a search phrase: lowercase with collapsed whitespace.
+    The embedding model is uncased, so this does not change the vector.
+    """
+    return " ".join(str(text).lower().split())
+
+def index_version(*paths: str) -> str:
+    """
+    Fingerprint of the on-disk index files (size + modification time).
+    Rebuilding the vector DB rewrites the files, which changes the version, so cached
+    results of the old index can never be served for the new one.
+    """
+    parts = []
+    for path in paths:
+        try:
+            stat = os.stat(path)
+            parts.append(f"{stat.st_size}:{stat.st_mtime_ns}")
+        except FileNotFoundError:
+            parts.append("missing")
+    return "|".join(parts)
+
+_settings = get_settings()
+
+# normalized phrase -> query vector (independent of the index)
+embedding_cache = LRUCache(_settings.embedding_cache_size, name="embedding")
+
+# (index version, code type, k, normalized phrase) -> top-k scores and row ids
+result_cache = LRUCache(_settings.search_cache_size, name="search_result")
+
+def cache_stats() -> dict:
+    return {
+        "embeddings": embedding_cache.stats(),
+        "results": result_cache.stats()
+    }
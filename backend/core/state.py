@@ -1,4 +1,28 @@
-from typing import TypedDict, List, Optional
+from typing import TypedDict, Annotated, Dict, List, Optional
+from backend.core.telemetry import merge_timings
+
+class CodeCandidate(TypedDict):
+    """
+    One vector search match. Scores stay numeric so candidates can be filtered or
+    thresholded in code; they are only rendered as text for the LLM and MCP clients.
+    """
+    code: str
+    description: str
+    score: float # Cosine similarity, higher is closer
+    rank: int # 1 = best match for its query
+    query: str # The extracted phrase this candidate was found for
+
+class CodeLine(TypedDict):
+    """
+    One billed line of a claim: a procedure and the diagnoses that justify it.
+    """
+    line: int # 1-based position on the claim
+    cpt_code: str
+    icd10_codes: List[str]
+    confidence: float
+    status: str # 'pending' until adjudicated, then 'approved', 'rejected' or 'suspicious'
+    rule_id: Optional[str]
+    rejection_reason: Optional[str]
 
 class ClaimState(TypedDict):
     """
@@ -7,25 +31,37 @@ class ClaimState(TypedDict):
     """
     # Input
     clinical_note: str
+    bypass_llm_cache: Optional[bool] # Ask the LLM again even if the same prompt was answered before
 
     # Process Data
-    extracted_diagnosis: Optional[str] # Raw text extracted from note
-    extracted_procedure: Optional[str] # Raw text extracted from note
+    extracted_diagnoses: List[str] # Every diagnosis phrase extracted from the note
+    extracted_procedures: List[str] # Every procedure phrase extracted from the note
+    extracted_diagnosis: Optional[str] # All extracted diagnoses as one text, for display and the DB
+    extracted_procedure: Optional[str] # All extracted procedures as one text, for display and the DB
 
     # Tool Outputs (From FAISS)
-    icd10_candidates: List[str]
-    cpt_candidates: List[str]
+    icd10_candidates: List[CodeCandidate]
+    cpt_candidates: List[CodeCandidate]
 
     # Final Decisions
-    final_icd10_code: Optional[str]
-    final_cpt_code: Optional[str]
+    code_lines: List[CodeLine]
+    final_icd10_code: Optional[str] # Primary diagnosis (first code of the first line)
+    final_cpt_code: Optional[str] # Procedure of the first line
     explanation: Optional[str]
-    confidence_score: float
+    confidence_score: float # Lowest line confidence
+    decision_path: Optional[str] # 'llm', 'fast_path' (clear winner) or 'top_match' (extract_once mode)
+    llm_error: Optional[str] # Set when the LLM gave no parseable answer, even after retrying
 
     # Payer Decision Fields
     status: str # 'review_needed', 'approved', 'rejected'
     rejection_reason: Optional[str]
     rule_id: Optional[str]
 
+    # Database row the claim was saved as
+    claim_id: Optional[int]
+
+    # Milliseconds spent in each node, and in the external calls it made ("extract.ollama.extract-v2")
+    timings: Annotated[Dict[str, float], merge_timings]
+
     # Log of what happened
     messages: List[str] 
\ No newline at end of file
@@ -0,0 +1,211 @@
+import os
+import json
+import time
+import asyncio
+import logging
+import threading
+import contextvars
+from typing import Callable, Dict, Optional
+from prometheus_client import CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Histogram, generate_latest
+from backend.core.config import get_settings
+
+# ---------- Metrics -------------------------------
+# Exposed at GET /metrics. With several API workers, set PROMETHEUS_MULTIPROC_DIR to a shared,
+# empty directory so every worker writes its values there and /metrics sums them up.
+
+# Node latencies go from a few µs (rules) to minutes (a cold LLM), hence the wide buckets
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+NODE_LATENCY = Histogram(
+    "medicode_node_seconds", "Time spent in each node of the claim graph.", ["node"], buckets=LATENCY_BUCKETS
+)
+EXTERNAL_CALL_LATENCY = Histogram(
+    "medicode_external_call_seconds", "Latency of calls to Ollama, the embedding model, FAISS, the databases and Stripe.",
+    ["service", "operation"], buckets=LATENCY_BUCKETS
+)
+LLM_TOKENS = Counter(
+    "medicode_llm_tokens", "Tokens reported by Ollama, by kind (prompt or completion) and prompt template.",
+    ["kind", "template"]
+)
+CACHE_EVENTS = Counter(
+    "medicode_cache_events", "Cache lookups by cache and result (hit, miss or bypass).", ["cache", "result"]
+)
+ERRORS = Counter(
+    "medicode_errors", "Errors by where they happened and exception type.", ["where", "kind"]
+)
+PARSE_FAILURES = Counter(
+    "medicode_llm_parse_failures", "LLM answers that were not the JSON the prompt asked for.", ["template"]
+)
+LLM_EARLY_STOPS = Counter(
+    "medicode_llm_early_stops", "Streamed LLM answers closed as soon as their JSON object was complete.", ["template"]
+)
+CLAIMS = Counter(
+    "medicode_claims", "Adjudicated claims by status and decision path.", ["status", "decision_path"]
+)
+
+def metrics_response():
+    """
+    The body and content type of a Prometheus scrape.
+    """
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(), CONTENT_TYPE_LATEST
+
+def record_error(where: str, error) -> None:
+    ERRORS.labels(where, error if isinstance(error, str) else type(error).__name__).inc()
+
+def record_tokens(message, template: str, streamed_chunks: int = 0) -> None:
+    """
+    Counts the tokens of one chat model answer. Ollama reports them as prompt_eval_count
+    and eval_count, LangChain copies them to usage_metadata. A stream closed early never
+    gets those counts; Ollama streams one token per chunk, so the chunks are counted instead.
+    """
+    usage = getattr(message, "usage_metadata", None) or {}
+    metadata = getattr(message, "response_metadata", None) or {}
+    prompt = usage.get("input_tokens", metadata.get("prompt_eval_count"))
+    completion = usage.get("output_tokens", metadata.get("eval_count")) or streamed_chunks
+    if prompt:
+        LLM_TOKENS.labels("prompt", template).inc(prompt)
+    if completion:
+        LLM_TOKENS.labels("completion", template).inc(completion)
+
+# ---------- Per-claim timings ---------------------
+# While a node runs, the external calls it makes also land in a dict held by this context
+# variable, so each claim gets its own breakdown even with many claims on one event loop.
+_node_timings = contextvars.ContextVar("node_timings", default=None)
+
+class external_call:
+    """
+    Times one call to an outside service, e.g.
+
+        with external_call("ollama", "extract-v2"):
+            answer = llm.invoke(prompt)
+
+    The latency goes to medicode_external_call_seconds and, inside a graph node, to the
+    claim's timing breakdown. An exception is counted in medicode_errors and re-raised.
+    """
+    __slots__ = ("service", "operation", "start")
+
+    def __init__(self, service: str, operation: str):
+        self.service = service
+        self.operation = operation
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        elapsed = time.perf_counter() - self.start
+        EXTERNAL_CALL_LATENCY.labels(self.service, self.operation).observe(elapsed)
+        if exc_type is not None:
+            ERRORS.labels(self.service, exc_type.__name__).inc()
+        timings = _node_timings.get()
+        if timings is not None:
+            key = f"{self.service}.{self.operation}"
+            timings[key] = timings.get(key, 0.0) + elapsed
+        return False
+
+def merge_timings(left: Optional[Dict[str, float]], right: Optional[Dict[str, float]]) -> Dict[str, float]:
+    """
+    State reducer of ClaimState.timings: each node adds its own entries.
+    """
+    return {**(left or {}), **(right or {})}
+
+def _with_timings(update, name: str, elapsed: float, calls: Dict[str, float]):
+    NODE_LATENCY.labels(name).observe(elapsed)
+    logger.debug("Node %s finished in %.1f ms", name, elapsed * 1000)
+    if not isinstance(update, dict):
+        return update
+    # Milliseconds, with the external calls of the node nested under its name
+    timings = {name: round(elapsed * 1000, 3)}
+    for key, seconds in calls.items():
+        timings[f"{name}.{key}"] = round(seconds * 1000, 3)
+    return {**update, "timings": timings}
+
+def timed_node(name: str, node: Callable) -> Callable:
+    """
+    Wraps a graph node (sync or async) so its latency is recorded in medicode_node_seconds,
+    its failures in medicode_errors, and both it and its external calls in state["timings"].
+    """
+    if asyncio.iscoroutinefunction(node):
+        async def timed(state):
+            calls = {}
+            token = _node_timings.set(calls)
+            start = time.perf_counter()
+            try:
+                update = await node(state)
+            except Exception as e:
+                record_error(f"node.{name}", e)
+                raise
+            finally:
+                _node_timings.reset(token)
+            return _with_timings(update, name, time.perf_counter() - start, calls)
+    else:
+        def timed(state):
+            calls = {}
+            token = _node_timings.set(calls)
+            start = time.perf_counter()
+            try:
+                update = node(state)
+            except Exception as e:
+                record_error(f"node.{name}", e)
+                raise
+            finally:
+                _node_timings.reset(token)
+            return _with_timings(update, name, time.perf_counter() - start, calls)
+    timed.__name__ = getattr(node, "__name__", name)
+    timed.__doc__ = node.__doc__
+    return timed
+
+# ---------- Logging -------------------------------
+logger = logging.getLogger(__name__)
+
+# Attributes every LogRecord has; anything else was passed with extra={...}
+_RECORD_FIELDS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+class JsonFormatter(logging.Formatter):
+    """
+    One JSON object per line, with the fields passed as extra={...} as top-level keys.
+    """
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": round(record.created, 6),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage()
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_FIELDS and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+_configured = False
+_configure_lock = threading.Lock()
+
+def configure_logging(level: Optional[str] = None, fmt: Optional[str] = None):
+    """
+    Sends the backend.* loggers to stderr at LOG_LEVEL, as text or as JSON lines (LOG_FORMAT).
+    Safe to call more than once; only the first call configures anything. Loggers of other
+    libraries stay at WARNING so e.g. httpx does not log every Ollama request.
+    """
+    global _configured
+    with _configure_lock:
+        if _configured:
+            return
+        _configured = True
+        settings = get_settings()
+        handler = logging.StreamHandler()
+        if (fmt or settings.log_format) == "json":
+            handler.setFormatter(JsonFormatter())
+        else:
+            handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)-7s %(name)s: %(message)s"))
+        root = logging.getLogger()
+        if not root.handlers:
+            root.addHandler(handler)
+            root.setLevel(logging.WARNING)
+        logging.getLogger("backend").setLevel((level or settings.log_level).upper())
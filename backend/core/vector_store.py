@@ -1,74 +1,197 @@
 import os
+import glob
 import json
+import uuid
+import hashlib
+import logging
+import argparse
+import datetime
 import faiss
 import numpy as np
-import torch
-from sentence_transformers import SentenceTransformer
 from backend.data.db import SessionLocal, ICD10Code, CPTCode
+from backend.core.faiss_index import IndexConfig, build_index, index_config_from_settings, supports_removal, read_index
+from backend.core.code_metadata import write_code_metadata
+from backend.core.resources import (
+    DATA_DIR, MANIFEST_PATH, data_path, read_manifest, read_code_metadata, get_embedder, reset_vector_indexes,
+    embedding_identity
+)
+from backend.core.telemetry import configure_logging
 
-# Define where we will save our vector indexes and metadata
-DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "data")
-ICD10_INDEX_PATH = os.path.join(DATA_DIR, "icd10.index")
-CPT_INDEX_PATH = os.path.join(DATA_DIR, "cpt.index")
-META_PATH = os.path.join(DATA_DIR, "vector_meta.json")
+logger = logging.getLogger(__name__)
 
-# Load a lightweight, free, local embedding model
-# Detect Hardware (GPU vs CPU) and creates 384-dimensional vectors
-device = "cuda" if torch.cuda.is_available() else "cpu"
-print(f"Loading embedding model on: {device.upper()}")
+CODE_TYPES = {"icd10": ICD10Code, "cpt": CPTCode}
 
-# 3. Load Model onto the selected hardware
-embedder = SentenceTransformer('all-MiniLM-L6-v2', device=device)
+def content_hash(code: str, description: str) -> str:
+    """Fingerprint of the text we embed for a code, to detect changed descriptions."""
+    return hashlib.blake2b(f"{code}: {description}".encode("utf-8"), digest_size=16).hexdigest()
 
-def build_vector_db():
+def _embed(records) -> np.ndarray:
+    texts = [f"{r.code}: {r.description}" for r in records]
+    # Generate vectors
+    return np.asarray(get_embedder().encode(texts, normalize_embeddings=True), dtype=np.float32)
+
+def _ids(records) -> np.ndarray:
+    return np.array([r.id for r in records], dtype=np.int64)
+
+def _metadata(records) -> dict:
+    return {r.id: {"code": r.code, "desc": r.description, "hash": content_hash(r.code, r.description)} for r in records}
+
+def _new_version() -> str:
+    stamp = datetime.datetime.now(datetime.timezone.utc).strftime("%Y%m%dT%H%M%S")
+    return f"{stamp}-{uuid.uuid4().hex[:8]}"
+
+def _full_build(code_type: str, records, config: IndexConfig):
+    label = "ICD-10" if code_type == "icd10" else "CPT"
+    logger.info("Generating embeddings for %s...", label)
+    index, effective = build_index(_embed(records), config, ids=_ids(records))
+    logger.info("%s index: %s over %d codes (full build)", label, effective.index_type, index.ntotal)
+    return index, effective, _metadata(records)
+
+def _incremental_update(code_type: str, records, config: IndexConfig, manifest: dict, old_meta: dict):
+    """
+    Applies only the differences between the database and the published index:
+    new codes are embedded and added, changed descriptions are re-embedded and replaced,
+    and codes deleted from the database are removed.
+    Returns None when the change cannot be applied in place and a full build is needed.
+    """
+    label = "ICD-10" if code_type == "icd10" else "CPT"
+    # New vectors from another model (or backend) would not be comparable with the old ones
+    embedding = embedding_identity()
+    if manifest.get("embedding") != embedding:
+        logger.info("%s: embeddings changed (%s -> %s), rebuilding.", label, manifest.get("embedding"), embedding)
+        return None
+
+    built = IndexConfig.from_dict(manifest[code_type]["config"])
+    # Compared with what was asked for last time, not with what was built: a code set too
+    # small for IVF is built flat, and that fallback must not trigger a rebuild every run
+    requested = IndexConfig.from_dict(manifest[code_type].get("requested", manifest[code_type]["config"]))
+    if requested.index_type != config.index_type:
+        logger.info("%s: index type changed (%s -> %s), rebuilding.", label, requested.index_type, config.index_type)
+        return None
+
+    current = {r.id: r for r in records}
+    new_ids = [i for i in current if i not in old_meta]
+    changed_ids = [i for i in current if i in old_meta
+                   and old_meta[i]["hash"] != content_hash(current[i].code, current[i].description)]
+    removed_ids = [i for i in old_meta if i not in current]
+
+    stale = changed_ids + removed_ids
+    if stale and not supports_removal(built):
+        logger.info("%s: %s indexes cannot delete vectors, rebuilding.", label, built.index_type)
+        return None
+
+    # A private, writable copy: the published file may be mapped by running searchers
+    index = read_index(data_path(manifest[code_type]["index"]), mmap=False)
+    if stale:
+        index.remove_ids(np.array(stale, dtype=np.int64))
+
+    to_embed = [current[i] for i in new_ids + changed_ids]
+    if to_embed:
+        logger.info("Generating embeddings for %d new/changed %s codes...", len(to_embed), label)
+        index.add_with_ids(_embed(to_embed), _ids(to_embed))
+
+    metadata = {i: m for i, m in old_meta.items() if i in current}
+    metadata.update(_metadata(to_embed))
+    logger.info("%s index: +%d new, ~%d changed, -%d removed (%d codes)",
+                label, len(new_ids), len(changed_ids), len(removed_ids), index.ntotal)
+    return index, built, metadata
+
+def _publish(indexes: dict, configs: dict, metadata: dict, requested: IndexConfig, previous: dict = None) -> str:
     """
-    Reads the SQLite database, converts medical descriptions to vectors, 
+    Writes a new version of the index files and metadata, then atomically swaps the manifest.
+    Each index records its effective config ("config") and the requested one ("requested"),
+    the manifest the model and backend its vectors come from ("embedding").
+    Running searchers (also in other processes) hot-reload on their next manifest check.
+    """
+    os.makedirs(DATA_DIR, exist_ok=True)
+    version = _new_version()
+    manifest = {"version": version, "embedding": embedding_identity()}
+
+    for code_type, index in indexes.items():
+        name = f"{code_type}-{version}.index"
+        faiss.write_index(index, data_path(name))
+        # Save metadata mapping so we know which vector belongs to which code
+        meta_name = f"{code_type}-{version}.meta"
+        write_code_metadata(data_path(meta_name), metadata[code_type])
+        manifest[code_type] = {"index": name, "meta": meta_name, "config": configs[code_type].to_dict(),
+                               "requested": requested.to_dict()}
+
+    tmp_path = f"{MANIFEST_PATH}.{version}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, MANIFEST_PATH)
+
+    _remove_old_versions(keep={version, previous["version"] if previous else version})
+    return version
+
+def _remove_old_versions(keep: set):
+    # The previous version is kept for processes that are still loading it
+    for path in glob.glob(data_path("icd10-*")) + glob.glob(data_path("cpt-*")) \
+            + glob.glob(data_path("vector_meta-*.json")):
+        name = os.path.basename(path)
+        if not any(version in name for version in keep):
+            try:
+                os.remove(path)
+            except OSError as e:
+                # Windows refuses to delete files another process still has mapped, retried on the next build
+                logger.warning("Could not remove old vector DB file %s: %s", name, e)
+
+def build_vector_db(incremental: bool = False):
+    """
+    Reads the SQLite database, converts medical descriptions to vectors,
     and saves them using FAISS for lightning-fast semantic search.
+
+    With incremental=True only codes that are new, changed (by content hash) or deleted
+    since the last published version are embedded or removed; everything else is reused.
     """
     db = SessionLocal()
-    try: 
-        icd10_records = db.query(ICD10Code).all()
-        cpt_records = db.query(CPTCode).all()
+    try:
+        records = {code_type: db.query(model).all() for code_type, model in CODE_TYPES.items()}
 
-        if not icd10_records or not cpt_records:
-            print("database is empty! Run seed.py first.")
+        if not records["icd10"] or not records["cpt"]:
+            logger.error("database is empty! Run seed.py first.")
             return
-        
-        print("Generating embeddings for ICD-10...")
-        icd10_texts = [f"{r.code}: {r.description}" for r in icd10_records]
-        # Generate vectors
-        icd10_embeddings = embedder.encode(icd10_texts, normalize_embeddings=True)
-
-        print("Generating embeddings for CPT...")
-        cpt_texts = [f"{r.code}: {r.description}" for r in cpt_records]
-        # Generate vectors
-        cpt_embeddings = embedder.encode(cpt_texts, normalize_embeddings=True)
 
         # Create FAISS indexes using Inner Product (Cosine Similarity because we normalized)
-        d = icd10_embeddings.shape[1] # Dimension size (384)
+        # The layout (flat, IVF, HNSW, IVF-PQ) comes from VECTOR_INDEX_TYPE in the settings
+        config = index_config_from_settings()
 
-        index_icd10 = faiss.IndexFlatIP(d)
-        index_icd10.add(np.array(icd10_embeddings))
-        faiss.write_index(index_icd10, ICD10_INDEX_PATH)
+        published = read_manifest()
+        manifest = published if incremental else None
+        if incremental and manifest is None:
+            logger.info("No versioned vector DB found, doing a full build.")
+        old_meta = {}
+        if manifest is not None:
+            old_meta = {
+                code_type: items.to_dict() if hasattr(items, "to_dict") else items
+                for code_type, items in read_code_metadata(manifest).items()
+            }
 
-        index_cpt = faiss.IndexFlatIP(d)
-        index_cpt.add(np.array(cpt_embeddings))
-        faiss.write_index(index_cpt, CPT_INDEX_PATH)
+        indexes, configs, metadata = {}, {}, {}
+        for code_type, code_records in records.items():
+            result = None
+            if manifest is not None:
+                result = _incremental_update(code_type, code_records, config, manifest, old_meta.get(code_type, {}))
+            if result is None:
+                result = _full_build(code_type, code_records, config)
+            indexes[code_type], configs[code_type], metadata[code_type] = result
 
-        # Save metadata mapping so we know which vector belongs to which code
-        metadata = {
-            "icd10": [{"code": r.code, "desc": r.description} for r in icd10_records],
-            "cpt": [{"code": r.code, "desc": r.description} for r in cpt_records]
-        }
-        with open(META_PATH, "w") as f:
-            json.dump(metadata, f)
+        version = _publish(indexes, configs, metadata, config, previous=published)
 
-        print("FAISS Vector DB successfully built and saved locally!")
+        # Searches in this process pick up the new files on their next call
+        reset_vector_indexes()
+
+        logger.info("FAISS Vector DB successfully built and saved locally! (version %s)", version)
 
     finally:
         db.close()
 
 if __name__ == "__main__":
-    build_vector_db()
-
-
+    parser = argparse.ArgumentParser(description="Build the FAISS vector DB from the code tables.")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Only embed new or changed codes and remove deleted ones.")
+    args = parser.parse_args()
+    configure_logging()
+    build_vector_db(incremental=args.incremental)
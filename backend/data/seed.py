@@ -1,4 +1,8 @@
+import logging
 from backend.data.db import init_db, SessionLocal, ICD10Code, CPTCode
+from backend.core.telemetry import configure_logging
+
+logger = logging.getLogger(__name__)
 
 # A small, highly relevant sample of medical codes for our testing
 SAMPLE_ICD10 = [
@@ -19,33 +23,34 @@ SAMPLE_CPT = [
 
 def seed_database():
     """Populates the database with sample codes."""
-    print("Initializing database tables...")
+    logger.info("Initializing database tables...")
     init_db()
 
     db = SessionLocal()
     try: 
         # Check if we already have data to avoid duplicates
         if db.query(ICD10Code).first():
-            print("Database already seeded! Skipping.")
+            logger.info("Database already seeded! Skipping.")
             return
         
-        print("Inserting ICD-10 codes...")
+        logger.info("Inserting ICD-10 codes...")
         for item in SAMPLE_ICD10:
             db.add(ICD10Code(code=item["code"], description=item["description"]))
             
-        print("Inserting CPT codes...")
+        logger.info("Inserting CPT codes...")
         for item in SAMPLE_CPT:
             db.add(CPTCode(code=item["code"], description=item["description"]))
             
         # Commit the transaction to save the data
         db.commit()
-        print("Successfully seeded the database!")
+        logger.info("Successfully seeded the database!")
 
     except Exception as e:
         db.rollback()
-        print(f"An error occured: {e}")
+        logger.exception("An error occured while seeding: %s", e)
     finally:
         db.close()
 
 if __name__ == "__main__":
+    configure_logging()
     seed_database()
\ No newline at end of file
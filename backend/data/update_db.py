@@ -2,4 +2,4 @@ from backend.data.db import init_db
 
 print("Updating database schema...")
 init_db()
-print("Database schema updated! 'claims' table created.")
\ No newline at end of file
+print("Database schema updated! 'claims' and 'claim_lines' tables, new columns and indexes created.")
\ No newline at end of file
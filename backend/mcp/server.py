@@ -1,61 +1,159 @@
-import os
-import json
-import faiss
+import logging
 import numpy as np
-import torch
+from typing import List, Tuple
 from fastmcp import FastMCP
-from sentence_transformers import SentenceTransformer
 from backend.data.db import SessionLocal, ICD10Code, CPTCode
+from backend.core.config import get_settings
+from backend.core.state import CodeCandidate
+from backend.core.resources import get_embedder, get_vector_indexes, warm_up
+from backend.core.search_cache import embedding_cache, result_cache, normalize_query
+from backend.core.telemetry import configure_logging, external_call
+
+logger = logging.getLogger(__name__)
 
 # 1. Initialize the FastMCP server
 # This acts just like the FastAPI 'app', but specifically for AI tools
 mcp = FastMCP("MediCodeMCP")
 
-# 2. Setup Paths
-DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "data")
-ICD10_INDEX_PATH = os.path.join(DATA_DIR, "icd10.index")
-CPT_INDEX_PATH = os.path.join(DATA_DIR, "cpt.index")
-META_PATH = os.path.join(DATA_DIR, "vector_meta.json")
+# 2. The embedding model and FAISS indexes come from the shared resource registry.
+# They are loaded on the first search (or by warm_up() at server start), so importing
+# this module is cheap and works before the vector DB has been built.
+
+# ------- BATCHED SEARCH ------- 
+
+# Number of matches returned per query
+TOP_K = 3
+
+# Upper bound on how many queries go through the model in one padded forward pass
+ENCODE_BATCH_SIZE = 256
+
+def encode_queries(queries: List[str]) -> np.ndarray:
+    """
+    Converts N clinical phrases into an (N, 384) matrix of normalized vectors.
+    Phrases already in the embedding cache are reused, all the others go through
+    the model together in one batch instead of one forward pass each.
+    """
+    embedder = get_embedder()
+    model_name = get_settings().embedding_model
+    dim = embedder.get_sentence_embedding_dimension()
+    vectors = np.zeros((len(queries), dim), dtype=np.float32)
 
-# 3. Load Model and FAISS Indexes Globally (so they stay in memory)
-device = "cuda" if torch.cuda.is_available() else "cpu"
-print(f"Starting MCP Server as Librarian. Loading embedding model on: {device.upper()}")
-embedder = SentenceTransformer('all-MiniLM-L6-v2', device=device)
+    missing = {} # normalized phrase -> rows that need it
+    for row, query in enumerate(queries):
+        text = normalize_query(query)
+        cached = embedding_cache.get((model_name, text))
+        if cached is not None:
+            vectors[row] = cached
+        else:
+            missing.setdefault(text, []).append(row)
 
-# Load FAISS indexes into memory
-index_icd10 = faiss.read_index(ICD10_INDEX_PATH)
-index_cpt = faiss.read_index(CPT_INDEX_PATH)
+    if missing:
+        texts = list(missing)
+        with external_call("embedding", "encode"):
+            encoded = embedder.encode(
+                texts,
+                batch_size = min(len(texts), ENCODE_BATCH_SIZE),
+                normalize_embeddings = True
+            )
+        for text, vector in zip(texts, np.asarray(encoded, dtype=np.float32)):
+            embedding_cache.put((model_name, text), vector)
+            vectors[missing[text]] = vector
+    return vectors
 
-# Load Metadata to map math back to readable text
-with open(META_PATH, "r") as f:
-    metadata = json.load(f)
+def _candidates(metadata: dict, code_type: str, query: str, scores: np.ndarray, indices: np.ndarray) -> List[CodeCandidate]:
+    candidates = []
+    for i in range(len(indices)):
+        idx = indices[i]
+        # Only keep valid indices (in case db has fewer than 3 items)
+        if idx != -1:
+            item = metadata[code_type][int(idx)]
+            candidates.append(CodeCandidate(
+                code=item["code"], description=item["desc"], score=float(scores[i]), rank=i + 1, query=query
+            ))
+    return candidates
+
+def format_matches(code_type: str, candidates: List[CodeCandidate]) -> str:
+    """
+    Renders search results as the text block the LLM and MCP clients read.
+    """
+    # Format the output with the mathematical confidence scores
+    results = "Top ICD-10 Semantic Matches: \n" if code_type == "icd10" else "Top CPT Semantic Matches:\n"
+    for c in candidates:
+        # Convert math score (e.g., 0.9234) to a percentage format
+        results += f"{c['rank']}) {c['code']} {c['description']} (Score: {c['score']:.2f})\n"
+    return results
+
+def _search_many(indexes, requests: List[Tuple[str, str]], k: int = TOP_K) -> List[Tuple[np.ndarray, np.ndarray]]:
+    """
+    Resolves (code_type, query) pairs to their top-k (scores, row ids).
+    Cached results are served directly. All remaining phrases are embedded in one
+    batch, and each index is searched once with all of its query vectors.
+    """
+    results = [None] * len(requests)
+
+    missing = {} # (code_type, normalized phrase) -> positions in `requests`
+    for pos, (code_type, query) in enumerate(requests):
+        text = normalize_query(query)
+        cached = result_cache.get((indexes.versions[code_type], code_type, k, text))
+        if cached is not None:
+            results[pos] = cached
+        else:
+            missing.setdefault((code_type, text), []).append(pos)
+
+    if missing:
+        keys = list(missing)
+        vectors = encode_queries([text for _, text in keys])
+        for code_type in ("icd10", "cpt"):
+            rows = [row for row, (key_type, _) in enumerate(keys) if key_type == code_type]
+            if not rows:
+                continue
+            with external_call("faiss", code_type):
+                scores, indices = indexes.index(code_type).search(vectors[rows], k)
+            for i, row in enumerate(rows):
+                hit = (scores[i].copy(), indices[i].copy())
+                result_cache.put((indexes.versions[code_type], code_type, k, keys[row][1]), hit)
+                for pos in missing[keys[row]]:
+                    results[pos] = hit
+    return results
+
+def search_codes_batch(icd10_queries: List[str], cpt_queries: List[str]) -> Tuple[List[List[CodeCandidate]], List[List[CodeCandidate]]]:
+    """
+    Searches many diagnosis and procedure phrases at once, for in-process callers.
+    Both lists are embedded in a single batch, then each index is searched once
+    with all of its query vectors. Returns the ranked candidates of every query.
+    """
+    requests = [("icd10", q) for q in icd10_queries] + [("cpt", q) for q in cpt_queries]
+    # One snapshot of the indexes for the whole batch, so rows and metadata always match
+    indexes = get_vector_indexes()
+    hits = _search_many(indexes, requests)
+    found = [_candidates(indexes.metadata, code_type, query, *hit) for (code_type, query), hit in zip(requests, hits)]
+    return found[:len(icd10_queries)], found[len(icd10_queries):]
 
 # ------- MCP TOOLS ------- 
 
+@mcp.tool()
+def search_icd10_batch(queries: List[str]) -> List[str]:
+    """
+    Search ICD-10 diagnosis codes for many clinical text queries in one call.
+    Returns one result block (top 3 matches with confidence scores) per query, in order.
+    """
+    return [format_matches("icd10", c) for c in search_codes_batch(queries, [])[0]]
+
+@mcp.tool()
+def search_cpt_batch(queries: List[str]) -> List[str]:
+    """
+    Search CPT procedure codes for many clinical phrases in one call.
+    Returns one result block (top 3 matches with confidence scores) per query, in order.
+    """
+    return [format_matches("cpt", c) for c in search_codes_batch([], queries)[1]]
+
 @mcp.tool()
 def search_icd10(query: str) -> str:
     """
     Search for an ICD-10 diagnosis code based on a clinical text query.
     Uses semantic similarity. Returns the top 3 matches with confidence score.
     """
-
-    # 4. Convert the user's query into a math vector
-    query_vector = embedder.encode([query], normalize_embeddings= True)
-
-    # 5. Search the FAISS index (k=3 means top 3 results)
-    scores, indices = index_icd10.search(np.array(query_vector), k=3)
-
-    # 6. Format the output with the mathematical confidence scores
-    results = "Top ICD-10 Semantic Matches: \n"
-    for i in range(len(indices[0])):
-        idx = indices[0][i]
-        score = scores[0][i]
-        # Only show valid indices (in case db has fewer than 3 items)
-        if idx != -1:
-            item = metadata["icd10"][idx]
-            # Convert math score (e.g., 0.9234) to a percentage format
-            results += f"{i+1}) {item['code']} {item['desc']} (Score: {score:.2f})\n"
-    return results 
+    return search_icd10_batch([query])[0]
 
     # db = SessionLocal()
     # try: 
@@ -80,18 +178,7 @@ def search_cpt(query: str) -> str:
     Search for a CPT procedure code based on a clinical phrase.
     Uses semantic similarity. Returns the top 3 matches with confidence scores.
     """
-    query_vector = embedder.encode([query], normalize_embeddings=True)
-    scores, indices = index_cpt.search(np.array(query_vector), k=3)
-    
-    results = "Top CPT Semantic Matches:\n"
-    for i in range(len(indices[0])):
-        idx = indices[0][i]
-        score = scores[0][i]
-        if idx != -1:
-            item = metadata["cpt"][idx]
-            results += f"{i+1}) {item['code']} {item['desc']} (Score: {score:.2f})\n"
-            
-    return results
+    return search_cpt_batch([query])[0]
 
     # db = SessionLocal()
     # try:
@@ -129,5 +216,9 @@ def validate_code(code: str, code_type: str) -> str:
         db.close()
 
 if __name__ == "__main__":
-    # This allows us to run the server locally to test it
+    # This allows us to run the server locally to test it.
+    # Logs go to stderr, stdout is the MCP transport
+    configure_logging()
+    logger.info("Starting MCP Server as Librarian...")
+    warm_up(require_indexes=True)
     mcp.run()
\ No newline at end of file
@@ -0,0 +1,101 @@
+"""
+Recall vs latency of the approximate FAISS index types against the exact flat index.
+
+Builds every index type over a synthetic, clustered set of normalized 384-d "code
+description" vectors (100k by default, roughly the size of ICD-10-CM plus CPT), then
+queries each one with perturbed copies of real codes and compares the top-k to the
+exact IndexFlatIP answer.
+
+    python -m benchmarks.ann_index --codes 100000 --queries 1000
+"""
+import time
+import argparse
+import numpy as np
+from dataclasses import replace
+from backend.core.faiss_index import IndexConfig, build_index, apply_search_params
+
+DIM = 384
+
+def synthetic_code_vectors(n: int, clusters: int, rng: np.random.Generator) -> np.ndarray:
+    """
+    Code descriptions are not uniformly spread, they form families (J02.x, J03.x, ...),
+    so the vectors are drawn around cluster centers and normalized like real embeddings.
+    """
+    centers = rng.standard_normal((clusters, DIM)).astype(np.float32)
+    labels = rng.integers(0, clusters, size=n)
+    vectors = centers[labels] + 0.6 * rng.standard_normal((n, DIM)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors
+
+def synthetic_queries(codes: np.ndarray, n: int, rng: np.random.Generator) -> np.ndarray:
+    # A clinical phrase lands near, but not exactly on, the description of its code
+    picks = codes[rng.integers(0, len(codes), size=n)]
+    queries = picks + 0.05 * rng.standard_normal(picks.shape).astype(np.float32)
+    queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+    return np.ascontiguousarray(queries, dtype=np.float32)
+
+def recall_at_k(truth: np.ndarray, found: np.ndarray) -> float:
+    k = truth.shape[1]
+    hits = sum(len(set(t) & set(f)) for t, f in zip(truth, found))
+    return hits / (len(truth) * k)
+
+def time_queries(index, queries: np.ndarray, k: int):
+    """Returns results plus per-query latency, both one-at-a-time (like a single claim) and batched."""
+    start = time.perf_counter()
+    for q in queries:
+        index.search(q.reshape(1, -1), k)
+    single_ms = (time.perf_counter() - start) / len(queries) * 1000
+
+    start = time.perf_counter()
+    _, found = index.search(queries, k)
+    batch_ms = (time.perf_counter() - start) / len(queries) * 1000
+    return found, single_ms, batch_ms
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--codes", type=int, default=100_000)
+    parser.add_argument("--queries", type=int, default=1000)
+    parser.add_argument("--k", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    codes = synthetic_code_vectors(args.codes, clusters=max(1, args.codes // 50), rng=rng)
+    queries = synthetic_queries(codes, args.queries, rng)
+
+    base = IndexConfig(nlist=int(4 * np.sqrt(args.codes)))
+    runs = [
+        ("flat", replace(base, index_type="flat"), {}),
+        ("ivf_flat", replace(base, index_type="ivf_flat"), {"nprobe": [1, 4, 16, 64]}),
+        ("hnsw", replace(base, index_type="hnsw"), {"ef_search": [16, 32, 64, 128]}),
+        ("ivf_pq", replace(base, index_type="ivf_pq"), {"nprobe": [4, 16, 64]}),
+    ]
+
+    print(f"\n{args.codes} codes, {args.queries} queries, recall@{args.k} vs exact flat search\n")
+    print(f"{'index':<10}{'knob':<16}{'build s':>9}{'MB':>8}{'recall':>9}{'ms/query':>11}{'ms/q batch':>12}")
+
+    truth = None
+    for name, config, sweeps in runs:
+        start = time.perf_counter()
+        index, config = build_index(codes, config)
+        build_s = time.perf_counter() - start
+        size_mb = _index_size_mb(index)
+
+        knob, values = next(iter(sweeps.items())) if sweeps else ("-", [None])
+        for value in values:
+            if value is not None:
+                config = replace(config, **{knob: value})
+                apply_search_params(index, config)
+            found, single_ms, batch_ms = time_queries(index, queries, args.k)
+            if truth is None:
+                truth = found
+            label = f"{knob}={value}" if value is not None else "exact"
+            print(f"{name:<10}{label:<16}{build_s:>9.2f}{size_mb:>8.1f}"
+                  f"{recall_at_k(truth, found):>9.3f}{single_ms:>11.3f}{batch_ms:>12.4f}")
+
+def _index_size_mb(index) -> float:
+    import faiss
+    return len(faiss.serialize_index(index)) / 1e6
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""
+Review-queue queries against a large claims table, before and after the claim indexes.
+
+Fills a scratch SQLite database with synthetic claims spread over a year, then times
+the queries a work queue makes (see backend/core/claims_query.py), first on the table
+with only its primary key and then with the (status, timestamp) and (rule_id, timestamp)
+indexes. Deep pages are fetched with the keyset cursor and, for comparison, with OFFSET.
+
+    python -m benchmarks.claims_queries --rows 10000000
+"""
+import os
+import time
+import random
+import argparse
+import datetime
+import tempfile
+from sqlalchemy import text
+from backend.data.db import Claim, make_engine
+from backend.core.claims_query import claims_page_query, claims_page
+
+STATUSES = (("approved", 0.80), ("rejected", 0.15), ("suspicious", 0.05))
+RULE_IDS = ("R0_MISSING_DATA", "R2_MEDICAL_NECESSITY")
+
+def _fill(engine, rows: int, seed: int, start: datetime.datetime, chunk: int = 200_000):
+    rng = random.Random(seed)
+    statuses, weights = zip(*STATUSES)
+    step = datetime.timedelta(days=365) / rows
+    raw = engine.raw_connection()
+    try:
+        cursor = raw.cursor()
+        for first in range(0, rows, chunk):
+            batch = []
+            for i in range(first, min(first + chunk, rows)):
+                status = rng.choices(statuses, weights)[0]
+                rule_id = "PASS" if status == "approved" else (
+                    "R1_LOW_CONFIDENCE" if status == "suspicious" else rng.choice(RULE_IDS))
+                batch.append((
+                    "synthetic note", (start + step * i).strftime("%Y-%m-%d %H:%M:%S.%f"), status, rule_id,
+                    "J02.9", "87880", rng.random(), 0.0
+                ))
+            cursor.executemany(
+                "INSERT INTO claims (clinical_note, timestamp, status, rule_id, icd10_code, cpt_code, "
+                "confidence_score, payment_amount) VALUES (?, ?, ?, ?, ?, ?, ?, ?)", batch
+            )
+            raw.commit()
+            print(f"  {min(first + chunk, rows):,} rows", end="\r")
+        print()
+    finally:
+        raw.close()
+
+def _timed(conn, query, repeat: int):
+    conn.execute(query).all() # Warm the page cache
+    start = time.perf_counter()
+    for _ in range(repeat):
+        rows = conn.execute(query).all()
+    return (time.perf_counter() - start) / repeat * 1000, rows
+
+def _scenarios(conn, end: datetime.datetime, depth: int, repeat: int) -> dict:
+    results = {}
+    week_ago = end - datetime.timedelta(days=7)
+    queue = dict(status="suspicious", limit=50)
+    results["suspicious, oldest first, page 1"] = _timed(conn, claims_page_query(**queue), repeat)[0]
+
+    # Walk the queue with the cursor to reach a deep page, then time that page
+    cursor = None
+    for _ in range(depth - 1):
+        cursor = claims_page(conn.execute(claims_page_query(**queue, cursor=cursor)).all(), 50)["next_cursor"]
+    keyset_ms, keyset_rows = _timed(conn, claims_page_query(**queue, cursor=cursor), repeat)
+    offset_query = claims_page_query(**queue).offset((depth - 1) * 50)
+    offset_ms, offset_rows = _timed(conn, offset_query, repeat)
+    assert [r.id for r in keyset_rows[:50]] == [r.id for r in offset_rows[:50]]
+    results[f"suspicious, page {depth} (keyset)"] = keyset_ms
+    results[f"suspicious, page {depth} (OFFSET)"] = offset_ms
+
+    results["R2 rejections this week, newest first"] = _timed(
+        conn, claims_page_query(rule_id="R2_MEDICAL_NECESSITY", since=week_ago, limit=50, newest_first=True), repeat
+    )[0]
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=10_000_000)
+    parser.add_argument("--depth", type=int, default=200, help="Queue page timed for deep pagination.")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    start = datetime.datetime(2025, 1, 1)
+    end = start + datetime.timedelta(days=365)
+    with tempfile.TemporaryDirectory() as scratch:
+        engine = make_engine(f"sqlite:///{os.path.join(scratch, 'claims.db')}")
+        Claim.__table__.create(bind=engine)
+        indexes = [index for index in Claim.__table__.indexes if index.name != "ix_claims_id"]
+        for index in indexes:
+            index.drop(bind=engine)
+
+        print(f"\nFilling {args.rows:,} claims...")
+        fill_start = time.perf_counter()
+        _fill(engine, args.rows, args.seed, start)
+        print(f"filled in {time.perf_counter() - fill_start:.1f} s")
+
+        with engine.connect() as conn:
+            before = _scenarios(conn, end, args.depth, args.repeat)
+
+        index_start = time.perf_counter()
+        for index in indexes:
+            index.create(bind=engine)
+        with engine.begin() as conn:
+            conn.execute(text("ANALYZE claims"))
+        print(f"indexes built in {time.perf_counter() - index_start:.1f} s\n")
+
+        with engine.connect() as conn:
+            after = _scenarios(conn, end, args.depth, args.repeat)
+        engine.dispose()
+
+    print(f"{'query':<42}{'no index ms':>13}{'indexed ms':>12}{'speedup':>9}")
+    for name in before:
+        print(f"{name:<42}{before[name]:>13.2f}{after[name]:>12.2f}{before[name] / after[name]:>8.0f}x")
+
+if __name__ == "__main__":
+    main()
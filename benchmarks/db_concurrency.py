@@ -0,0 +1,127 @@
+"""
+Concurrency stress test of the database layer: mixed reads and writes from many threads.
+
+Mirrors what a busy server does to the claims database at the same time: agent runs
+inserting claims with their lines (save_claim), reviewers overriding suspicious claims
+(submit_human_review) and MCP validate_code / dashboard reads. Runs against a scratch
+SQLite file, once with the tuned engine from backend/data/db.py (WAL, busy_timeout, ...)
+and once with the old default engine, and reports the sustained throughput and how many
+operations failed with "database is locked".
+
+    python -m benchmarks.db_concurrency --threads 32 --seconds 10
+"""
+import os
+import time
+import random
+import argparse
+import tempfile
+import threading
+from sqlalchemy import create_engine, select, func
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import sessionmaker
+from backend.data.db import Base, Claim, ClaimLine, ICD10Code, make_engine
+
+OPERATIONS = ("insert_claim", "review_claim", "validate_code", "read_claim")
+
+def _insert_claim(db, rng):
+    claim = Claim(
+        clinical_note="Acute pharyngitis, rapid strep test.", icd10_code="J02.9", cpt_code="87880",
+        confidence_score=rng.random(), status=rng.choice(("approved", "suspicious", "rejected")),
+        lines=[ClaimLine(line_number=1, cpt_code="87880", icd10_codes="J02.9", status="approved")]
+    )
+    db.add(claim)
+    db.commit()
+
+def _review_claim(db, rng, max_id):
+    claim = db.get(Claim, rng.randint(1, max_id))
+    if claim is not None:
+        claim.status = rng.choice(("approved", "rejected"))
+        claim.rejection_reason = "Human Override by stress test"
+        db.commit()
+
+def _validate_code(db, rng):
+    db.execute(select(ICD10Code).where(ICD10Code.code == rng.choice(("J02.9", "I10", "X99.9")))).first()
+
+def _read_claim(db, rng, max_id):
+    db.get(Claim, rng.randint(1, max_id))
+    db.execute(select(func.count()).select_from(Claim).where(Claim.status == "suspicious")).scalar()
+
+def run(engine, threads: int, seconds: float, write_share: float, seed: int) -> dict:
+    Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(bind=engine, autoflush=False)
+    with Session() as db:
+        db.add_all([ICD10Code(code="J02.9", description="Acute pharyngitis"), ICD10Code(code="I10", description="Hypertension")])
+        db.add_all([Claim(clinical_note="seed", status="suspicious") for _ in range(1000)])
+        db.commit()
+
+    counts = {op: 0 for op in OPERATIONS}
+    errors = {"locked": 0, "other": 0}
+    lock = threading.Lock()
+    stop_at = time.perf_counter() + seconds
+
+    def worker(index: int):
+        rng = random.Random(seed + index)
+        done = {op: 0 for op in OPERATIONS}
+        failed = {"locked": 0, "other": 0}
+        while time.perf_counter() < stop_at:
+            writing = rng.random() < write_share
+            op = rng.choice(OPERATIONS[:2] if writing else OPERATIONS[2:])
+            db = Session()
+            try:
+                if op == "insert_claim":
+                    _insert_claim(db, rng)
+                elif op == "review_claim":
+                    _review_claim(db, rng, 1000)
+                elif op == "validate_code":
+                    _validate_code(db, rng)
+                else:
+                    _read_claim(db, rng, 1000)
+                done[op] += 1
+            except OperationalError as e:
+                db.rollback()
+                failed["locked" if "locked" in str(e) else "other"] += 1
+            finally:
+                db.close()
+        with lock:
+            for op in OPERATIONS:
+                counts[op] += done[op]
+            for kind in errors:
+                errors[kind] += failed[kind]
+
+    workers = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    start = time.perf_counter()
+    for t in workers:
+        t.start()
+    for t in workers:
+        t.join()
+    elapsed = time.perf_counter() - start
+    engine.dispose()
+    return {"elapsed": elapsed, "counts": counts, "errors": errors}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--threads", type=int, default=32)
+    parser.add_argument("--seconds", type=float, default=10.0, help="Duration of each run.")
+    parser.add_argument("--write-share", type=float, default=0.3, help="Fraction of operations that write.")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    setups = {
+        # What backend/data/db.py used to create: rollback journal, driver defaults
+        "default": lambda url: create_engine(url, connect_args={"check_same_thread": False}),
+        "tuned": make_engine,
+    }
+    print(f"\n{args.threads} threads, {args.seconds:.0f} s per run, {args.write_share:.0%} writes\n")
+    print(f"{'engine':<10}{'ops/s':>10}{'writes/s':>10}{'reads/s':>10}{'locked':>9}{'other err':>11}")
+    with tempfile.TemporaryDirectory() as scratch:
+        for name, factory in setups.items():
+            url = f"sqlite:///{os.path.join(scratch, name + '.db')}"
+            result = run(factory(url), args.threads, args.seconds, args.write_share, args.seed)
+            counts, elapsed = result["counts"], result["elapsed"]
+            writes = counts["insert_claim"] + counts["review_claim"]
+            reads = counts["validate_code"] + counts["read_claim"]
+            print(f"{name:<10}{(writes + reads) / elapsed:>10,.0f}{writes / elapsed:>10,.0f}{reads / elapsed:>10,.0f}"
+                  f"{result['errors']['locked']:>9}{result['errors']['other']:>11}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+"""
+Query embedding latency and search recall of the embedding backends, against the
+published FAISS indexes (the fp32 vectors build_vector_db wrote).
+
+Queries are the code descriptions of the database with a word dropped now and then, like
+the phrases extracted from notes. Every backend embeds the same queries and searches them
+in the same indexes. recall is the overlap of its top-k with the fp32 SentenceTransformer's
+top-k, top1 the share of queries whose own code ranks first. The cold start is a fresh
+process from its first import to its first vector, which also shows whether it pulled in torch.
+
+    python -m benchmarks.embedding_backends --queries 1000
+    python -m benchmarks.embedding_backends --backends local onnx:model.onnx onnx:model_int8.onnx
+
+Export the ONNX models first: python -m backend.core.onnx_embedder export
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import subprocess
+import numpy as np
+
+# Run in a fresh interpreter with the backend's environment; prints the cold start as JSON
+_COLD_START = """
+import sys, time, json
+start = time.perf_counter()
+from backend.core.resources import get_embedder
+get_embedder().encode(["acute pharyngitis"], normalize_embeddings=True)
+print(json.dumps({"seconds": time.perf_counter() - start, "torch": "torch" in sys.modules}))
+"""
+
+def _backend_env(spec: str) -> dict:
+    backend, _, file = spec.partition(":")
+    env = {"EMBEDDING_BACKEND": backend}
+    if file:
+        env["EMBEDDING_ONNX_FILE"] = file
+    return env
+
+def load_backend(spec: str):
+    """
+    "local" is the SentenceTransformer, "onnx:<file>" an export in EMBEDDING_ONNX_DIR.
+    """
+    backend, _, file = spec.partition(":")
+    if backend == "local":
+        from backend.core.resources import load_embedding_model
+        return load_embedding_model()
+    if backend == "onnx":
+        from backend.core.onnx_embedder import OnnxEmbedder
+        return OnnxEmbedder(file=file or None)
+    raise ValueError(f"Unknown backend {spec}. Use local or onnx:<file>")
+
+def cold_start(spec: str) -> dict:
+    env = {**os.environ, **_backend_env(spec)}
+    output = subprocess.run([sys.executable, "-c", _COLD_START], env=env, capture_output=True, text=True, check=True)
+    return json.loads(output.stdout.strip().splitlines()[-1])
+
+def benchmark_queries(count: int, seed: int):
+    """
+    [(code type, row id, query text)] drawn from the code tables, which hold the FAISS ids.
+    """
+    from backend.data.db import SessionLocal, ICD10Code, CPTCode
+    rng = random.Random(seed)
+    with SessionLocal() as db:
+        rows = [("icd10", r.id, r.description) for r in db.query(ICD10Code).all()]
+        rows += [("cpt", r.id, r.description) for r in db.query(CPTCode).all()]
+    picks = rng.sample(rows, min(count, len(rows))) if rows else []
+    queries = []
+    for code_type, row_id, description in picks:
+        words = description.split()
+        if len(words) > 3 and rng.random() < 0.3:
+            del words[rng.randrange(len(words))]
+        queries.append((code_type, row_id, " ".join(words)))
+    return queries
+
+def search(indexes, queries, vectors: np.ndarray, k: int) -> np.ndarray:
+    found = np.full((len(queries), k), -1, dtype=np.int64)
+    for code_type in ("icd10", "cpt"):
+        rows = [i for i, (query_type, _, _) in enumerate(queries) if query_type == code_type]
+        if rows:
+            _, ids = indexes.index(code_type).search(np.ascontiguousarray(vectors[rows]), k)
+            found[rows] = ids
+    return found
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backends", nargs="+", default=["local", "onnx:model.onnx", "onnx:model_int8.onnx"])
+    parser.add_argument("--queries", type=int, default=1000)
+    parser.add_argument("--single", type=int, default=200, help="Queries embedded one at a time, like one claim.")
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--k", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--no-cold-start", action="store_true", help="Skip the fresh-process timing.")
+    args = parser.parse_args()
+
+    from backend.core.resources import get_vector_indexes
+    indexes = get_vector_indexes()
+    queries = benchmark_queries(args.queries, args.seed)
+    if not queries:
+        sys.exit("No codes in the database, run `python -m backend.data.seed` first.")
+    texts = [text for _, _, text in queries]
+    truth_ids = np.array([row_id for _, row_id, _ in queries])
+
+    # The fp32 model is the reference every backend is compared with
+    reference = load_backend("local")
+    reference_vectors = np.asarray(reference.encode(texts, normalize_embeddings=True), dtype=np.float32)
+    reference_found = search(indexes, queries, reference_vectors, args.k)
+
+    print(f"\n{len(queries)} queries against vector DB {indexes.version}, recall@{args.k} vs fp32\n")
+    print(f"{'backend':<24}{'cold s':>8}{'torch':>7}{'p50 ms':>9}{'p95 ms':>9}{'batch q/s':>11}"
+          f"{'min cos':>9}{'recall':>8}{'top1':>7}")
+    for spec in args.backends:
+        embedder = reference if spec == "local" else load_backend(spec)
+        embedder.encode(texts[:8], normalize_embeddings=True) # Warm up
+
+        latencies = []
+        for text in texts[:args.single]:
+            start = time.perf_counter()
+            embedder.encode([text], normalize_embeddings=True)
+            latencies.append((time.perf_counter() - start) * 1000)
+        start = time.perf_counter()
+        vectors = np.asarray(embedder.encode(texts, batch_size=args.batch_size, normalize_embeddings=True), dtype=np.float32)
+        throughput = len(texts) / (time.perf_counter() - start)
+
+        found = search(indexes, queries, vectors, args.k)
+        recall = np.mean([len(set(a) & set(b)) / args.k for a, b in zip(found, reference_found)])
+        top1 = np.mean(found[:, 0] == truth_ids)
+        min_cosine = float((vectors * reference_vectors).sum(axis=1).min())
+        cold = {"seconds": float("nan"), "torch": None} if args.no_cold_start else cold_start(spec)
+
+        print(f"{spec:<24}{cold['seconds']:>8.2f}{str(cold['torch']):>7}{np.percentile(latencies, 50):>9.2f}"
+              f"{np.percentile(latencies, 95):>9.2f}{throughput:>11.0f}{min_cosine:>9.4f}{recall:>8.3f}{top1:>7.3f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+import json
+import time
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+class _FakeOllamaHandler(BaseHTTPRequestHandler):
+    # Keep-alive needs HTTP/1.1 and a Content-Length on every response
+    protocol_version = "HTTP/1.1"
+    # Send headers and body in one packet, otherwise Nagle + delayed ACK add ~40 ms per call
+    wbufsize = -1
+    disable_nagle_algorithm = True
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        request = json.loads(self.rfile.read(length) or b"{}")
+        self.server.record_connection(self.client_address)
+
+        if self.server.latency:
+            time.sleep(self.server.latency)
+
+        # One final chat chunk: valid for both streamed (NDJSON) and non-streamed calls
+        body = json.dumps({
+            "model": request.get("model", "llama3.2"),
+            "created_at": "2024-01-01T00:00:00Z",
+            "message": {"role": "assistant", "content": self.server.reply},
+            "done": True,
+            "done_reason": "stop",
+            "prompt_eval_count": 10,
+            "eval_count": 5,
+        }).encode() + b"\n"
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+class FakeOllamaServer(ThreadingHTTPServer):
+    """
+    A tiny local stand-in for the Ollama /api/chat endpoint.
+    It answers every request with the same canned reply after `latency` seconds and
+    counts how many distinct TCP connections the clients opened.
+    """
+    daemon_threads = True
+
+    def __init__(self, reply: str = '{"diagnosis": "acute pharyngitis", "procedure": "rapid strep test"}',
+                 latency: float = 0.0, port: int = 0):
+        super().__init__(("127.0.0.1", port), _FakeOllamaHandler)
+        self.reply = reply
+        self.latency = latency
+        self._connections = set()
+        self._lock = threading.Lock()
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def record_connection(self, client_address):
+        with self._lock:
+            self._connections.add(client_address)
+
+    @property
+    def connection_count(self) -> int:
+        return len(self._connections)
+
+    def reset_connections(self):
+        with self._lock:
+            self._connections.clear()
+
+    def __enter__(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self.shutdown()
+        self.server_close()
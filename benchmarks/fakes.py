@@ -0,0 +1,198 @@
+"""
+Deterministic stand-ins for Ollama and the embedding model, so the whole claim pipeline
+runs offline with a known cost per call.
+
+    from backend.core.llm import set_llm_factory
+    from backend.core.resources import set_embedder
+    set_llm_factory(lambda **overrides: FakeChatModel(latency=0.2))
+    set_embedder(HashingEmbedder())
+
+The same prompt always gets the same answer after the same (simulated) generation time.
+"""
+import re
+import json
+import time
+import zlib
+import asyncio
+import hashlib
+import numpy as np
+from typing import Any, AsyncIterator, Iterator, List, Optional
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+_NOTE = re.compile(r'TEXT: "(.*)"', re.DOTALL)
+_ASSESSMENT = re.compile(r"Assessment: ([^.]*)\.")
+_PROCEDURES = re.compile(r"Procedures: ([^.]*)\.")
+_TOP_MATCH = re.compile(r"^\s*1\) (\S+) .*\(Score: (-?[0-9.]+)\)\s*$", re.MULTILINE)
+
+# Llama tokenizers average about 4 characters per token on English text
+CHARS_PER_TOKEN = 4
+
+def _tokens(text: str) -> int:
+    return max(1, len(text) // CHARS_PER_TOKEN)
+
+def fake_extraction(prompt: str) -> dict:
+    """
+    The extraction answer for a note of benchmarks.synthetic ("Assessment: a; b. Procedures: c.").
+    Other notes are split into sentences: the last one is the procedure, the others diagnoses.
+    """
+    match = _NOTE.search(prompt)
+    note = match.group(1) if match else prompt
+    assessment, procedures = _ASSESSMENT.search(note), _PROCEDURES.search(note)
+    if assessment or procedures:
+        return {
+            "diagnoses": [p.strip() for p in assessment.group(1).split(";")] if assessment else [],
+            "procedures": [p.strip() for p in procedures.group(1).split(";")] if procedures else []
+        }
+    sentences = [s.strip() for s in note.split(".") if s.strip()]
+    return {"diagnoses": sentences[:-1] or sentences, "procedures": sentences[-1:]}
+
+def fake_decision(prompt: str) -> dict:
+    """
+    The decision answer: the top match of every search, one line per procedure linked to
+    every diagnosis, with the lowest score as confidence (what the prompt asks the LLM to do).
+    """
+    icd_part, _, cpt_part = prompt.partition("CPT SEARCH RESULTS")
+    cpt_part = cpt_part.split("Tasks and Rules")[0]
+    icds = _TOP_MATCH.findall(icd_part)
+    cpts = _TOP_MATCH.findall(cpt_part)
+    icd_codes = list(dict.fromkeys(code for code, _ in icds))
+    icd_floor = min((float(score) for _, score in icds), default=0.0)
+    return {
+        "code_lines": [
+            {"cpt": code, "icd10": icd_codes, "confidence": min(float(score), icd_floor) if icds else 0.0}
+            for code, score in cpts
+        ] or [{"cpt": "None", "icd10": [], "confidence": 0.0}],
+        "reasoning": "Top search match of every diagnosis and procedure."
+    }
+
+class FakeChatModel(BaseChatModel):
+    """
+    A chat model that answers the extraction and decision prompts of backend/core/agent.py
+    with valid JSON (see fake_extraction / fake_decision), or with the canned replies given.
+
+    Generation time is simulated as latency + per_token * completion tokens, plus up to
+    `jitter` of that, derived from the prompt hash so reruns are identical. Streamed answers
+    arrive one token (4 characters) at a time, so a caller that stops reading early saves the
+    time of the tokens it did not wait for. Token counts are reported like ChatOllama does
+    (usage_metadata and prompt_eval_count / eval_count).
+
+    `trailing_text` is generated after the JSON, like the whitespace and chatter a model in
+    JSON mode can keep producing; `num_predict` cuts the answer off like Ollama does.
+    `format` is accepted like ChatOllama's and ignored, the answers are JSON anyway.
+    """
+    latency: float = 0.0
+    per_token: float = 0.0
+    jitter: float = 0.0
+    extraction_reply: Optional[str] = None
+    decision_reply: Optional[str] = None
+    reply: str = "{}"
+    trailing_text: str = ""
+    num_predict: Optional[int] = None
+    format: Any = None
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-chat-model"
+
+    def _answer(self, messages: List[BaseMessage]):
+        """
+        Returns (answer, prompt tokens, factor the simulated times are multiplied by).
+        """
+        prompt = "\n".join(str(message.content) for message in messages)
+        if "Extract EVERY DIAGNOSIS" in prompt:
+            content = self.extraction_reply or json.dumps(fake_extraction(prompt))
+        elif "SEARCH RESULTS" in prompt:
+            content = self.decision_reply or json.dumps(fake_decision(prompt))
+        else:
+            content = self.reply
+        content += self.trailing_text
+        if self.num_predict:
+            content = content[:self.num_predict * CHARS_PER_TOKEN]
+        factor = 1.0
+        if self.jitter:
+            fraction = int.from_bytes(hashlib.blake2b(prompt.encode(), digest_size=4).digest(), "big") / 2**32
+            factor += self.jitter * fraction
+        return content, _tokens(prompt), factor
+
+    @staticmethod
+    def _usage(prompt_tokens: int, completion_tokens: int) -> dict:
+        return {
+            "usage_metadata": {"input_tokens": prompt_tokens, "output_tokens": completion_tokens,
+                               "total_tokens": prompt_tokens + completion_tokens},
+            "response_metadata": {"model": "fake-chat-model", "done": True, "done_reason": "stop",
+                                  "prompt_eval_count": prompt_tokens, "eval_count": completion_tokens}
+        }
+
+    def _result(self, messages: List[BaseMessage]):
+        content, prompt_tokens, factor = self._answer(messages)
+        completion_tokens = _tokens(content)
+        message = AIMessage(content=content, **self._usage(prompt_tokens, completion_tokens))
+        delay = (self.latency + self.per_token * completion_tokens) * factor
+        return ChatResult(generations=[ChatGeneration(message=message)]), delay
+
+    def _chunks(self, messages: List[BaseMessage]):
+        """
+        Yields (chunk, delay before it). The last chunk carries the token counts.
+        """
+        content, prompt_tokens, factor = self._answer(messages)
+        pieces = [content[i:i + CHARS_PER_TOKEN] for i in range(0, len(content), CHARS_PER_TOKEN)] or [""]
+        for i, piece in enumerate(pieces):
+            delay = (self.per_token + (self.latency if i == 0 else 0.0)) * factor
+            extra = self._usage(prompt_tokens, len(pieces)) if i == len(pieces) - 1 else {}
+            yield ChatGenerationChunk(message=AIMessageChunk(content=piece, **extra)), delay
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        result, delay = self._result(messages)
+        if delay:
+            time.sleep(delay)
+        return result
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                         run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        result, delay = self._result(messages)
+        if delay:
+            await asyncio.sleep(delay)
+        return result
+
+    def _stream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                run_manager: Any = None, **kwargs: Any) -> Iterator[ChatGenerationChunk]:
+        for chunk, delay in self._chunks(messages):
+            if delay:
+                time.sleep(delay)
+            yield chunk
+
+    async def _astream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                       run_manager: Any = None, **kwargs: Any) -> AsyncIterator[ChatGenerationChunk]:
+        for chunk, delay in self._chunks(messages):
+            if delay:
+                await asyncio.sleep(delay)
+            yield chunk
+
+class HashingEmbedder:
+    """
+    Stand-in for the SentenceTransformer: bag of hashed words and word bigrams, normalized.
+    No model download and ~µs per phrase, and phrases that share words still land close,
+    so the vector search behaves plausibly on synthetic code descriptions.
+    """
+    def __init__(self, dim: int = 384):
+        self.dim = dim
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self.dim
+
+    def encode(self, texts, batch_size: int = 32, normalize_embeddings: bool = False, **kwargs) -> np.ndarray:
+        single = isinstance(texts, str)
+        texts = [texts] if single else list(texts)
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            words = re.findall(r"[a-z0-9]+", text.lower())
+            for feature in words + [f"{a} {b}" for a, b in zip(words, words[1:])]:
+                h = zlib.crc32(feature.encode())
+                vectors[row, h % self.dim] += 1.0 if h & 0x80000000 else -1.0
+        if normalize_embeddings:
+            norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+            vectors /= np.where(norms == 0, 1.0, norms)
+        return vectors[0] if single else vectors
@@ -0,0 +1,62 @@
+"""
+Micro-benchmark: per-claim LLM client overhead, fresh ChatOllama per call vs the shared pool.
+
+Runs against a local fake Ollama server with zero generation time, so the numbers are pure
+client overhead (object construction, TCP connection setup, HTTP round-trip).
+
+    python -m benchmarks.llm_client --claims 200
+"""
+import os
+import time
+import argparse
+from langchain_ollama import ChatOllama
+from benchmarks.fake_ollama import FakeOllamaServer
+
+# Every claim makes two LLM calls (extraction + final decision)
+CALLS_PER_CLAIM = 2
+
+def _run(make_llm, claims: int) -> float:
+    start = time.perf_counter()
+    for _ in range(claims):
+        for _ in range(CALLS_PER_CLAIM):
+            make_llm().invoke("ping")
+    return time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--claims", type=int, default=200)
+    args = parser.parse_args()
+
+    with FakeOllamaServer() as server:
+        # Point the settings at the fake server before the pool builds its client
+        os.environ["OLLAMA_HOST"] = server.url
+        from backend.core.config import get_settings
+        from backend.core.llm import get_llm, reset_llm_pool
+        get_settings.cache_clear()
+        reset_llm_pool()
+
+        # Warm up imports and the first connection so neither side pays them in the timing
+        get_llm().invoke("warmup")
+        server.reset_connections()
+
+        def fresh_client():
+            # What every node did before: a new client (and HTTP connection pool) per call
+            return ChatOllama(model=get_settings().ollama_model, base_url=server.url, temperature=0.0)
+
+        results = {}
+        for name, factory in (("fresh client per call", fresh_client), ("shared pooled client", get_llm)):
+            server.reset_connections()
+            elapsed = _run(factory, args.claims)
+            results[name] = (elapsed, server.connection_count)
+
+    print(f"\n{args.claims} claims x {CALLS_PER_CLAIM} LLM calls against a zero-latency fake Ollama\n")
+    print(f"{'mode':<24}{'ms / claim':>12}{'connections':>14}")
+    for name, (elapsed, connections) in results.items():
+        print(f"{name:<24}{elapsed / args.claims * 1000:>12.3f}{connections:>14}")
+
+    before = results["fresh client per call"][0]
+    after = results["shared pooled client"][0]
+    print(f"\nOverhead saved per claim: {(before - after) / args.claims * 1000:.3f} ms ({before / after:.1f}x faster)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""
+Latency and coding agreement of the agent graph topologies (see AGENT_MODES).
+
+Runs a fixed corpus of clinical notes through every mode against the configured Ollama
+model and vector DB, without saving or paying the claims and without the LLM response
+cache. Agreement is measured against the two_call pipeline; accuracy against the codes
+a human coder would pick from the seeded code tables.
+
+    python -m backend.data.seed && python -m backend.core.vector_store
+    python -m benchmarks.pipeline_modes --repeat 3
+"""
+import time
+import argparse
+import statistics
+from backend.core.agent import AGENT_MODES, build_agent
+from backend.core.resources import warm_up
+
+# (note, expected ICD-10, expected CPT), written against backend/data/seed.py
+NOTE_CORPUS = [
+    ("Patient complains of Acute pharyngitis. Performed rapid strep test.", "J02.9", "87880"),
+    ("Sore throat for three days, fever. Rapid strep antigen test done in office.", "J02.9", "87880"),
+    ("Swollen, red tonsils with exudate. Strep screen performed.", "J03.90", "87880"),
+    ("Follow-up of type 2 diabetes, well controlled. Blood drawn for A1c.", "E11.9", "36415"),
+    ("Diabetic patient without complications, routine established patient visit.", "E11.9", "99213"),
+    ("Elevated blood pressure on repeat readings, essential hypertension. 12-lead ECG obtained.", "I10", "93000"),
+    ("Hypertension check, established patient, moderate complexity visit.", "I10", "99214"),
+    ("Persistent cough for two weeks, no fever. Office visit, low complexity.", "R05.9", "99213"),
+    ("Dry cough, otherwise well. Venipuncture for basic labs.", "R05.9", "36415"),
+    ("High blood pressure follow-up; drew blood for metabolic panel.", "I10", "36415"),
+    ("Acute pharyngitis, established patient visit of moderate to high complexity.", "J02.9", "99214"),
+    ("Palpitations in a hypertensive patient, ECG with interpretation and report.", "I10", "93000"),
+]
+
+# LLM round-trips per claim in each mode
+LLM_CALLS = {"two_call": 2, "extract_once": 1, "lookup_first": 1}
+
+def _run_mode(mode: str, repeat: int):
+    agent = build_agent(mode=mode, fast_path=False, save=False)
+    latencies, codes = [], []
+    for _ in range(repeat):
+        for note, _, _ in NOTE_CORPUS:
+            start = time.perf_counter()
+            state = agent.invoke({"clinical_note": note, "bypass_llm_cache": True, "messages": []})
+            latencies.append(time.perf_counter() - start)
+            codes.append((state.get("final_icd10_code"), state.get("final_cpt_code")))
+    return latencies, codes
+
+def _percentile(values, pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--modes", nargs="+", default=list(AGENT_MODES), choices=AGENT_MODES)
+    parser.add_argument("--repeat", type=int, default=1, help="Passes over the note corpus per mode.")
+    args = parser.parse_args()
+
+    # Model and index loading should not count towards the first mode
+    warm_up(require_indexes=True)
+
+    expected = [(icd, cpt) for _, icd, cpt in NOTE_CORPUS] * args.repeat
+    results = {mode: _run_mode(mode, args.repeat) for mode in args.modes}
+    baseline = results.get("two_call", (None, expected))[1]
+
+    print(f"\n{len(NOTE_CORPUS)} notes x {args.repeat} passes, agreement vs two_call, accuracy vs expected codes\n")
+    print(f"{'mode':<14}{'LLM calls':>10}{'mean s':>9}{'p50 s':>8}{'p95 s':>8}{'agree':>8}{'ICD acc':>9}{'CPT acc':>9}")
+    for mode, (latencies, codes) in results.items():
+        agree = sum(a == b for a, b in zip(codes, baseline)) / len(codes)
+        icd_acc = sum(c[0] == e[0] for c, e in zip(codes, expected)) / len(codes)
+        cpt_acc = sum(c[1] == e[1] for c, e in zip(codes, expected)) / len(codes)
+        print(f"{mode:<14}{LLM_CALLS[mode]:>10}{statistics.mean(latencies):>9.3f}"
+              f"{_percentile(latencies, 50):>8.3f}{_percentile(latencies, 95):>8.3f}"
+              f"{agree:>8.2f}{icd_acc:>9.2f}{cpt_acc:>9.2f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,329 @@
+"""
+Offline benchmark suite of the claim pipeline, no Ollama or embedding model download needed.
+
+Builds a scratch database, vector DB and payer rule set from synthetic codes
+(benchmarks/synthetic.py), swaps get_llm() for the deterministic FakeChatModel and the
+embedder for a hashing one (benchmarks/fakes.py), then times:
+
+    lookup_codes      one claim's vector search (embedding + FAISS + caches)
+    run_payer_rules   one claim line through the compiled payer rules
+    save_claim        one claim through the write-behind claim sink
+    graph             end-to-end async graph throughput at each --concurrency level
+
+With the default --llm-latency 0 the numbers are pure pipeline overhead; set it to a
+realistic generation time (e.g. 0.8) to see how concurrency hides the LLM wait. With
+--llm-per-token and --llm-trailing-tokens, compare LLM_STREAM=1 (stops at the end of
+the JSON) against LLM_STREAM=0 (waits for the whole answer).
+Results are written in the pytest-benchmark JSON layout, and --compare flags every
+benchmark that got slower than the baseline by more than --max-regression.
+
+    python -m benchmarks.pipeline_suite --json bench.json
+    python -m benchmarks.pipeline_suite --json new.json --compare bench.json
+"""
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import datetime
+import platform
+import statistics
+import subprocess
+import tempfile
+from typing import Callable, List, Optional
+from benchmarks.fakes import FakeChatModel, HashingEmbedder, fake_extraction
+from benchmarks.synthetic import (
+    synthetic_icd10_codes, synthetic_cpt_codes, synthetic_notes, write_payer_rules, seed_code_tables
+)
+
+SUITES = ("lookup_codes", "run_payer_rules", "save_claim", "graph")
+
+# ---------- Timing (pytest-benchmark style) -------
+def _stats(samples: List[float], iterations: int = 1) -> dict:
+    ordered = sorted(samples)
+    q1, median, q3 = statistics.quantiles(ordered, n=4) if len(ordered) > 1 else (ordered[0],) * 3
+    mean = statistics.fmean(ordered)
+    return {
+        "min": ordered[0],
+        "max": ordered[-1],
+        "mean": mean,
+        "stddev": statistics.stdev(ordered) if len(ordered) > 1 else 0.0,
+        "rounds": len(ordered),
+        "median": median,
+        "iqr": q3 - q1,
+        "q1": q1,
+        "q3": q3,
+        "iterations": iterations,
+        "total": sum(ordered) * iterations,
+        "ops": 1.0 / mean if mean > 0 else 0.0
+    }
+
+def _result(name: str, group: str, samples: List[float], iterations: int = 1,
+            params: Optional[dict] = None, extra_info: Optional[dict] = None) -> dict:
+    param = ",".join(f"{k}={v}" for k, v in (params or {}).items())
+    full = f"{name}[{param}]" if param else name
+    return {
+        "group": group,
+        "name": full,
+        "fullname": f"benchmarks/pipeline_suite.py::{full}",
+        "params": params,
+        "param": param or None,
+        "extra_info": extra_info or {},
+        "stats": _stats(samples, iterations)
+    }
+
+def bench(name: str, group: str, fn: Callable[[int], object], rounds: int, iterations: int = 1,
+          warmup: int = 10, params: Optional[dict] = None, extra_info: Optional[dict] = None) -> dict:
+    """
+    Calls fn(i) `iterations` times per round, for `rounds` rounds after `warmup` untimed calls.
+    Each sample is the mean time of one call within its round.
+    """
+    for i in range(warmup):
+        fn(i)
+    samples, call = [], warmup
+    for _ in range(rounds):
+        start = time.perf_counter()
+        for _ in range(iterations):
+            fn(call)
+            call += 1
+        samples.append((time.perf_counter() - start) / iterations)
+    return _result(name, group, samples, iterations, params, extra_info)
+
+# ---------- Suites --------------------------------
+def _extracted(note) -> dict:
+    # What the fake extraction call returns for this note
+    terms = fake_extraction(f'TEXT: "{note.text}"')
+    return {
+        "clinical_note": note.text,
+        "extracted_diagnoses": terms["diagnoses"],
+        "extracted_procedures": terms["procedures"],
+        "messages": []
+    }
+
+def suite_lookup_codes(notes, args) -> List[dict]:
+    from backend.core.agent import lookup_codes
+    states = [_extracted(note) for note in notes[:args.rounds + 10]]
+    results = []
+    result = bench("lookup_codes", "lookup_codes", lambda i: results.append(lookup_codes(states[i])), args.rounds)
+
+    # How often the top match is the code the note was written from (sanity of the setup)
+    hits = total = 0
+    for note, found in zip(notes, results):
+        top = {c["query"]: c["code"] for c in found["icd10_candidates"] if c["rank"] == 1}
+        hits += sum(code in top.values() for code in note.icd10_codes)
+        total += len(note.icd10_codes)
+    result["extra_info"]["top1_icd10_recall"] = round(hits / total, 4) if total else 0.0
+    return [result]
+
+def suite_run_payer_rules(notes, args) -> List[dict]:
+    from backend.core.rules import run_payer_rules
+    rng = random.Random(args.seed)
+    lines = [(note.icd10_codes[0], note.cpt_codes[0], rng.uniform(0.6, 1.0)) for note in notes[:10_000]]
+    return [bench("run_payer_rules", "run_payer_rules", lambda i: run_payer_rules(*lines[i % len(lines)]),
+                  rounds=args.rounds, iterations=100)]
+
+def suite_save_claim(notes, args) -> List[dict]:
+    from backend.core.agent import save_claim
+    from backend.core.config import get_settings
+    states = []
+    for note in notes[:args.rounds + 10]:
+        lines = [
+            {"line": i + 1, "cpt_code": cpt, "icd10_codes": note.icd10_codes, "confidence": 0.9,
+             "status": "approved", "rule_id": "PASS", "rejection_reason": None}
+            for i, cpt in enumerate(note.cpt_codes)
+        ]
+        states.append({
+            "clinical_note": note.text, "code_lines": lines, "final_icd10_code": note.icd10_codes[0],
+            "final_cpt_code": note.cpt_codes[0], "confidence_score": 0.9, "status": "approved",
+            "rule_id": "PASS", "rejection_reason": "Claim meets all medical necessity rules.", "messages": []
+        })
+    # One claim at a time, so every save waits out the sink's flush window
+    return [bench("save_claim", "save_claim", lambda i: save_claim(states[i]), args.rounds,
+                  params={"sequential": True}, extra_info={"claim_sink_flush_ms": get_settings().claim_sink_flush_ms})]
+
+def suite_graph(notes, args) -> List[dict]:
+    from backend.core.batch import run_claims_batch
+    from backend.core.search_cache import embedding_cache, result_cache
+    results = []
+    batch = notes[:args.graph_claims]
+    for concurrency in args.concurrency:
+        # Every level starts with cold search caches, so they all do the same work
+        embedding_cache.clear()
+        result_cache.clear()
+
+        async def run():
+            return [row async for row in run_claims_batch([note.text for note in batch], concurrency=concurrency)]
+
+        rows = asyncio.run(run())
+        summary = rows[-1]
+        claims = [row for row in rows if row["type"] == "claim"]
+        correct = sum(
+            row.get("ok") and row.get("final_cpt_code") == batch[row["index"]].cpt_codes[0] for row in claims
+        )
+        results.append(_result(
+            "graph", "graph", [row["latency_seconds"] for row in claims],
+            params={"concurrency": concurrency},
+            extra_info={
+                "claims": summary["total"],
+                "failed": summary["failed"],
+                "claims_per_second": summary["claims_per_second"],
+                "status_counts": summary["status_counts"],
+                "primary_cpt_accuracy": round(correct / len(claims), 4) if claims else 0.0,
+                "llm_latency": args.llm_latency
+            }
+        ))
+        print(f"  graph concurrency={concurrency}: {summary['claims_per_second']:.1f} claims/s")
+    return results
+
+# ---------- Setup, report, compare ----------------
+def _prepare(args, scratch: str):
+    """
+    Points the settings at a scratch database / vector DB / rule set and fills them.
+    Runs before anything from backend is imported, since those modules read the settings at import.
+    """
+    os.environ.update({
+        "DATABASE_URL": f"sqlite:///{os.path.join(scratch, 'bench.db')}",
+        "VECTOR_DATA_DIR": scratch,
+        "VECTOR_RELOAD_INTERVAL": "0",
+        "PAYER_RULES_SOURCE": "files",
+        "PAYER_RULES_DIR": os.path.join(scratch, "rules"),
+        "LLM_CACHE_ENABLED": "1" if args.llm_cache else "0",
+        "LLM_CACHE_PATH": os.path.join(scratch, "llm_cache.db"),
+    })
+    from backend.core.llm import set_llm_factory
+    from backend.core.resources import set_embedder
+    from backend.core.vector_store import build_vector_db
+
+    # The overrides carry num_predict and format, as the agent passes them to ChatOllama
+    set_llm_factory(lambda **overrides: FakeChatModel(latency=args.llm_latency, per_token=args.llm_per_token,
+                                                      jitter=args.llm_jitter,
+                                                      trailing_text=" " * (4 * args.llm_trailing_tokens), **overrides))
+    if not args.real_embedder:
+        set_embedder(HashingEmbedder())
+
+    icd10_codes = synthetic_icd10_codes(args.icd_codes, args.seed)
+    cpt_codes = synthetic_cpt_codes(args.cpt_codes, args.seed)
+    seed_code_tables(icd10_codes, cpt_codes)
+    write_payer_rules(os.path.join(scratch, "rules"), icd10_codes, cpt_codes, args.seed)
+    build_vector_db()
+    return list(synthetic_notes(args.notes, icd10_codes, cpt_codes, args.seed))
+
+def _commit_info() -> dict:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+        dirty = bool(subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"],
+                                    capture_output=True, text=True).stdout.strip())
+        return {"id": commit, "dirty": dirty}
+    except (OSError, subprocess.CalledProcessError):
+        return {}
+
+def _report(benchmarks: List[dict], args) -> dict:
+    return {
+        "machine_info": {
+            "node": platform.node(),
+            "machine": platform.machine(),
+            "processor": platform.processor(),
+            "python_implementation": platform.python_implementation(),
+            "python_version": platform.python_version(),
+            "system": platform.system(),
+            "release": platform.release(),
+            "cpu": {"count": os.cpu_count()}
+        },
+        "commit_info": _commit_info(),
+        "benchmarks": benchmarks,
+        "datetime": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "version": "pipeline_suite-1",
+        "options": {k: v for k, v in vars(args).items() if k not in ("json", "compare")}
+    }
+
+def _score(benchmark: dict):
+    # Throughput suites are compared on claims/s (higher is better), the others on median time
+    claims_per_second = benchmark["extra_info"].get("claims_per_second")
+    if claims_per_second:
+        return 1.0 / claims_per_second, f"{claims_per_second:.1f} claims/s"
+    return benchmark["stats"]["median"], f"{benchmark['stats']['median'] * 1e6:.1f} us"
+
+def compare(current: dict, baseline: dict, max_regression: float) -> List[str]:
+    """
+    Prints current vs baseline per benchmark. Returns the names that regressed.
+    """
+    before = {b["fullname"]: b for b in baseline["benchmarks"]}
+    regressed = []
+    changed = {k for k, v in current.get("options", {}).items() if baseline.get("options", {}).get(k, v) != v}
+    if changed:
+        print(f"\nNote: the baseline ran with different options ({', '.join(sorted(changed))})")
+    print(f"\n{'benchmark':<34}{'baseline':>18}{'current':>18}{'change':>9}")
+    for benchmark in current["benchmarks"]:
+        old = before.get(benchmark["fullname"])
+        if old is None:
+            continue
+        (old_cost, old_label), (new_cost, new_label) = _score(old), _score(benchmark)
+        change = new_cost / old_cost - 1.0 if old_cost else 0.0
+        flag = " REGRESSED" if change > max_regression else ""
+        print(f"{benchmark['name']:<34}{old_label:>18}{new_label:>18}{change:>+8.1%}{flag}")
+        if flag:
+            regressed.append(benchmark["name"])
+    return regressed
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--suites", nargs="+", default=list(SUITES), choices=SUITES)
+    parser.add_argument("--icd-codes", type=int, default=5000)
+    parser.add_argument("--cpt-codes", type=int, default=5000)
+    parser.add_argument("--notes", type=int, default=100_000, help="Synthetic notes generated.")
+    parser.add_argument("--rounds", type=int, default=2000, help="Timed rounds of the per-call suites.")
+    parser.add_argument("--graph-claims", type=int, default=2000, help="Claims run per concurrency level.")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32, 128])
+    parser.add_argument("--llm-latency", type=float, default=0.0, help="Seconds per fake LLM call.")
+    parser.add_argument("--llm-per-token", type=float, default=0.0, help="Extra seconds per generated token.")
+    parser.add_argument("--llm-jitter", type=float, default=0.0, help="Up to this fraction of extra latency.")
+    parser.add_argument("--llm-trailing-tokens", type=int, default=0,
+                        help="Whitespace tokens the fake LLM generates after its JSON (cut off by streaming).")
+    parser.add_argument("--llm-cache", action="store_true", help="Keep the LLM response cache on.")
+    parser.add_argument("--real-embedder", action="store_true", help="Use EMBEDDING_MODEL instead of hashing.")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--json", help="Write the results to this file.")
+    parser.add_argument("--compare", help="Baseline results to compare against.")
+    parser.add_argument("--max-regression", type=float, default=0.10, help="Allowed slowdown vs the baseline.")
+    args = parser.parse_args()
+    args.rounds = min(args.rounds, args.notes - 10)
+    args.graph_claims = min(args.graph_claims, args.notes)
+
+    with tempfile.TemporaryDirectory() as scratch:
+        start = time.perf_counter()
+        notes = _prepare(args, scratch)
+        print(f"\n{args.icd_codes} ICD-10 + {args.cpt_codes} CPT codes, {len(notes):,} notes "
+              f"ready in {time.perf_counter() - start:.1f} s\n")
+
+        suites = {"lookup_codes": suite_lookup_codes, "run_payer_rules": suite_run_payer_rules,
+                  "save_claim": suite_save_claim, "graph": suite_graph}
+        benchmarks = []
+        for name in args.suites:
+            benchmarks.extend(suites[name](notes, args))
+
+        from backend.core.claim_sink import close_claim_sink
+        close_claim_sink()
+
+    print(f"\n{'benchmark':<34}{'min us':>10}{'median us':>11}{'mean us':>10}{'ops/s':>11}  extra")
+    for b in benchmarks:
+        s = b["stats"]
+        extra = ", ".join(f"{k}={v}" for k, v in b["extra_info"].items() if k != "status_counts")
+        print(f"{b['name']:<34}{s['min'] * 1e6:>10.1f}{s['median'] * 1e6:>11.1f}{s['mean'] * 1e6:>10.1f}"
+              f"{s['ops']:>11.1f}  {extra}")
+
+    report = _report(benchmarks, args)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nResults written to {args.json}")
+    if args.compare:
+        with open(args.compare) as f:
+            regressed = compare(report, json.load(f), args.max_regression)
+        if regressed:
+            print(f"\n{len(regressed)} benchmarks regressed by more than {args.max_regression:.0%}")
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
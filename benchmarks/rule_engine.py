@@ -0,0 +1,120 @@
+"""
+Throughput of the compiled payer rule engine on a payer-sized rule set.
+
+Generates synthetic coverage (LCD/NCD style CPT -> ICD-10 prefix) and NCCI (CPT pair)
+rules plus random multi-line claims, compiles the rules into a RuleEngine and
+adjudicates every claim. A scan-everything reference engine runs on a sample of the
+claims to check that both agree and to show what the index saves.
+
+    python -m benchmarks.rule_engine --rules 50000 --claims 100000
+"""
+import time
+import random
+import string
+import argparse
+from backend.core.rule_engine import (
+    RuleEngine, CoverageRow, NcciRow, STATUS_SEVERITY, MIN_CONFIDENCE, normalize_cpt, normalize_icd
+)
+
+def _icd(rng: random.Random, length: int) -> str:
+    code = rng.choice(string.ascii_uppercase) + "".join(rng.choices(string.digits, k=2))
+    rest = "".join(rng.choices(string.digits, k=length - 3))
+    return f"{code}.{rest}" if rest else code
+
+def synthetic_rules(count: int, rng: random.Random, cpt_pool: list):
+    """Four fifths coverage prefixes (about 10 per covered CPT), one fifth NCCI pairs."""
+    coverage_count = count * 4 // 5
+    covered = rng.sample(cpt_pool, k=max(1, coverage_count // 10))
+    coverage = [
+        CoverageRow(f"LCD_{cpt}", cpt, _icd(rng, rng.choice((3, 4))), f"{cpt} is not covered for this diagnosis.")
+        for cpt in (rng.choice(covered) for _ in range(coverage_count))
+    ]
+    ncci = []
+    for i in range(count - coverage_count):
+        column1, column2 = rng.sample(cpt_pool, k=2)
+        ncci.append(NcciRow(f"NCCI_{i}", column1, column2, f"{column2} is bundled into {column1}."))
+    return coverage, ncci
+
+def synthetic_claims(count: int, rng: random.Random, cpt_pool: list):
+    claims = []
+    for _ in range(count):
+        claims.append([
+            {
+                "cpt_code": rng.choice(cpt_pool),
+                "icd10_codes": [_icd(rng, 5) for _ in range(rng.randint(1, 3))],
+                "confidence": rng.uniform(0.7, 1.0)
+            }
+            for _ in range(rng.randint(1, 4))
+        ])
+    return claims
+
+def scan_evaluate_claim(coverage, ncci, lines) -> str:
+    """Reference semantics: every rule is checked against every claim."""
+    statuses = []
+    for line in lines:
+        icds = [normalize_icd(icd) for icd in line["icd10_codes"]]
+        cpt = normalize_cpt(line["cpt_code"])
+        if line["confidence"] < MIN_CONFIDENCE:
+            statuses.append("suspicious")
+            continue
+        prefixes = {}
+        for row in coverage:
+            if normalize_cpt(row.cpt_code) == cpt:
+                prefixes.setdefault(row.rule_id, []).append(normalize_icd(row.icd10_prefix))
+        covered = all(any(icd.startswith(p) for icd in icds for p in group) for group in prefixes.values())
+        statuses.append("approved" if covered else "rejected")
+
+    cpts = [normalize_cpt(line["cpt_code"]) for line in lines]
+    for row in ncci:
+        column1, column2 = normalize_cpt(row.column1_cpt), normalize_cpt(row.column2_cpt)
+        if column1 != column2 and column1 in cpts:
+            for i, cpt in enumerate(cpts):
+                if cpt == column2 and statuses[i] == "approved":
+                    statuses[i] = "rejected"
+    return max(statuses, key=STATUS_SEVERITY.get)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rules", type=int, default=50_000)
+    parser.add_argument("--claims", type=int, default=100_000)
+    parser.add_argument("--cpt-codes", type=int, default=10_000, help="Distinct CPT codes in use.")
+    parser.add_argument("--scan-sample", type=int, default=200, help="Claims checked with the scanning engine.")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    cpt_pool = [f"{10000 + i:05d}" for i in range(args.cpt_codes)]
+    coverage, ncci = synthetic_rules(args.rules, rng, cpt_pool)
+    claims = synthetic_claims(args.claims, rng, cpt_pool)
+    lines = sum(len(claim) for claim in claims)
+
+    start = time.perf_counter()
+    engine = RuleEngine(coverage, ncci)
+    compile_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    decisions = [engine.evaluate_claim(claim) for claim in claims]
+    engine_s = time.perf_counter() - start
+
+    sample = claims[:args.scan_sample]
+    start = time.perf_counter()
+    scanned = [scan_evaluate_claim(coverage, ncci, claim) for claim in sample]
+    scan_s = time.perf_counter() - start
+    mismatches = sum(d["status"] != s for d, s in zip(decisions, scanned))
+
+    statuses = {}
+    for decision in decisions:
+        statuses[decision["status"]] = statuses.get(decision["status"], 0) + 1
+
+    print(f"\n{len(coverage) + len(ncci)} rules ({len(coverage)} coverage, {len(ncci)} NCCI), "
+          f"{len(claims)} claims with {lines} lines\n")
+    print(f"compile:          {compile_s:.2f} s")
+    print(f"compiled engine:  {engine_s:.2f} s  ({len(claims) / engine_s:,.0f} claims/s, "
+          f"{engine_s / len(claims) * 1e6:.1f} us/claim)")
+    print(f"full scan:        {scan_s / len(sample) * 1e6:,.0f} us/claim on {len(sample)} claims "
+          f"({scan_s / len(sample) / (engine_s / len(claims)):,.0f}x slower)")
+    print(f"agreement:        {len(sample) - mismatches}/{len(sample)} sampled claims")
+    print(f"statuses:         {statuses}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+"""
+Synthetic code sets, payer rules and clinical notes for the offline benchmarks.
+
+Codes get unique, readable descriptions built from a small clinical vocabulary, so the
+(hashing or real) embedder finds the right code for a phrase most of the time. Notes
+mention one to three of the codes' descriptions, with some word dropping and filler
+so that not every search is an exact match:
+
+    58-year-old female seen today. Assessment: chronic infection of the knee, left; acute
+    pain of the lower back. Procedures: x-ray of the knee two views.
+"""
+import os
+import csv
+import random
+import string
+from typing import Iterator, List, NamedTuple
+
+ICD_CONDITIONS = (
+    "acute infection", "chronic infection", "acute pain", "chronic pain", "sprain", "fracture", "contusion",
+    "laceration", "inflammation", "ulcer", "benign neoplasm", "malignant neoplasm", "cyst", "abscess",
+    "degeneration", "stenosis", "obstruction", "hemorrhage", "dysfunction", "deformity", "atrophy", "lesion",
+    "edema", "spasm", "stiffness", "effusion", "calcification", "hypertrophy", "insufficiency", "rupture"
+)
+ICD_SITES = (
+    "upper back", "lower back", "neck", "throat", "tonsils", "sinus", "ear", "eye", "chest wall", "lung",
+    "heart", "liver", "kidney", "bladder", "stomach", "colon", "skin", "scalp", "knee", "hip", "ankle",
+    "foot", "wrist", "hand", "elbow", "shoulder", "thyroid", "pancreas", "spleen", "gallbladder"
+)
+ICD_QUALIFIERS = ("", "left", "right", "bilateral", "recurrent", "unspecified")
+
+CPT_ACTIONS = (
+    "office visit", "consultation", "x-ray", "ultrasound", "ct scan", "mri", "biopsy", "injection",
+    "excision", "repair", "drainage", "aspiration", "laboratory panel", "culture", "immunoassay",
+    "physical therapy", "splint application", "endoscopy", "electrocardiogram", "vaccination"
+)
+CPT_DETAILS = (
+    "new patient low", "new patient moderate", "established patient low", "established patient moderate",
+    "with contrast", "without contrast", "single view", "two views", "simple", "complex", "limited", "complete"
+)
+
+LEAD_INS = (
+    "{age}-year-old {sex} seen today.", "{age}-year-old {sex} presents for follow-up.",
+    "Patient is a {age}-year-old {sex}.", "{sex} patient, {age}, walk-in visit.", ""
+)
+
+class SyntheticNote(NamedTuple):
+    text: str
+    icd10_codes: List[str] # In the order mentioned, main diagnosis first
+    cpt_codes: List[str]
+
+def synthetic_icd10_codes(count: int, seed: int = 42) -> List[dict]:
+    """
+    Up to len(conditions x sites x qualifiers) = 5400 codes, e.g. {"code": "M17.21", ...}.
+    """
+    combos = [(c, s, q) for c in ICD_CONDITIONS for s in ICD_SITES for q in ICD_QUALIFIERS]
+    if count > len(combos):
+        raise ValueError(f"At most {len(combos)} synthetic ICD-10 codes")
+    rng = random.Random(seed)
+    rng.shuffle(combos)
+    codes, seen = [], set()
+    for condition, site, qualifier in combos[:count]:
+        code = None
+        while code is None or code in seen:
+            code = f"{rng.choice(string.ascii_uppercase)}{rng.randint(0, 99):02d}.{rng.randint(0, 99)}"
+        seen.add(code)
+        codes.append({"code": code, "description": f"{condition} of the {site}" + (f", {qualifier}" if qualifier else "")})
+    return codes
+
+def synthetic_cpt_codes(count: int, seed: int = 42) -> List[dict]:
+    """
+    Up to len(actions x sites x details) = 7200 five-digit codes, e.g. {"code": "70123", ...}.
+    """
+    combos = [(a, s, d) for a in CPT_ACTIONS for s in ICD_SITES for d in CPT_DETAILS]
+    if count > len(combos):
+        raise ValueError(f"At most {len(combos)} synthetic CPT codes")
+    rng = random.Random(seed + 1)
+    rng.shuffle(combos)
+    numbers = rng.sample(range(10000, 100000), count)
+    return [
+        {"code": f"{number:05d}", "description": f"{action} of the {site} {detail}"}
+        for number, (action, site, detail) in zip(numbers, combos)
+    ]
+
+def _mention(description: str, rng: random.Random) -> str:
+    # Coders rarely write the full descriptor: sometimes a word is left out
+    words = description.split()
+    if len(words) > 3 and rng.random() < 0.3:
+        del words[rng.randrange(len(words))]
+    return " ".join(words)
+
+def synthetic_notes(count: int, icd10_codes: List[dict], cpt_codes: List[dict], seed: int = 42) -> Iterator[SyntheticNote]:
+    """
+    Yields `count` notes. A few codes are much more common than the others (like in real
+    claims), so repeated phrases exercise the embedding and search caches realistically.
+    """
+    rng = random.Random(seed + 2)
+    # Zipf-like weights: the n-th code is seen about 1/n as often as the first
+    icd_weights = [1.0 / (i + 1) for i in range(len(icd10_codes))]
+    cpt_weights = [1.0 / (i + 1) for i in range(len(cpt_codes))]
+    for _ in range(count):
+        icds = list({c["code"]: c for c in rng.choices(icd10_codes, icd_weights, k=rng.randint(1, 3))}.values())
+        cpts = list({c["code"]: c for c in rng.choices(cpt_codes, cpt_weights, k=rng.randint(1, 2))}.values())
+        lead = rng.choice(LEAD_INS).format(age=rng.randint(18, 90), sex=rng.choice(("male", "female")))
+        text = " ".join(filter(None, (
+            lead,
+            "Assessment: " + "; ".join(_mention(c["description"], rng) for c in icds) + ".",
+            "Procedures: " + "; ".join(_mention(c["description"], rng) for c in cpts) + "."
+        )))
+        yield SyntheticNote(text, [c["code"] for c in icds], [c["code"] for c in cpts])
+
+def write_payer_rules(rules_dir: str, icd10_codes: List[dict], cpt_codes: List[dict], seed: int = 42,
+                      covered_fraction: float = 0.2, ncci_pairs: int = 200):
+    """
+    Writes coverage.csv and ncci.csv for the synthetic codes: covered_fraction of the CPT
+    codes are only payable with diagnoses from a few ICD-10 categories, plus random NCCI pairs.
+    """
+    rng = random.Random(seed + 3)
+    categories = sorted({c["code"].split(".")[0] for c in icd10_codes})
+    os.makedirs(rules_dir, exist_ok=True)
+    with open(os.path.join(rules_dir, "coverage.csv"), "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(("rule_id", "cpt_code", "icd10_prefix", "reason"))
+        for cpt in rng.sample(cpt_codes, int(len(cpt_codes) * covered_fraction)):
+            for prefix in rng.sample(categories, min(len(categories), rng.randint(5, 40))):
+                writer.writerow((f"LCD_{cpt['code']}", cpt["code"], prefix,
+                                 f"Procedure {cpt['code']} is not medically necessary for this diagnosis."))
+    with open(os.path.join(rules_dir, "ncci.csv"), "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(("rule_id", "column1_cpt", "column2_cpt", "reason"))
+        for i in range(ncci_pairs):
+            column1, column2 = rng.sample(cpt_codes, 2)
+            writer.writerow((f"NCCI_{i}", column1["code"], column2["code"],
+                             f"{column2['code']} is bundled into {column1['code']}."))
+
+def seed_code_tables(icd10_codes: List[dict], cpt_codes: List[dict]):
+    """
+    Inserts the codes into the (scratch) database's icd10_codes and cpt_codes tables.
+    """
+    from sqlalchemy import insert
+    from backend.data.db import engine, init_db, ICD10Code, CPTCode
+    init_db()
+    with engine.begin() as conn:
+        conn.execute(insert(ICD10Code.__table__), icd10_codes)
+        conn.execute(insert(CPTCode.__table__), cpt_codes)
@@ -1,10 +1,22 @@
-from backend.data.db import SessionLocal, Claim
+import sys
+from sqlalchemy import func
+from backend.data.db import SessionLocal, Claim, ClaimLine
+from backend.core.claims_query import list_claims
+
+# python check_db.py [status]  -> the 20 newest claims (of that status), with their lines
+status = sys.argv[1] if len(sys.argv) > 1 else None
 
 db = SessionLocal()
-claims = db.query(Claim).all()
+counts = dict(db.query(Claim.status, func.count()).group_by(Claim.status).all())
+print(f"\nFound {sum(counts.values())} claims in the database: {counts}")
 
-print(f"\nFound {len(claims)} claims in the database:")
-for c in claims:
-    print(f"ID: {c.id} | Status: {c.status} | ICD-10: {c.icd10_code} | Confidence: {c.confidence_score}")
+page = list_claims(status=status, limit=20, newest_first=True)
+lines = db.query(ClaimLine).filter(ClaimLine.claim_id.in_([c["id"] for c in page["claims"]])).order_by(ClaimLine.line_number).all()
+print(f"Newest {len(page['claims'])}{' ' + status if status else ''} claims:")
+for c in page["claims"]:
+    print(f"ID: {c['id']} | Status: {c['status']} | ICD-10: {c['icd10_code']} | Confidence: {c['confidence_score']}")
+    for line in lines:
+        if line.claim_id == c["id"]:
+            print(f"    Line {line.line_number}: CPT {line.cpt_code} | ICD-10: {line.icd10_codes} | {line.status} ({line.rule_id})")
 
-db.close()
\ No newline at end of file
+db.close()
@@ -1,4 +1,5 @@
 from backend.core.agent import build_agent
+from backend.core.telemetry import configure_logging
 
 def run_test():
     agent = build_agent()
@@ -21,7 +22,9 @@ def run_test():
     print(f"Selected CPT:        {result.get('final_cpt_code')}")
     print(f"Confidence:          {result.get('confidence_score')}")
     print(f"Explanation:         {result.get('explanation')}")
+    print(f"Timings (ms):        {result.get('timings')}")
     print("----------------------------------------------")
 
 if __name__ == "__main__":
+    configure_logging()
     run_test()
\ No newline at end of file
@@ -0,0 +1,58 @@
+import os
+import asyncio
+import tempfile
+
+# Run against a scratch database, never backend/data/medical.db
+_scratch = tempfile.mkdtemp()
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_scratch, 'claim_sink_test.db')}"
+# A wide batch window, so a save can be cancelled while its claim waits in the sink
+os.environ["CLAIM_SINK_FLUSH_MS"] = "200"
+
+from backend.data.db import init_db, SessionLocal, Claim
+from backend.core.claim_sink import get_claim_sink
+from backend.core.agent import asave_claim, save_claim
+
+STATE = {"clinical_note": "Acute pharyngitis. Rapid strep test.", "final_icd10_code": "J02.9",
+         "final_cpt_code": "87880", "confidence_score": 0.9, "status": "rejected"}
+
+failures = []
+
+def check(name: str, ok: bool):
+    print(f"{'PASS' if ok else 'FAIL'}: {name}")
+    if not ok:
+        failures.append(name)
+
+async def run_tests():
+    init_db()
+
+    print("\n" + "="*50)
+    print("TEST 1: A CANCELLED ASYNC SAVE DOES NOT STOP THE SINK")
+    print("="*50)
+    task = asyncio.create_task(asave_claim(STATE))
+    await asyncio.sleep(0.05)
+    task.cancel()
+    try:
+        await task
+    except asyncio.CancelledError:
+        pass
+    # Let the batch holding the cancelled claim be written
+    await asyncio.sleep(0.5)
+    sink = get_claim_sink()
+    check("writer thread still running", sink._thread.is_alive())
+
+    saved = await asyncio.wait_for(asave_claim(STATE), timeout=5)
+    check("next async save completes", saved.get("claim_id") is not None)
+    saved = await asyncio.wait_for(asyncio.to_thread(save_claim, STATE), timeout=5)
+    check("next sync save completes", saved.get("claim_id") is not None)
+
+    db = SessionLocal()
+    try:
+        check("cancelled claim written all the same", db.query(Claim).count() == 3)
+    finally:
+        db.close()
+
+    print(f"\n{'All claim sink tests passed.' if not failures else f'{len(failures)} claim sink tests FAILED.'}\n")
+
+if __name__ == "__main__":
+    asyncio.run(run_tests())
+    raise SystemExit(1 if failures else 0)
@@ -1,6 +1,7 @@
 from backend.core.agent import build_agent
 from backend.core.review import submit_human_review
 from backend.data.db import SessionLocal, Claim
+from backend.core.telemetry import configure_logging
 
 def run_tests():
     agent = build_agent()
@@ -68,4 +69,5 @@ def run_tests():
         print(f"\n Error during human review: {e}\n")
 
 if __name__ == "__main__":
+    configure_logging()
     run_tests()
\ No newline at end of file
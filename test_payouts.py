@@ -0,0 +1,174 @@
+import os
+import asyncio
+import tempfile
+
+# Run against a scratch database, never backend/data/medical.db
+_scratch = tempfile.mkdtemp()
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_scratch, 'payouts_test.db')}"
+
+from backend.data.db import init_db, SessionLocal, Claim, Payout
+from backend.core.claim_sink import get_claim_sink
+from backend.core.payout_dispatcher import PayoutDispatcher
+from backend.core.rule_engine import RuleEngine, CoverageRow
+from backend.core.bulk_adjudication import readjudicate_claims
+
+class StripeStub:
+    """
+    Stands in for Stripe: same call as aprocess_claim_payout, and like Stripe it answers a
+    repeated idempotency key with the first charge instead of charging again.
+    fail_first: key -> how many calls fail before it succeeds.
+    lose_response: keys whose first call charges the card but raises, like a timeout.
+    """
+    def __init__(self, fail_first=None, lose_response=(), always_fail=()):
+        self.fail_first = dict(fail_first or {})
+        self.lose_response = set(lose_response)
+        self.always_fail = set(always_fail)
+        self.charges = {} # idempotency key -> transaction id
+        self.calls = 0
+        self.active = 0
+        self.max_active = 0
+
+    async def pay(self, claim_id, amount, idempotency_key):
+        self.calls += 1
+        self.active += 1
+        self.max_active = max(self.max_active, self.active)
+        try:
+            await asyncio.sleep(0.01)
+            if idempotency_key in self.always_fail or self.fail_first.get(idempotency_key, 0) > 0:
+                if idempotency_key in self.fail_first:
+                    self.fail_first[idempotency_key] -= 1
+                return {"success": False, "error": "card_declined"}
+            if idempotency_key not in self.charges:
+                self.charges[idempotency_key] = f"pi_stub_{claim_id}"
+                if idempotency_key in self.lose_response:
+                    raise TimeoutError("Stripe did not answer in time")
+            return {"success": True, "transaction_id": self.charges[idempotency_key], "amount_paid": amount}
+        finally:
+            self.active -= 1
+
+def save(status: str, payout=None) -> int:
+    claim = {"clinical_note": "Acute pharyngitis. Rapid strep test.", "icd10_code": "J02.9",
+             "cpt_code": "87880", "confidence_score": 0.9, "status": status}
+    return get_claim_sink().submit(claim, [], payout_amount=payout).result()
+
+def payout_of(claim_id: int):
+    db = SessionLocal()
+    try:
+        payout = db.query(Payout).filter(Payout.claim_id == claim_id).first()
+        claim = db.get(Claim, claim_id)
+        return payout, claim
+    finally:
+        db.close()
+
+failures = []
+
+def check(name: str, ok: bool):
+    print(f"{'PASS' if ok else 'FAIL'}: {name}")
+    if not ok:
+        failures.append(name)
+
+async def run_tests():
+    init_db()
+
+    print("\n" + "="*50)
+    print("TEST 1: APPROVED CLAIM -> PAYOUT IN THE OUTBOX")
+    print("="*50)
+    approved = save("approved", payout=50.0)
+    rejected = save("rejected")
+    payout, claim = payout_of(approved)
+    check("payout row written with the claim", payout is not None and payout.status == "pending")
+    check("idempotency key derived from the claim id", payout.idempotency_key == f"claim-{approved}-payout")
+    check("claim not paid yet", claim.stripe_transaction_id is None and claim.payment_amount == 0.0)
+    check("rejected claim has no payout", payout_of(rejected)[0] is None)
+
+    print("\n" + "="*50)
+    print("TEST 2: DISPATCHER PAYS AND RECORDS THE TRANSACTION")
+    print("="*50)
+    stub = StripeStub()
+    await PayoutDispatcher(pay=stub.pay, backoff_base=0).drain()
+    payout, claim = payout_of(approved)
+    check("payout paid", payout.status == "paid" and payout.attempts == 1)
+    check("transaction id on the claim", claim.stripe_transaction_id == f"pi_stub_{approved}")
+    check("amount on the claim", claim.payment_amount == 50.0)
+
+    print("\n" + "="*50)
+    print("TEST 3: RETRIES WITH BACKOFF, NEVER PAYS TWICE")
+    print("="*50)
+    flaky, lost = save("approved", payout=20.0), save("approved", payout=20.0)
+    stub = StripeStub(fail_first={f"claim-{flaky}-payout": 2}, lose_response={f"claim-{lost}-payout"})
+    await PayoutDispatcher(pay=stub.pay, backoff_base=0).drain()
+    payout, _ = payout_of(flaky)
+    check("declined twice, paid on the 3rd attempt", payout.status == "paid" and payout.attempts == 3)
+    payout, claim = payout_of(lost)
+    check("lost response retried and paid", payout.status == "paid" and claim.stripe_transaction_id == f"pi_stub_{lost}")
+    check("one Stripe charge per claim", len(stub.charges) == 2)
+    backoff = PayoutDispatcher(pay=stub.pay, backoff_base=2.0, backoff_max=30.0)
+    check("backoff: 2^n seconds, capped", 1.0 <= backoff.backoff(1) <= 2.0 and 4.0 <= backoff.backoff(3) <= 8.0
+          and backoff.backoff(20) <= 30.0)
+
+    print("\n" + "="*50)
+    print("TEST 4: GIVES UP AFTER MAX ATTEMPTS")
+    print("="*50)
+    doomed = save("approved", payout=20.0)
+    stub = StripeStub(always_fail={f"claim-{doomed}-payout"})
+    await PayoutDispatcher(pay=stub.pay, backoff_base=0, max_attempts=3).drain()
+    payout, claim = payout_of(doomed)
+    check("payout failed after 3 attempts", payout.status == "failed" and payout.attempts == 3)
+    check("error recorded", payout.last_error == "card_declined" and claim.stripe_transaction_id is None)
+
+    print("\n" + "="*50)
+    print("TEST 5: BOUNDED CONCURRENCY AND CRASH RECOVERY")
+    print("="*50)
+    many = [save("approved", payout=20.0) for _ in range(20)]
+    db = SessionLocal()
+    db.query(Payout).filter(Payout.claim_id == many[0]).update({"status": "processing"})
+    db.commit()
+    db.close()
+    stub = StripeStub()
+    dispatcher = PayoutDispatcher(pay=stub.pay, concurrency=4, backoff_base=0)
+    check("interrupted payout requeued", await dispatcher.recover() == 1)
+    await dispatcher.drain()
+    check("all 20 paid", all(payout_of(claim_id)[0].status == "paid" for claim_id in many))
+    check(f"at most 4 Stripe calls at once (saw {stub.max_active})", stub.max_active <= 4)
+    print(await dispatcher.stats())
+
+    print("\n" + "="*50)
+    print("TEST 6: CLAIM REJECTED AFTER ITS PAYOUT WAS QUEUED")
+    print("="*50)
+    # Rejected behind the outbox's back: the dispatcher cancels instead of paying
+    revoked = save("approved", payout=50.0)
+    db = SessionLocal()
+    db.query(Claim).filter(Claim.id == revoked).update({"status": "rejected"})
+    db.commit()
+    db.close()
+    stub = StripeStub()
+    dispatcher = PayoutDispatcher(pay=stub.pay, backoff_base=0)
+    await dispatcher.drain()
+    check("payout cancelled, not paid", payout_of(revoked)[0].status == "cancelled" and stub.calls == 0)
+    check("cancellation counted", dispatcher.cancelled == 1)
+
+    # Re-adjudicated under a stricter policy: the payout is cancelled with the claim
+    queued, later = save("approved", payout=50.0), save("rejected")
+    strict = RuleEngine(coverage=[CoverageRow("R2_STRICT", "87880", "Z99", "Policy changed.")])
+    readjudicate_claims(engine=strict, statuses=["approved"])
+    payout, claim = payout_of(queued)
+    check("claim rejected by the re-run", claim.status == "rejected")
+    check("its pending payout cancelled in the same run", payout.status == "cancelled")
+    check("paid payouts left alone", payout_of(approved)[0].status == "paid")
+
+    # Policy relaxed again: cancelled payouts come back, newly approved claims get one
+    readjudicate_claims(engine=RuleEngine(), statuses=["rejected"])
+    check("cancelled payout requeued", payout_of(queued)[0].status == "pending")
+    payout, claim = payout_of(later)
+    check("newly approved claim gets a payout", claim.status == "approved" and payout is not None
+          and payout.status == "pending" and payout.amount == 50.0)
+    stub = StripeStub()
+    await PayoutDispatcher(pay=stub.pay, backoff_base=0).drain()
+    check("both paid once", payout_of(queued)[0].status == "paid" and payout_of(later)[0].status == "paid"
+          and len(stub.charges) >= 2)
+
+    print(f"\n{'All payout tests passed.' if not failures else f'{len(failures)} payout tests FAILED.'}\n")
+
+if __name__ == "__main__":
+    asyncio.run(run_tests())
+    raise SystemExit(1 if failures else 0)
@@ -0,0 +1,82 @@
+import os
+import tempfile
+
+# Run against a scratch database, never backend/data/medical.db
+_scratch = tempfile.mkdtemp()
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_scratch, 'readjudication_test.db')}"
+
+from backend.data.db import init_db, SessionLocal, Claim, ClaimLine
+from backend.core.claim_sink import get_claim_sink
+from backend.core.rule_engine import RuleEngine, CoverageRow, NcciRow
+from backend.core.bulk_adjudication import readjudicate_claims
+
+# Rapid strep test only for pharyngitis, and never billed with a throat culture
+ENGINE = RuleEngine(
+    coverage=[CoverageRow("R2_MEDICAL_NECESSITY", "87880", "J02", "Rapid strep test requires a pharyngitis diagnosis.")],
+    ncci=[NcciRow("R3_NCCI", "87081", "87880", "Rapid strep test is bundled into the throat culture.")],
+)
+
+def save(icd: str, cpt: str, lines=(), status: str = "pending", rule_id: str = None) -> int:
+    claim = {"clinical_note": "Sore throat and cough.", "icd10_code": icd, "cpt_code": cpt,
+             "confidence_score": 0.9, "status": status, "rule_id": rule_id}
+    rows = [
+        {"line_number": n, "cpt_code": line_cpt, "icd10_codes": line_icds, "confidence_score": 0.9,
+         "status": status, "rule_id": None, "rejection_reason": None}
+        for n, (line_cpt, line_icds) in enumerate(lines, start=1)
+    ]
+    return get_claim_sink().submit(claim, rows).result()
+
+def snapshot() -> dict:
+    db = SessionLocal()
+    try:
+        claims = {c.id: (c.status, c.rejection_reason, c.rule_id) for c in db.query(Claim).all()}
+        lines = {(l.claim_id, l.line_number): (l.status, l.rejection_reason, l.rule_id) for l in db.query(ClaimLine).all()}
+        return {"claims": claims, "lines": lines}
+    finally:
+        db.close()
+
+failures = []
+
+def check(name: str, ok: bool):
+    print(f"{'PASS' if ok else 'FAIL'}: {name}")
+    if not ok:
+        failures.append(name)
+
+def run_tests():
+    init_db()
+    secondary = save("R05.9", "87880", [("87880", "R05.9,J02.9")])
+    covered = save("J02.9", "87880", [("87880", "J02.9")])
+    uncovered = save("R05.9", "87880", [("87880", "R05.9")])
+    bundled = save("J02.9", "87081", [("87081", "J02.9"), ("87880", "J02.9")])
+    no_lines = save("J02.9", "87880")
+    # What adjudicate_claim saves when the LLM answer could not be parsed
+    uncoded = save("None", "None", status="suspicious", rule_id="LLM_PARSE_FAILURE")
+
+    print("\n" + "="*50)
+    print("TEST 1: SAME DECISIONS AS THE CLAIM-LEVEL ENGINE")
+    print("="*50)
+    totals = readjudicate_claims(engine=ENGINE)
+    after = snapshot()
+    check("every claim read", totals["claims"] == 5)
+    check("secondary diagnosis on the line counts", after["claims"][secondary][0] == "approved")
+    check("its line row approved too", after["lines"][(secondary, 1)][0] == "approved")
+    check("single diagnosis covered", after["claims"][covered][0] == "approved")
+    check("single diagnosis not covered", after["claims"][uncovered][2] == "R2_MEDICAL_NECESSITY")
+    check("NCCI edit across lines", after["claims"][bundled][2] == "R3_NCCI")
+    check("claim without lines", after["claims"][no_lines][0] == "approved")
+    check("line by line only where needed", totals["multi_line"] == 2)
+    check("claim the LLM could not code still waits for a coder",
+          after["claims"][uncoded] == ("suspicious", None, "LLM_PARSE_FAILURE"))
+
+    print("\n" + "="*50)
+    print("TEST 2: A SECOND RUN CHANGES NOTHING")
+    print("="*50)
+    totals = readjudicate_claims(engine=ENGINE)
+    check("no claim changed status", totals["changed"] == 0)
+    check("claims and lines identical", snapshot() == after)
+
+    print(f"\n{'All re-adjudication tests passed.' if not failures else f'{len(failures)} re-adjudication tests FAILED.'}\n")
+
+if __name__ == "__main__":
+    run_tests()
+    raise SystemExit(1 if failures else 0)